@@ -0,0 +1,229 @@
+# py BatchRunner.py --tool RunQC --mzml_files "C:\data\*AlCl3*.mzML" --output_dir qc_batch --workers 8 --format parquet
+# py BatchRunner.py --tool generate_ms2_table --manifest runs.csv --output_dir ms2_batch --memory_limit 8 --sequence AQDSQVLEEER --run_type DDA
+
+import os
+import sys
+import argparse
+import glob
+import shlex
+import subprocess
+import timeit
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "MS2VariantFinder", "mzml_tools"))
+from table_reader import read_table, as_text
+from table_writer import write_table, FORMATS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# script of each tool, the output argument the runner sets (None if the tool names its own output), the output name,
+# the tables written per run that are consolidated across runs, and the tables of those only written when asked for
+TOOLS = {"CalculateCycleTime": {"script": "CalculateCycleTime.py", "output_arg": "--output_file", "output": "cycle_times.{format}", "tables": ["cycle_times"]},
+         "FindPrecursorIntensity": {"script": "FindPrecursorIntensity.py", "output_arg": "--output", "output": "estimated_precursor_values.{format}", "tables": ["estimated_precursor_values"]},
+         "GenerateMS2Table": {"script": "GenerateMS2Table.py", "output_arg": None, "output": None, "tables": ["ms2_table"]},
+         "MS1XICExtractor": {"script": os.path.join("MS1XICExtractor", "MS1XICExtractor.py"), "output_arg": "--output_file", "output": "xic.pdf", "tables": []},
+         "RunQC": {"script": "RunQC.py", "output_arg": "--output", "output": "qc", "tables": ["qc_scans", "qc_windows", "qc_summary", "qc_offsets"],
+                   "optional": ["qc_offsets"]},
+         "generate_ms2_table": {"script": os.path.join("MS2VariantFinder", "generate_ms2_table.py"), "output_arg": "--output", "output": "ms2_table.{format}", "tables": ["ms2_table", "ms2_table_intensities"]}}
+
+# run name from an mzML file name, without the .gz and .mzML extensions
+def run_name(mzml_file):
+    name = os.path.basename(mzml_file)
+    if name.lower().endswith(".gz"):
+        name = name[:-3]
+    return os.path.splitext(name)[0] if name.lower().endswith(".mzml") else name
+
+# (mzml file, extra tool arguments) of every run: from a manifest table with an "mzml_file" column and an optional "args"
+# column, or from glob patterns
+def collect_runs(patterns, manifest):
+    if manifest:
+        table = read_table(manifest, columns=["mzml_file", "args"], text_columns=["mzml_file", "args"])
+        if "mzml_file" not in table:
+            raise ValueError(f"Manifest '{manifest}' has no 'mzml_file' column")
+        extra_args = table.get("args", np.full(len(table["mzml_file"]), "", dtype=object))
+        base = os.path.dirname(os.path.abspath(manifest))
+        return [(os.path.join(base, mzml_file), shlex.split(args)) for mzml_file, args in zip(table["mzml_file"], extra_args) if mzml_file]
+    files = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    return [(path, []) for path in files]
+
+# sets an address space limit on its own process and then execs the command, which keeps the limit
+LIMIT_WRAPPER = "import os, resource, sys; limit = int(sys.argv[1]); resource.setrlimit(resource.RLIMIT_AS, (limit, limit)); os.execv(sys.argv[2], sys.argv[2:])"
+
+# Command prefix that limits the address space of a worker process to memory_limit GB (POSIX only). The limit is set
+# by a wrapper in the child rather than a preexec_fn, which is not safe to use from the runner's worker threads.
+def memory_limiter(memory_limit):
+    if not memory_limit:
+        return []
+    try:
+        import resource
+    except ImportError:
+        print("WARNING: Memory limits are not supported on this platform; running without them")
+        return []
+    return [sys.executable, "-c", LIMIT_WRAPPER, str(int(memory_limit * 1024 ** 3))]
+
+# output files a successful run of the tool leaves in its run directory: its tables (except those only written when
+# asked for), or its output file if it writes none
+def expected_outputs(tool, output_format):
+    if TOOLS[tool]["tables"]:
+        return [f"{table_name}.{output_format}" for table_name in TOOLS[tool]["tables"] if table_name not in TOOLS[tool].get("optional", [])]
+    return [TOOLS[tool]["output"].format(format=output_format)] if TOOLS[tool]["output"] else []
+
+# Why a finished run failed, or "" if it succeeded. The tools report bad input with an "ERROR:" line and exit with
+# code 0, so a run also fails if its log has such a line or an expected output is missing.
+def run_error(tool, run_dir, log_file, returncode, output_format):
+    if returncode != 0:
+        return f"exit code {returncode}"
+    with open(log_file, errors="replace") as log:
+        errors = [line.strip() for line in log if line.startswith("ERROR:")]
+    if errors:
+        return errors[0]
+    missing = [name for name in expected_outputs(tool, output_format) if not os.path.isfile(os.path.join(run_dir, name))]
+    return f"missing {', '.join(missing)}" if missing else ""
+
+# runs the tool on one mzML file in its own output directory; returns the run's report row
+def run_one(tool, name, mzml_file, tool_args, output_dir, output_format, limiter):
+    run_dir = os.path.join(output_dir, name)
+    os.makedirs(run_dir, exist_ok=True)
+    command = limiter + [sys.executable, os.path.join(SCRIPT_DIR, TOOLS[tool]["script"]), "--mzml_file", os.path.abspath(mzml_file)]
+    if TOOLS[tool]["output_arg"]:
+        command += [TOOLS[tool]["output_arg"], TOOLS[tool]["output"].format(format=output_format)]
+    command += tool_args
+    log_file = os.path.join(run_dir, "run.log")
+
+    start = timeit.default_timer()
+    max_rss = np.nan
+    with open(log_file, "w") as log:
+        process = subprocess.Popen(command, cwd=run_dir, stdout=log, stderr=subprocess.STDOUT)
+        if hasattr(os, "wait4"):
+            # wait4 reports the peak memory of this worker alone
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            max_rss = usage.ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+        else:
+            process.wait()
+    elapsed = timeit.default_timer() - start
+
+    error = run_error(tool, run_dir, log_file, process.returncode, output_format)
+    size = os.path.getsize(mzml_file) / 1024 ** 2
+    return {"run": name,
+            "mzml file": mzml_file,
+            "status": "failed" if error else "ok",
+            "exit code": process.returncode,
+            "error": error,
+            "size (MB)": size,
+            "elapsed (s)": elapsed,
+            "throughput (MB/s)": size / elapsed if elapsed > 0 and not error else np.nan,
+            "max memory (MB)": max_rss,
+            "log": log_file}
+
+# stacks per-run tables into one table with a leading "run" column; columns missing from a run are left empty and
+# columns whose types differ between runs are kept as text
+def concatenate_tables(tables):
+    fieldnames = ["run"]
+    for _, table in tables:
+        fieldnames += [name for name in table if name not in fieldnames]
+    columns = {"run": np.concatenate([np.full(len(next(iter(table.values()), [])), name, dtype=object) for name, table in tables])}
+    for field in fieldnames[1:]:
+        parts = [table[field] if field in table else np.full(len(next(iter(table.values()), [])), np.nan) for _, table in tables]
+        kinds = {part.dtype.kind for part, (_, table) in zip(parts, tables) if field in table}
+        if kinds <= set("iufb"):
+            columns[field] = np.concatenate(parts)
+        else:
+            columns[field] = np.concatenate([as_text(part) for part in parts])
+    return columns, fieldnames
+
+def main():
+    parser = argparse.ArgumentParser(allow_abbrev=False,
+        description="Runs one of the single-file tools on many mzML files in parallel, with per-run output directories, a consolidated table per output and a throughput report. Arguments not listed here are passed on to the tool.")
+    parser.add_argument("--tool", required=True, choices=list(TOOLS), help="Tool to run on every mzML file")
+    parser.add_argument("--mzml_files", nargs="+", default=[], help="mzML files or glob patterns, e.g. \"data/*AlCl3*.mzML\"")
+    parser.add_argument("--manifest", default=None, help="Table (CSV, TSV, XLSX, Parquet, Arrow) with an 'mzml_file' column and an optional 'args' column of extra tool arguments per run")
+    parser.add_argument("--output_dir", required=True, help="Directory for the per-run output directories, consolidated tables and batch report")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Number of runs processed at the same time")
+    parser.add_argument("--memory_limit", type=float, default=None, help="Address space limit per run in GB; runs that exceed it fail without affecting the others")
+    args, tool_args = parser.parse_known_args()
+
+    if not args.mzml_files and not args.manifest:
+        print("ERROR: Parameter --mzml_files or --manifest must be provided. See --help for more information")
+        return
+    if TOOLS[args.tool]["output_arg"] in tool_args:
+        print(f"ERROR: {TOOLS[args.tool]['output_arg']} is set by the batch runner for each run; use --output_dir instead")
+        return
+
+    try:
+        runs = collect_runs(args.mzml_files, args.manifest)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        return
+    for mzml_file, _ in runs:
+        if not os.path.isfile(mzml_file):
+            print(f"WARNING: File '{mzml_file}' not found or not a file; skipping")
+    runs = [(mzml_file, extra_args) for mzml_file, extra_args in runs if os.path.isfile(mzml_file)]
+    if not runs:
+        print("ERROR: No mzML files found")
+        return
+
+    # the tools choose their table format with --format; GenerateMS2Table and RunQC default to csv
+    output_format = tool_args[tool_args.index("--format") + 1] if "--format" in tool_args[:-1] else "csv"
+    if output_format not in FORMATS:
+        print(f"ERROR: Unknown format '{output_format}'. Choose from {', '.join(FORMATS)}")
+        return
+
+    # unique run names, so that runs with the same file name in different directories do not share an output directory
+    names = []
+    for mzml_file, _ in runs:
+        name = run_name(mzml_file)
+        suffix = 2
+        while name in names:
+            name = f"{run_name(mzml_file)}_{suffix}"
+            suffix += 1
+        names.append(name)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    limiter = memory_limiter(args.memory_limit)
+    workers = max(1, min(args.workers, len(runs)))
+    print(f"INFO: Running {args.tool} on {len(runs)} files with {workers} workers")
+
+    start = timeit.default_timer()
+    reports = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_one, args.tool, name, mzml_file, tool_args + extra_args, args.output_dir, output_format, limiter)
+                   for name, (mzml_file, extra_args) in zip(names, runs)]
+        for future in as_completed(futures):
+            report = future.result()
+            reports.append(report)
+            if report["status"] == "ok":
+                print(f"INFO: {report['run']}: {report['elapsed (s)']:.2f} s, {report['throughput (MB/s)']:.2f} MB/s, {report['max memory (MB)']:.0f} MB peak memory")
+            else:
+                print(f"ERROR: {report['run']} failed ({report['error']}); see {report['log']}")
+    wall_time = timeit.default_timer() - start
+
+    # report rows in input order rather than completion order
+    order = {name: i for i, name in enumerate(names)}
+    reports.sort(key=lambda report: order[report["run"]])
+    report_file = os.path.join(args.output_dir, f"batch_report.{output_format}")
+    write_table(report_file, {name: [report[name] for report in reports] for name in reports[0]}, output_format)
+
+    for table_name in TOOLS[args.tool]["tables"]:
+        tables = []
+        for report in reports:
+            table_file = os.path.join(args.output_dir, report["run"], f"{table_name}.{output_format}")
+            if report["status"] == "ok" and os.path.isfile(table_file):
+                tables.append((report["run"], read_table(table_file, input_format=output_format)))
+        if not tables:
+            continue
+        columns, fieldnames = concatenate_tables(tables)
+        combined_file = os.path.join(args.output_dir, f"{table_name}_combined.{output_format}")
+        rows_written = write_table(combined_file, columns, output_format, fieldnames=fieldnames)
+        print(f"INFO: Wrote {rows_written} rows from {len(tables)} runs to {combined_file}")
+
+    failed = sum(report["status"] != "ok" for report in reports)
+    total_size = sum(report["size (MB)"] for report in reports if report["status"] == "ok")
+    busy_time = sum(report["elapsed (s)"] for report in reports if report["status"] == "ok")
+    print(f"INFO: Finished {len(reports)} runs ({failed} failed) in {wall_time:.2f} seconds: {total_size:.1f} MB processed at {total_size / wall_time:.2f} MB/s, "
+          f"{busy_time / wall_time:.1f}x faster than running them one after another")
+    print(f"INFO: Wrote batch report to {report_file}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 # example python CalculateCycleTime.py --mzml_file "C:\Users\miawc\OneDrive\Documents\ISB_INTERNSHIP\mia_data\mzml_files\prm\260113_mEclipse_PRM_ncORF89-AlK(S04)2.mzML" --output_file "C:\Users\miawc\OneDrive\Documents\ISB_INTERNSHIP\mia_data\peptide_089\cycle_times\AlK_cycle_time.xlsx
 # 
 
+import os
+import sys
 import argparse
 from pyteomics import mzml
-import pandas as pd
 import numpy as np
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "MS2VariantFinder", "mzml_tools"))
+from table_writer import write_table, FORMATS
+
 def compute_full_ms1_cycles(mzml_file):
     ms1_rts = []
     ms1_scan_numbers = []
@@ -39,25 +43,27 @@ def compute_full_ms1_cycles(mzml_file):
 
     return ms1_scan_numbers, ms1_rts, cycle_times
 
-def save_to_excel(scan_numbers, ms1_rts, cycle_times, output_file):
+# streams the table to the output file (write-only XLSX by default, or CSV/TSV/Parquet/Arrow)
+def save_table(scan_numbers, ms1_rts, cycle_times, output_file, output_format=None, row_group_size=10000):
     data = {
         "MS1 Scan #": scan_numbers[:-1],  # last scan has no next MS1
         "MS1 Retention Time (s)": ms1_rts[:-1],
         "Full Cycle Time (s)": cycle_times
     }
-    df = pd.DataFrame(data)
-    df.to_excel(output_file, index=False)
-    print(f"Excel file saved to {output_file}")
+    write_table(output_file, data, output_format, row_group_size)
+    print(f"Table saved to {output_file}")
     print(f"Average full cycle time: {np.mean(cycle_times):.2f} s")
 
 def main():
-    parser = argparse.ArgumentParser(description="Compute true full MS1 cycle times and export to Excel")
+    parser = argparse.ArgumentParser(description="Compute true full MS1 cycle times and write them to a CSV, TSV, XLSX, Parquet or Arrow table")
     parser.add_argument("--mzml_file", required=True, help="Input mzML file")
-    parser.add_argument("--output_file", required=True, help="Output Excel file (.xlsx)")
+    parser.add_argument("--output_file", required=True, help="Output file (.xlsx, .csv, .tsv, .parquet or .arrow)")
+    parser.add_argument("--format", default=None, choices=FORMATS, help="Output table format (default: from the --output_file extension, else csv)")
+    parser.add_argument("--row_group_size", type=int, default=10000, help="Rows written to the output file at a time")
     args = parser.parse_args()
 
     scan_numbers, ms1_rts, cycle_times = compute_full_ms1_cycles(args.mzml_file)
-    save_to_excel(scan_numbers, ms1_rts, cycle_times, args.output_file)
+    save_table(scan_numbers, ms1_rts, cycle_times, args.output_file, args.format, args.row_group_size)
 
 if __name__ == "__main__":
     main()
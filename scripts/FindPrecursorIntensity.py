@@ -2,89 +2,78 @@
 # py FindPrecursorIntensity.py --mzml_file "C:\Users\miawc\OneDrive\Documents\ISB_INTERNSHIP\mia_data\mzml_files\251203_mEclipse_ncORF89-Al(OH)3.mzML" --window_size 10 --output "C:\Users\miawc\OneDrive\Documents\ISB_INTERNSHIP\mia_data\peptide_089\precursor_intensities_4ppm\precursorintensity_089_aloh_4ppm.csv"
 
 import os
+import sys
 import argparse
-import pandas as pd
-from pyteomics import mzml
-import csv
 import numpy as np
 
-def find_peak_in_scan(scan, guess_mz, ppm):
-    mz_array = scan['m/z array']
-    intensity_array = scan['intensity array']
-
-    tolerance_da = (guess_mz * ppm) / 1e6
-
-    closest_mz = None
-    closest_intensity = 0.0
-
-    for mz, intensity in zip(mz_array, intensity_array):
-        if abs(mz - guess_mz) <= tolerance_da:
-            if closest_mz is None or abs(mz - guess_mz) < abs(closest_mz - guess_mz):
-                closest_mz = mz
-                closest_intensity = intensity
-
-    return closest_mz, closest_intensity
-
-def get_precursor_intensity(ms1_scans, ms2_scan_time, precursor_mz, window_size, ppm):
-    ms2_inx = next((i for i, s in enumerate(ms1_scans) if s['ScanTime'] >= ms2_scan_time), None)
-    if ms2_inx is None:
-        return
-    
-    start = max(ms2_inx - window_size, 0)
-    end = min(ms2_inx + window_size + 1, len(ms1_scans))
-    ms1_window = ms1_scans[start:end]
-
-    mz_values = []
-    intensity_values = []
-
-    for scan in ms1_window:
-        mz, intensity = find_peak_in_scan(scan, precursor_mz, ppm)
-        mz_values.append(mz if mz is not None else "NA")
-        intensity_values.append(intensity)
-
-    while len(mz_values) < 20:
-        mz_values.append("NA")
-        intensity_values.append(0.0)
-    
-    mz_values = mz_values[:20]
-    intensity_values = intensity_values[:20]
-
-    max_intensity = max(intensity_values)
-
-    return {
-    'mz_values': mz_values,
-    'intensity_values': intensity_values,
-    'max_intensity': max_intensity
-    }
-
-def process_ms1_window(ms1_scans, center_idx, guess_mz, window_size, ppm):
-    start = max(center_idx - window_size, 0)
-    end = min(center_idx + window_size + 1, len(ms1_scans))
-    ms1_window = ms1_scans[start:end]
-
-    mz_values = []
-    intensity_values = []
-
-    for scan in ms1_window:
-        mz, intensity = find_peak_in_scan(scan, guess_mz, ppm)
-        mz_values.append(mz if mz is not None else "NA")
-        intensity_values.append(intensity)
-
-    # Ensure exactly 20 points
-    while len(mz_values) < 20:
-        mz_values.append("NA")
-        intensity_values.append(0.0)
-
-    mz_values = mz_values[:20]
-    intensity_values = intensity_values[:20]
-
-    max_intensity = max(intensity_values) if intensity_values else 0.0
-
-    return {
-    'mz_values': mz_values,
-    'intensity_values': intensity_values,
-    'max_intensity': max_intensity
-    }
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "MS2VariantFinder", "mzml_tools"))
+from spectrum_reader import read_spectra
+from tic_reader import spectrum_tic
+from table_writer import write_table, format_from_extension, FORMATS
+
+# For every (MS1 ordinal, guess m/z) query, finds the peak closest to the guess m/z within ppm in that MS1 scan.
+# Queries are grouped by scan so each scan is searched once with all of its queries. Returns the matched m/z
+# (NaN if none), intensity (0 if none, in the dtype of the intensity arrays) and a found mask.
+def find_peaks_in_scans(ms1_mz_arrays, ms1_intensity_arrays, ordinals, guess_mzs, ppm):
+    closest_mzs = np.full(len(ordinals), np.nan)
+    closest_intensities = np.zeros(len(ordinals), dtype=intensity_dtype(ms1_intensity_arrays))
+    found = np.zeros(len(ordinals), dtype=bool)
+
+    order = np.argsort(ordinals, kind='stable')
+    scan_ordinals, group_starts = np.unique(ordinals[order], return_index=True)
+    group_ends = np.append(group_starts[1:], len(order))
+
+    for ordinal, start, end in zip(scan_ordinals, group_starts, group_ends):
+        mz_array = ms1_mz_arrays[ordinal]
+        intensity_array = ms1_intensity_arrays[ordinal]
+        if len(mz_array) == 0:
+            continue
+        if np.any(np.diff(mz_array) < 0):
+            sort = np.argsort(mz_array, kind='stable')
+            mz_array = mz_array[sort]
+            intensity_array = intensity_array[sort]
+
+        queries = order[start:end]
+        guess_mz = guess_mzs[queries]
+        tolerance_da = (guess_mz * ppm) / 1e6
+
+        # nearest peak is either the first peak >= guess or the first occurrence of the peak value just below it
+        right = np.searchsorted(mz_array, guess_mz, side='left')
+        below = np.maximum(right - 1, 0)
+        left = np.searchsorted(mz_array, mz_array[below], side='left')
+        right_distance = np.where(right < len(mz_array), np.abs(mz_array[np.minimum(right, len(mz_array) - 1)] - guess_mz), np.inf)
+        left_distance = np.where(right > 0, np.abs(mz_array[left] - guess_mz), np.inf)
+        closest = np.where(left_distance <= right_distance, left, np.minimum(right, len(mz_array) - 1))
+        hit = np.minimum(left_distance, right_distance) <= tolerance_da
+
+        closest_mzs[queries[hit]] = mz_array[closest[hit]]
+        closest_intensities[queries[hit]] = intensity_array[closest[hit]]
+        found[queries[hit]] = True
+
+    return closest_mzs, closest_intensities, found
+
+# dtype that holds the values of all intensity arrays without loss, so 32-bit and 64-bit files keep their precision
+def intensity_dtype(intensity_arrays):
+    return np.result_type(*{np.asarray(array).dtype for array in intensity_arrays}) if len(intensity_arrays) else np.float64
+
+# Resolves the MS1 windows of many centers at once: up to 20 MS1 scans from center - window_size to
+# center + window_size, padded with "NA" m/z and 0.0 intensity.
+def process_ms1_windows(ms1_mz_arrays, ms1_intensity_arrays, centers, guess_mzs, window_size, ppm):
+    ms1_count = len(ms1_mz_arrays)
+    starts = np.maximum(centers - window_size, 0)
+    ends = np.minimum(centers + window_size + 1, ms1_count)
+    window_ordinals = starts[:, None] + np.arange(20)
+    in_window = window_ordinals < ends[:, None]
+
+    query_rows, query_columns = np.nonzero(in_window)
+    closest_mzs, closest_intensities, found = find_peaks_in_scans(
+        ms1_mz_arrays, ms1_intensity_arrays, window_ordinals[query_rows, query_columns], guess_mzs[query_rows], ppm)
+
+    mz_values = np.full(in_window.shape, "NA", dtype=object)
+    intensity_values = np.zeros(in_window.shape, dtype=closest_intensities.dtype)
+    mz_values[query_rows[found], query_columns[found]] = list(closest_mzs[found])
+    intensity_values[query_rows, query_columns] = closest_intensities
+    return mz_values, intensity_values
 
 def main():
     parser = argparse.ArgumentParser(description='Estimate precursor m/z from MS1 scans around MS2 scans')
@@ -93,114 +82,95 @@ def main():
     parser.add_argument('--output', default='estimated_precursor_values.csv', help='Output CSV file')
     parser.add_argument('--ppm', type=float, default=4.0,
                     help='Mass tolerance in ppm for precursor matching')
+    parser.add_argument('--scan_range', default=None, help='Only read scans in this inclusive range, e.g. "1420,1520"')
+    parser.add_argument('--rt_range', default=None, help='Only read scans in this inclusive retention time range, e.g. "20.5,31"')
+    parser.add_argument('--format', default=None, choices=FORMATS, help='Output table format (default: from the --output extension, else csv)')
+    parser.add_argument('--row_group_size', type=int, default=10000, help='Rows written to the output file at a time')
     args = parser.parse_args()
+    output_format = args.format or format_from_extension(args.output) or 'csv'
+
+    scan_range = tuple(map(int, args.scan_range.split(','))) if args.scan_range else None
+    rt_range = tuple(map(float, args.rt_range.split(','))) if args.rt_range else None
 
     if not os.path.isfile(args.mzml_file):
         print(f"ERROR: mzML file {args.mzml_file} not found")
         return
 
-    # Step 1: Read all spectra and store MS1 and MS2 scans
-    ms1_scans = []
-    ms2_scans = []
-
-    with mzml.read(args.mzml_file) as reader:
-        for spectrum in reader:
-            if spectrum['ms level'] == 1:
-                ms1_scans.append({
-                    'ScanNumber': int(spectrum['id'].split('=')[-1]) if 'id' in spectrum else None,
-                    'ScanTime': spectrum['scanList']['scan'][0]['scan start time'] if 'scanList' in spectrum else None,
-                    'm/z array': spectrum['m/z array'],
-                    'intensity array': spectrum['intensity array']
-                })
-            elif spectrum['ms level'] == 2:
-                # Extract precursor m/z from mzML
-                precursor_mz = spectrum['precursorList']['precursor'][0]['selectedIonList']['selectedIon'][0]['selected ion m/z']
-                scan_number = int(spectrum['id'].split('=')[-1]) if 'id' in spectrum else None
-                ms2_scans.append({
-                    'ScanNumber': scan_number,
-                    'ScanTime': spectrum['scanList']['scan'][0]['scan start time'] if 'scanList' in spectrum else None,
-                    'Precursor_m/z': precursor_mz,
-                    'Spectrum': spectrum
-                })
-
-    ms1_count = len(ms1_scans)
-    results = []
-
-    # Process MS1 scans to find apex
-    apex_scan = max(ms1_scans, key=lambda s: sum(s['intensity array']))
-    apex_idx = ms1_scans.index(apex_scan)
-    apex_mz_array = apex_scan['m/z array']
-    apex_int_array = apex_scan['intensity array']
+    # Step 1: Read all spectra and store MS1 peaks and MS2 precursors
+    ms1_scan_numbers = []
+    ms1_scan_times = []
+    ms1_mz_arrays = []
+    ms1_intensity_arrays = []
+    ms1_tics = []
+    ms2_scan_numbers = []
+    ms2_scan_times = []
+    ms2_precursor_mzs = []
+    ms2_tics = []
+
+    for spectrum in read_spectra(args.mzml_file, scan_range, rt_range):
+        if spectrum['ms level'] == 1:
+            ms1_scan_numbers.append(int(spectrum['id'].split('=')[-1]) if 'id' in spectrum else None)
+            ms1_scan_times.append(spectrum['scanList']['scan'][0]['scan start time'] if 'scanList' in spectrum else None)
+            ms1_mz_arrays.append(spectrum['m/z array'])
+            ms1_intensity_arrays.append(spectrum['intensity array'])
+            ms1_tics.append(spectrum_tic(spectrum))
+        elif spectrum['ms level'] == 2:
+            # Extract precursor m/z from mzML
+            ms2_precursor_mzs.append(spectrum['precursorList']['precursor'][0]['selectedIonList']['selectedIon'][0]['selected ion m/z'])
+            ms2_scan_numbers.append(int(spectrum['id'].split('=')[-1]) if 'id' in spectrum else None)
+            ms2_scan_times.append(spectrum['scanList']['scan'][0]['scan start time'] if 'scanList' in spectrum else None)
+            ms2_tics.append(spectrum_tic(spectrum))
+
+    if len(ms1_mz_arrays) == 0:
+        print(f"ERROR: No MS1 scans found in {args.mzml_file} within the selected range")
+        return
+
+    ms1_scan_times = np.array(ms1_scan_times, dtype=float)
+    ms2_scan_times = np.array(ms2_scan_times, dtype=float)
+    ms2_precursor_mzs = np.array(ms2_precursor_mzs, dtype=float)
+
+    # Process MS1 scans to find apex, using the TIC stored in each spectrum header when available
+    apex_idx = int(np.argmax(ms1_tics))
+    apex_mz_array = ms1_mz_arrays[apex_idx]
+    apex_int_array = ms1_intensity_arrays[apex_idx]
     guess_mz_apex = apex_mz_array[np.argmax(apex_int_array)]
 
-    features = process_ms1_window(
-        ms1_scans, apex_idx, guess_mz_apex, args.window_size, args.ppm
+    apex_mz_values, apex_intensity_values = process_ms1_windows(
+        ms1_mz_arrays, ms1_intensity_arrays, np.array([apex_idx]), np.array([guess_mz_apex]), args.window_size, args.ppm
     )
 
-    mz_values = features['mz_values']
-    intensity_values = features['intensity_values']
-    max_intensity = features['max_intensity']
-
+    # Step 2: Process all MS2 scans at once; each MS2 is centered on the first MS1 scan at or after its scan time
+    ms2_centers = np.searchsorted(ms1_scan_times, ms2_scan_times, side='left')
+    has_ms1 = ms2_centers < len(ms1_scan_times)
 
+    mz_values, intensity_values = process_ms1_windows(
+        ms1_mz_arrays, ms1_intensity_arrays, ms2_centers[has_ms1], ms2_precursor_mzs[has_ms1], args.window_size, args.ppm
+    )
 
-    apex_row = {
-        'MS2Scan': apex_scan['ScanNumber'],
-        'Maximum Precursor Intensity': max_intensity,
-        'MS2 TIC': 0
+    # Step 3: Write the apex row, then the MS2 rows by decreasing MS2 TIC, as columns
+    ms2_rows = np.flatnonzero(has_ms1)
+    order = np.argsort(-np.array(ms2_tics, dtype=float)[ms2_rows], kind='stable')
+    mz_values = np.concatenate([apex_mz_values, mz_values[order]])
+    intensity_values = np.concatenate([apex_intensity_values, intensity_values[order]])
+    if output_format in ('parquet', 'arrow'):
+        # typed columns: missing m/z values become nulls instead of "NA"
+        mz_values = np.where(mz_values == 'NA', np.nan, mz_values).astype(float)
+
+    columns = {
+        'MS2Scan': [ms1_scan_numbers[apex_idx]] + [ms2_scan_numbers[i] for i in ms2_rows[order]],
+        'MS2 TIC': [0] + [ms2_tics[i] for i in ms2_rows[order]],
+        'Maximum Precursor Intensity': intensity_values.max(axis=1)
     }
     for i in range(20):
-        apex_row[f'mz_{i+1}'] = mz_values[i]
-        apex_row[f'int_{i+1}'] = intensity_values[i]
-
-    results.append(apex_row)
-
-    # Process each MS2 scan
-    for ms2 in ms2_scans:
-        ms2_scan = ms2['ScanNumber']
-        spectrum = ms2['Spectrum']
-        guess_mz = ms2['Precursor_m/z']
-        total_ion_current = np.sum(spectrum['intensity array'])
-
-        features = get_precursor_intensity(
-            ms1_scans,
-            ms2['ScanTime'],
-            guess_mz,
-            args.window_size,
-            args.ppm
-        )
-        # print(type(features), features)
-
-        if features is None:
-            continue
-
-        row = {
-            'MS2Scan': ms2_scan,    
-            'Maximum Precursor Intensity': features['max_intensity'],
-            'MS2 TIC': total_ion_current
-        }
-
-        for i in range(20):
-            row[f'mz_{i+1}'] = features['mz_values'][i]
-            row[f'int_{i+1}'] = features['intensity_values'][i]
-
-        results.append(row)
-
-    # Step 3: Write CSV
-    apex = results[0]
-    real_ms2_rows = results[1:]
-    real_ms2_rows.sort(key=lambda x: x['MS2 TIC'], reverse=True)
-    results = [apex] + real_ms2_rows
+        columns[f'mz_{i+1}'] = mz_values[:, i]
+        columns[f'int_{i+1}'] = intensity_values[:, i]
 
     fieldnames = ['MS2Scan', 'MS2 TIC', 'Maximum Precursor Intensity',''] + \
                  [f'mz_{i+1}' for i in range(20)] + [f'int_{i+1}' for i in range(20)]
-    
-    with open(args.output, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in results:
-            writer.writerow(row)
-
-    print(f"INFO: Wrote estimated precursor m/z and intensities for {len(results)} MS2 scans to {args.output}")
+
+    rows_written = write_table(args.output, columns, output_format, args.row_group_size, fieldnames=fieldnames)
+
+    print(f"INFO: Wrote estimated precursor m/z and intensities for {rows_written} MS2 scans to {args.output}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -9,19 +9,49 @@ import argparse
 import os.path
 import timeit
 
-import csv
+import sys
 import numpy as np
 
 from pyteomics import mzml, auxiliary
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "MS2VariantFinder", "mzml_tools"))
+from table_writer import TableWriter, FORMATS, format_from_extension
+from table_reader import read_table
+
+ANNOTATION_FIELDS = ["confidence", "modification", "usi", "comments"]
+
+# Scan numbers and annotation columns of one previous annotated list, one row per scan (the last row of a repeated
+# scan). Rows without an integer scan number are skipped; files with an unknown extension are read as TSV.
+def read_annotation_list(previous_list):
+    table = read_table(previous_list, columns=["scan number"] + ANNOTATION_FIELDS,
+                       input_format=format_from_extension(previous_list) or "tsv", text_columns=["scan number"] + ANNOTATION_FIELDS)
+    scan_numbers = np.char.strip(table.get("scan number", np.array([], dtype=object)).astype(str))
+    valid = np.char.isdigit(np.char.lstrip(scan_numbers, "+-"))
+    keys = scan_numbers[valid].astype(np.int64)
+    # np.unique keeps the first of each key, so it runs over the reversed rows to keep the last
+    keys, last = np.unique(keys[::-1], return_index=True)
+    rows = np.flatnonzero(valid)[::-1][last]
+    annotations = {name: table[name][rows] if name in table else np.full(len(keys), "", dtype=object) for name in ANNOTATION_FIELDS}
+    return keys, annotations
+
+# sorted merge of table keys against unique sorted keys: whether each table key was found, and its position in keys
+def join_on_keys(table_keys, keys):
+    positions = np.searchsorted(keys, table_keys)
+    found = positions < len(keys)
+    found[found] = keys[positions[found]] == table_keys[found]
+    return found, np.minimum(positions, max(len(keys) - 1, 0))
+
 class GenerateMS2Table:
     def __init__(self):
         parser = argparse.ArgumentParser(
             prog="GenerateMS2Table",
             description="Writes out CSV table with MS2 spectra with columns including file root, scan no., scan time, and total ion current (TIC)")
         parser.add_argument("--mzml_file", help="Name of mzML file")
-        parser.add_argument("--previous_list", help="Previous annotated list (accepts CSV, TSV files)")
+        parser.add_argument("--previous_list", nargs="+", help="Previous annotated list(s) (accepts CSV, TSV, XLSX, Parquet, Arrow files)")
+        parser.add_argument("--precedence", default="last", choices=["first", "last"], help="Which previous list wins when several annotate the same scan: the last given (default) or the first given")
         parser.add_argument("--precursor_mz", help="Precursor mz of peptide")
+        parser.add_argument("--format", default="csv", choices=FORMATS, help="Output table format")
+        parser.add_argument("--row_group_size", type=int, default=10000, help="Rows written to the output file at a time")
 
         args = parser.parse_args()
 
@@ -35,15 +65,25 @@ class GenerateMS2Table:
             return
 
         self.mzml_file = args.mzml_file
-        self.previous_list = args.previous_list
+        self.previous_lists = args.previous_list or []
+        self.precedence = args.precedence
         self.precursor_mz = float(args.precursor_mz)
-        self.spectra = []
+        self.output_format = args.format
+        self.row_group_size = args.row_group_size
+        self.output_file = f"ms2_table.{args.format}"
+        self.spectra = {}
         self.start = timeit.default_timer()
         self.stats = { 'counter': 0, 'ms1spectra': 0, 'ms2spectra': 0 }
 
     def read_mzml(self):
+        scan_numbers = []
+        scan_times = []
+        total_ion_currents = []
+        precursor_mzs = []
+        charges = []
+        injection_times = []
         with mzml.read(self.mzml_file) as reader:
-            # iterates through mzml file and collects precursor mz, charge, scan no., time, precursor mass delta, tic,
+            # iterates through mzml file and collects precursor mz, charge, scan no., time, tic and injection time as columns
             for spectrum in reader:
                 self.stats['counter'] += 1
 
@@ -52,65 +92,61 @@ class GenerateMS2Table:
                 elif spectrum['ms level'] == 2:
                     self.stats['ms2spectra'] += 1
 
-                    precursor_mz = spectrum['precursorList']['precursor'][0]['selectedIonList']['selectedIon'][0]['selected ion m/z']
-                    charge = int(spectrum['precursorList']['precursor'][0]['selectedIonList']['selectedIon'][0]['charge state'])
-                    scan_number = 1 + spectrum['index']
-                    scan_time = spectrum['scanList']['scan'][0]['scan start time']
-                    mass_delta = precursor_mz * charge - self.precursor_mz * 2 - 1.00727 * (charge - 2)
-                    total_ion_current = np.sum(spectrum['intensity array'])
+                    selected_ion = spectrum['precursorList']['precursor'][0]['selectedIonList']['selectedIon'][0]
+                    precursor_mzs.append(selected_ion['selected ion m/z'])
+                    charges.append(int(selected_ion['charge state']))
+                    scan_numbers.append(1 + spectrum['index'])
+                    scan_times.append(spectrum['scanList']['scan'][0]['scan start time'])
+                    total_ion_currents.append(np.sum(spectrum['intensity array']))
                     injection_time = spectrum.get('scanList', {}).get('scan', [{}])[0].get('ion injection time', None)
-
-                    spectrum_data = {'file root' : self.mzml_file,
-                                     'scan number' : scan_number,
-                                     'scan time' : scan_time,
-                                     'total ion current' : total_ion_current,
-                                     'precursor m/z' : precursor_mz,
-                                     'precursor charge' : charge,
-                                     'precursor mass delta' : mass_delta,
-                                     'injection time' : injection_time
-                                     }
-                    self.spectra.append(spectrum_data)
-
+                    injection_times.append(np.nan if injection_time is None else injection_time)
+
+        precursor_mzs = np.array(precursor_mzs, dtype=np.float64)
+        charges = np.array(charges, dtype=np.int64)
+        self.spectra = {'file root' : np.full(len(scan_numbers), self.mzml_file, dtype=object),
+                        'scan number' : np.array(scan_numbers, dtype=np.int64),
+                        'scan time' : np.array(scan_times, dtype=np.float64),
+                        'total ion current' : np.array(total_ion_currents) if total_ion_currents else np.zeros(0, dtype=np.float32),
+                        'precursor m/z' : precursor_mzs,
+                        'precursor charge' : charges,
+                        'precursor mass delta' : precursor_mzs * charges - self.precursor_mz * 2 - 1.00727 * (charges - 2),
+                        'injection time' : np.array(injection_times, dtype=np.float64)}
+
+    # Annotations of each previous list, merged into the MS2 table with a keyed join on scan number. Within one list the
+    # last row of a scan wins; across lists each field takes the first non-empty value in precedence order (later lists
+    # first by default, earlier lists first with --precedence first).
     def read_annotation(self):
-        if not self.previous_list:
+        n_rows = len(self.spectra['scan number'])
+        for name in ANNOTATION_FIELDS:
+            self.spectra[name] = np.full(n_rows, "", dtype=object)
+        if not self.previous_lists:
             print("INFO: No previous annotation list provided; skipping annotation merge.")
-            for row in self.spectra:
-                row.update({"confidence": "", "modification": "", "usi": "", "comments": ""})
             return
 
-        ext = os.path.splitext(self.previous_list)[1].lower()
-        d = ',' if ext == '.csv' else '\t'
-
-        annotations = {}
-        with open(self.previous_list, newline='') as file:
-            reader = csv.DictReader(file, delimiter=d)
-            for row in reader:
-                if not any(row.values()):
-                    continue
-                try:
-                    scan_number = int(row.get('scan number', '').strip())
-                except ValueError:
-                    continue
-                annotations[scan_number] = {
-                    "confidence": row.get("confidence", ""),
-                    "modification": row.get("modification", ""),
-                    "usi": row.get("usi", ""),
-                    "comments": row.get("comments", "")
-                }
-
-        blank_annotation_data = {"confidence": "", "modification": "", "usi": "", "comments": ""}
-        for row in self.spectra:
-            scan_number = row['scan number']
-            row.update(annotations.get(scan_number, blank_annotation_data))
-
-    # creates new merged csv file
-    def write_csv(self):
+        previous_lists = self.previous_lists if self.precedence == "first" else self.previous_lists[::-1]
+        for previous_list in previous_lists:
+            keys, annotations = read_annotation_list(previous_list)
+            found, positions = join_on_keys(self.spectra['scan number'], keys)
+            for name in ANNOTATION_FIELDS:
+                # fills only fields that no list of higher precedence has filled
+                fill = found.copy()
+                fill[found] &= (self.spectra[name][found] == "") & (annotations[name][positions[found]] != "")
+                self.spectra[name][fill] = annotations[name][positions[fill]]
+            print(f"INFO: Matched {np.count_nonzero(found)} of {n_rows} scans in {previous_list}")
+
+    # creates new merged table file
+    def write_table(self):
         fieldnames = ["file root", "scan number", "injection time", "scan time", "total ion current", "maximum precursor intensity", "relative intensity", "precursor m/z", "precursor charge", "precursor mass delta", "confidence", "type", "modification", "usi", "comments"]
-        with open("ms2_table.csv", "w", newline="") as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in self.spectra:
-                writer.writerow(row)
+        types = {name: "string" for name in ["file root", "confidence", "type", "modification", "usi", "comments"]}
+        types.update({name: "int64" for name in ["scan number", "precursor charge"]})
+        types.update({name: "float64" for name in fieldnames if name not in types})
+        columns = dict(self.spectra)
+        # scans without an injection time are written as empty cells
+        injection_times = columns['injection time'].astype(object)
+        injection_times[np.isnan(columns['injection time'])] = None
+        columns['injection time'] = injection_times
+        with TableWriter(self.output_file, fieldnames, self.output_format, self.row_group_size, types) as writer:
+            writer.write_columns(columns)
 
 def main():
 
@@ -124,9 +160,9 @@ def main():
     print(f"INFO: Processed {generate_table.stats['counter'] / (end - generate_table.start)} spectra per second")
 
     generate_table.read_annotation()
-    print(f"INFO: Merged {generate_table.previous_list} and {generate_table.mzml_file} data.")
-    generate_table.write_csv()
-    print(f"INFO: Generated MS2 table. Length of file: {len(generate_table.spectra)}. Output file: 'ms2_table.csv'")
+    print(f"INFO: Merged {', '.join(generate_table.previous_lists) or None} and {generate_table.mzml_file} data.")
+    generate_table.write_table()
+    print(f"INFO: Generated MS2 table. Length of file: {len(generate_table.spectra['scan number'])}. Output file: '{generate_table.output_file}'")
 
     final_end = timeit.default_timer()
     print(f"Total elapsed time: {final_end - generate_table.start}")
@@ -5,13 +5,14 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 from pyteomics import mzml
 import numpy as np
-import re
 from matplotlib.patches import Rectangle
 import gzip 
+import os
+import sys
 
-def ppm_to_da(mz, ppm):
-    return mz * ppm / 1e6
-
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MS2VariantFinder", "mzml_tools"))
+from peak_index import read_ms1_index
+from tic_reader import read_spectrum_tics
 
 def parse_ranges(range_str):
     ranges = []
@@ -28,6 +29,13 @@ def open_mzml_file(filename):
     else:
         return open(filename, "rb")
 
+# read all MS1 peaks into one m/z-sorted index so every XIC is a slice of it instead of a pass over the file; with a
+# scan or retention time range only the spectra inside it are decoded; with centroid, profile-mode spectra are
+# centroided once here, so every lookup runs on centroids
+def load_ms1_index(mzml_file, scan_range=None, rt_range=None, centroid=False):
+    with open_mzml_file(mzml_file) as infile:
+        return read_ms1_index(infile, scan_range, rt_range, centroid)
+
 # detect whether the file is DDA or PRM based on presence of SIM filter strings in MS1 spectra
 def detect_acquisition_mode(mzml_file):
 
@@ -50,28 +58,6 @@ def detect_acquisition_mode(mzml_file):
 
         return "DDA"
 
-# check if target m/z falls within SIM window defined in filter string
-def target_in_sim_window(spectrum, target_mz):
-
-    try:
-        scan = spectrum["scanList"]["scan"][0]
-        filterstring = scan.get("filter string", "")
-    except Exception:
-        return False
-
-    if "SIM" not in filterstring.upper():
-        return False
-
-    match = re.search(r"\[(\d+\.?\d*)-(\d+\.?\d*)\]", filterstring)
-
-    if not match:
-        return False
-
-    start = float(match.group(1))
-    end = float(match.group(2))
-
-    return start <= target_mz <= end
-
 # read XIC for given target m/z and mode, applying ppm tolerance and optional scan range filter
 def read_xic(
     mzml_file,
@@ -79,59 +65,29 @@ def read_xic(
     mode,
     ppm=4.0,
     scan_range=None,
-    normalized=True
+    normalized=True,
+    peak_index=None
 ):
 
-    scan_numbers = []
-    intensities = []
+    if peak_index is None:
+        peak_index = load_ms1_index(mzml_file)
 
-    tol_da = ppm_to_da(target_mz, ppm)
+    # PRM/SIM restriction
+    mask = peak_index.scan_mask(
+        scan_range=scan_range,
+        sim_mz=target_mz if mode == "PRM" else None
+    )
 
-    with open_mzml_file(mzml_file) as infile:
-        with mzml.read(infile) as reader:
+    intensities = peak_index.xic(target_mz, ppm)[mask]
 
-            for spectrum in reader:
-    
-                if spectrum.get("ms level", 1) != 1:
-                    continue
-    
-                scan_number = int(spectrum["id"].split("=")[-1])
-    
-                if scan_range and not (
-                    scan_range[0] <= scan_number <= scan_range[1]
-                ):
-                    continue
-    
-                # PRM/SIM restriction
-                if mode == "PRM":
-    
-                    if not target_in_sim_window(spectrum, target_mz):
-                        continue
-    
-                mz_array = spectrum["m/z array"]
-                intensity_array = spectrum["intensity array"]
-    
-                mask = (
-                    (mz_array >= target_mz - tol_da)
-                    & (mz_array <= target_mz + tol_da)
-                )
-    
-                xic_intensity = intensity_array[mask].sum()
-    
-                if normalized:
-    
-                    try:
-                        scan = spectrum["scanList"]["scan"][0]
-                        inj_time = scan.get("ion injection time", 1) or 1
-                    except Exception:
-                        inj_time = 1
-    
-                    xic_intensity /= inj_time
-    
-                scan_numbers.append(scan_number)
-                intensities.append(xic_intensity)
+    if normalized:
+
+        inj_times = peak_index.iit[mask]
+        inj_times = np.where(np.isnan(inj_times) | (inj_times == 0), 1, inj_times)
 
-    return scan_numbers, np.array(intensities)
+        intensities = intensities / inj_times
+
+    return peak_index.scan_numbers[mask].tolist(), intensities
 
 # compute mass deltas in ppm for observed m/z vs target m/z across scans, with point size scaled by signal intensity
 def compute_mass_deltas(
@@ -139,68 +95,30 @@ def compute_mass_deltas(
     target_mz,
     mode,
     ppm=4.0,
-    scan_range=None
+    scan_range=None,
+    peak_index=None
 ):
 
-    scan_numbers = []
-    delta_ppms = []
-    signals = []
+    if peak_index is None:
+        peak_index = load_ms1_index(mzml_file)
 
-    tol_da = ppm_to_da(target_mz, ppm)
+    # PRM restriction
+    mask = peak_index.scan_mask(
+        scan_range=scan_range,
+        sim_mz=target_mz if mode == "PRM" else None
+    )
 
-    with open_mzml_file(mzml_file) as infile:
-        with mzml.read(infile) as reader:
+    total_intensity, observed_mz = peak_index.weighted_mz(target_mz, ppm)
 
-            for spectrum in reader:
-    
-                if spectrum.get("ms level", 1) != 1:
-                    continue
-    
-                scan_number = int(spectrum["id"].split("=")[-1])
-    
-                if scan_range and not (
-                    scan_range[0] <= scan_number <= scan_range[1]
-                ):
-                    continue
-    
-                # PRM restriction
-                if mode == "PRM":
-    
-                    if not target_in_sim_window(spectrum, target_mz):
-                        continue
-    
-                mz_array = spectrum["m/z array"]
-                intensity_array = spectrum["intensity array"]
-    
-                mask = (
-                    (mz_array >= target_mz - tol_da)
-                    & (mz_array <= target_mz + tol_da)
-                )
-    
-                if not np.any(mask):
-                    continue
-    
-                mz_vals = mz_array[mask]
-                int_vals = intensity_array[mask]
-    
-                total_intensity = int_vals.sum()
-    
-                if total_intensity == 0:
-                    continue
-    
-                observed_mz = np.sum(mz_vals * int_vals) / total_intensity
-    
-                delta_ppm = (
-                    (observed_mz - target_mz)
-                    / target_mz
-                    * 1e6
-                )
-    
-                scan_numbers.append(scan_number)
-                delta_ppms.append(delta_ppm)
-                signals.append(total_intensity)
+    mask &= total_intensity != 0
+
+    delta_ppms = (
+        (observed_mz[mask] - target_mz)
+        / target_mz
+        * 1e6
+    )
 
-    return scan_numbers, delta_ppms, signals
+    return peak_index.scan_numbers[mask].tolist(), delta_ppms.tolist(), total_intensity[mask].tolist()
 
 # compute average delta ppm in a window of 5 scans starting from the first scan >= specified start scan, to reveal any trends in mass accuracy that may correlate with presence of target peptide or other modifications
 # take the five most intense points in the window to compute the average, to focus on scans where target peptide is likely present and reduce noise from low-intensity scans where mass accuracy may be less reliable
@@ -219,49 +137,28 @@ def average_delta_window(scans, deltas, start_scan):
 
     return None, None, None
 
-# read TIC across scans, applying optional scan range filter and normalization by injection time
+# read TIC across scans, applying optional scan and retention time range filters and normalization by injection time;
+# uses the TIC stored in each spectrum header and only sums intensity arrays for spectra without one
 def read_tic(
     mzml_file,
     scan_range=None,
-    normalized=True
+    normalized=True,
+    rt_range=None
 ):
 
-    scan_numbers = []
-    intensities = []
-
     with open_mzml_file(mzml_file) as infile:
-        with mzml.read(infile) as reader:
+        columns = read_spectrum_tics(infile, 1, scan_range, rt_range)
 
-            for spectrum in reader:
-    
-                if spectrum.get("ms level", 1) != 1:
-                    continue
-    
-                scan_number = int(spectrum["id"].split("=")[-1])
-    
-                if scan_range and not (
-                    scan_range[0] <= scan_number <= scan_range[1]
-                ):
-                    continue
-    
-                intensity_array = spectrum["intensity array"]
-    
-                tic_intensity = intensity_array.sum()
-    
-                if normalized:
-    
-                    try:
-                        scan = spectrum["scanList"]["scan"][0]
-                        inj_time = scan.get("ion injection time", 1) or 1
-                    except Exception:
-                        inj_time = 1
-    
-                    tic_intensity /= inj_time
-    
-                scan_numbers.append(scan_number)
-                intensities.append(tic_intensity)
+    tic_intensity = columns["tic"]
 
-    return scan_numbers, np.array(intensities)
+    if normalized:
+
+        inj_time = columns["ion injection time"]
+        inj_time = np.where(np.isnan(inj_time) | (inj_time == 0), 1, inj_time)
+
+        tic_intensity = tic_intensity / inj_time
+
+    return columns["scan number"].tolist(), tic_intensity
 
 # read injection time for MS1 spectra where target m/z is detected, applying ppm tolerance and optional scan range filter
 def read_injection_time(
@@ -269,58 +166,22 @@ def read_injection_time(
     target_mz,
     mode,
     ppm=4.0,
-    scan_range=None
+    scan_range=None,
+    peak_index=None
 ):
 
-    scan_numbers = []
-    injection_times = []
+    if peak_index is None:
+        peak_index = load_ms1_index(mzml_file)
 
-    tol_da = ppm_to_da(target_mz, ppm)
-
-    with open_mzml_file(mzml_file) as infile:
-        with mzml.read(infile) as reader:
+    mask = peak_index.scan_mask(
+        scan_range=scan_range,
+        sim_mz=target_mz if mode == "PRM" else None
+    )
 
-            for spectrum in reader:
-    
-                if spectrum.get("ms level", 1) != 1:
-                    continue
-    
-                scan_number = int(spectrum["id"].split("=")[-1])
-    
-                if scan_range and not (
-                    scan_range[0] <= scan_number <= scan_range[1]
-                ):
-                    continue
-    
-                if mode == "PRM":
-    
-                    if not target_in_sim_window(spectrum, target_mz):
-                        continue
-    
-                mz_array = spectrum["m/z array"]
-                intensity_array = spectrum["intensity array"]
-    
-                mask = (
-                    (mz_array >= target_mz - tol_da)
-                    & (mz_array <= target_mz + tol_da)
-                )
-    
-                if intensity_array[mask].sum() == 0:
-                    continue
-    
-                try:
-                    scan = spectrum["scanList"]["scan"][0]
-                    inj_time = scan.get("ion injection time")
-                except Exception:
-                    continue
-    
-                if inj_time is None:
-                    continue
-    
-                scan_numbers.append(scan_number)
-                injection_times.append(float(inj_time))
+    mask &= peak_index.xic(target_mz, ppm) != 0
+    mask &= ~np.isnan(peak_index.iit)
 
-    return scan_numbers, injection_times
+    return peak_index.scan_numbers[mask].tolist(), peak_index.iit[mask].tolist()
 
 # main function to parse arguments, detect acquisition mode, and generate PDF with XIC, mass delta, TIC, and injection time plots for specified modifications and scan ranges
 
@@ -333,6 +194,7 @@ def main():
     parser.add_argument("--modifications", required=True)
 
     parser.add_argument("--scan_range", default=None)
+    parser.add_argument("--rt_range", default=None)
 
     parser.add_argument("--xic_ppm", type=float, default=4.0)
     parser.add_argument("--delta_ppm", type=float, default=4.0)
@@ -341,6 +203,8 @@ def main():
 
     parser.add_argument("--no_normalize", action="store_true")
 
+    parser.add_argument("--centroid", action="store_true")
+
     args = parser.parse_args()
 
     mods = []
@@ -357,6 +221,12 @@ def main():
         else [None]
     )
 
+    rt_range = (
+        tuple(map(float, args.rt_range.split(",")))
+        if args.rt_range
+        else None
+    )
+
     normalize = not args.no_normalize
 
     cmap = plt.get_cmap("tab10")
@@ -365,6 +235,15 @@ def main():
 
     print(f"\nDetected acquisition mode: {mode}\n")
 
+    # only decode the spectra spanned by the requested scan ranges
+    index_range = (
+        (min(r[0] for r in scan_ranges), max(r[1] for r in scan_ranges))
+        if args.scan_range
+        else None
+    )
+
+    peak_index = load_ms1_index(args.mzml_file, index_range, rt_range, args.centroid)
+
     with PdfPages(args.output_file) as pdf:
 
         for scan_range in scan_ranges:
@@ -383,7 +262,8 @@ def main():
                     mode,
                     args.xic_ppm,
                     scan_range,
-                    normalize
+                    normalize,
+                    peak_index
                 )
 
                 if len(scans):
@@ -510,7 +390,8 @@ def main():
                         mode,
                         args.xic_ppm,
                         scan_range,
-                        normalize
+                        normalize,
+                        peak_index
                     )
 
                     if len(scans):
@@ -529,7 +410,8 @@ def main():
                         mz,
                         mode,
                         args.delta_ppm,
-                        scan_range
+                        scan_range,
+                        peak_index
                     )
 
                     if not scans:
@@ -631,7 +513,8 @@ def main():
             scans, tic_intensity = read_tic(
                 args.mzml_file,
                 scan_range,
-                normalize
+                normalize,
+                rt_range
             )
 
             if len(scans):
@@ -703,7 +586,8 @@ def main():
                     mz,
                     mode,
                     args.xic_ppm,
-                    scan_range
+                    scan_range,
+                    peak_index
                 )
 
                 if not scans:
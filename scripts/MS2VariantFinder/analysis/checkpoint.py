@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import numpy as np
+
+# JSON value of a table cell: numpy scalars become Python scalars
+def _json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+# hash of the parameters that decide the rows of a run; a checkpoint is only resumed with the same fingerprint
+def fingerprint(parameters):
+    return hashlib.sha1(json.dumps(parameters, sort_keys=True, default=_json_value).encode()).hexdigest()
+
+class Checkpoint:
+    # Append-only JSON lines file of finished table rows. The first line holds the parameter fingerprint; every later
+    # line holds the rows of one scan under its key (a scan number, or a (target, scan number) pair). Lines end in "\n"
+    # on every platform and are flushed to disk every interval rows; a line cut short by a crash is dropped on resume,
+    # so the file always holds whole rows of finished scans.
+    def __init__(self, checkpoint_file, parameters, interval=100, resume=False):
+        self.checkpoint_file = checkpoint_file
+        self.parameters = parameters
+        self.fingerprint = fingerprint(parameters)
+        self.interval = interval
+        self.completed = {}
+        self._unsynced = 0
+
+        if resume and os.path.isfile(checkpoint_file):
+            self.completed = self._read()
+            self._file = open(checkpoint_file, "a", newline="")
+        else:
+            self._file = open(checkpoint_file, "w", newline="")
+            self._file.write(json.dumps({"fingerprint": self.fingerprint, "parameters": parameters}, default=_json_value) + "\n")
+            self._sync()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # rows of the finished scans by key; raises ValueError if the checkpoint was written with other parameters
+    def _read(self):
+        # read as bytes so that tell() gives the byte offsets to truncate at, whatever the line endings
+        with open(self.checkpoint_file, "rb") as file:
+            try:
+                header = json.loads(file.readline())
+            except json.JSONDecodeError:
+                header = {}
+            if header.get("fingerprint") != self.fingerprint:
+                raise ValueError(f"Checkpoint '{self.checkpoint_file}' was written with different parameters: {header.get('parameters')}")
+
+            completed = {}
+            end = file.tell()
+            for line in iter(file.readline, b""):
+                # a line without its newline was cut short by a crash
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                key = tuple(record["key"]) if isinstance(record["key"], list) else record["key"]
+                completed[key] = (record["row"], record["intensity row"])
+                end = file.tell()
+        # drops everything after the last whole line so that appended rows start on a new line
+        with open(self.checkpoint_file, "r+b") as file:
+            file.truncate(end)
+        return completed
+
+    def write(self, key, row, intensity_row):
+        self._file.write(json.dumps({"key": key, "row": row, "intensity row": intensity_row}, default=_json_value) + "\n")
+        self._unsynced += 1
+        if self._unsynced >= self.interval:
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        if not self._file.closed:
+            self._sync()
+            self._file.close()
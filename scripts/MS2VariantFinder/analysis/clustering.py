@@ -0,0 +1,60 @@
+import numpy as np
+import scipy.sparse as sparse
+from models import MSRun
+from constants import PROTON_MASS
+
+BIN_WIDTH = 0.02            # Da
+SIMILARITY = 0.9
+
+# MS2 spectra of scans as rows of a sparse (scans x m/z bins) matrix of square-root intensities, scaled to unit length
+# so that the product of two rows is their cosine similarity
+def spectrum_vectors(run: MSRun, scans, bin_width=BIN_WIDTH):
+    store = run.ms2_peaks
+    rows, peaks = store.gather(np.array([store.ordinal(scan.scan_number) for scan in scans], dtype=np.int64))
+    columns = (store.mz[peaks] / bin_width).astype(np.int64)
+    n_bins = int(columns.max()) + 1 if len(columns) else 1
+    vectors = sparse.csr_matrix((np.sqrt(store.intensity[peaks].astype(np.float64)), (rows, columns)), shape=(len(scans), n_bins))
+    norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+    return sparse.diags(np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)) @ vectors
+
+# bucket id of each scan: scans of one precursor charge whose sorted neutral precursor masses are chained by gaps of at
+# most tolerance (ppm) share a bucket
+def precursor_buckets(scans, tolerance):
+    charge = np.array([scan.precursor_charge for scan in scans], dtype=np.int64)
+    mass = (np.array([scan.precursor_mz for scan in scans], dtype=np.float64) - PROTON_MASS) * charge
+    order = np.lexsort((mass, charge))
+    new_bucket = np.ones(len(scans), dtype=bool)
+    new_bucket[1:] = (charge[order][1:] != charge[order][:-1]) | (np.diff(mass[order]) > mass[order][1:] * tolerance / 1e6)
+    buckets = np.empty(len(scans), dtype=np.int64)
+    buckets[order] = np.cumsum(new_bucket) - 1
+    return buckets
+
+# Representative scan number of each scan (by scan number). Precursor-mass buckets serve as the neighbour index: only
+# scans of one bucket are compared. Within a bucket, the most intense unassigned scan becomes a representative and takes
+# every unassigned scan with a cosine similarity of at least similarity to it, until every scan is assigned. With a
+# similarity of None, spectra are not compared and each bucket is one cluster led by its most intense scan.
+def cluster_scans(run: MSRun, scans, similarity=SIMILARITY, tolerance=10, bin_width=BIN_WIDTH):
+    if len(scans) == 0:
+        return {}
+    vectors = spectrum_vectors(run, scans, bin_width) if similarity is not None else None
+    buckets = precursor_buckets(scans, tolerance)
+    tic = np.array([scan.tic if scan.tic is not None else 0.0 for scan in scans], dtype=np.float64)
+    scan_numbers = np.array([scan.scan_number for scan in scans], dtype=np.int64)
+    representatives = np.empty(len(scans), dtype=np.int64)
+
+    order = np.lexsort((-tic, buckets))
+    bucket_starts = np.flatnonzero(np.r_[True, buckets[order][1:] != buckets[order][:-1]])
+    for members in np.split(order, bucket_starts[1:]):
+        if len(members) == 1 or similarity is None:
+            representatives[members] = scan_numbers[members[0]]
+            continue
+        bucket_vectors = vectors[members]
+        unassigned = np.ones(len(members), dtype=bool)
+        while unassigned.any():
+            leader = np.argmax(unassigned)
+            similarities = (bucket_vectors @ bucket_vectors[leader].T).toarray().ravel()
+            taken = unassigned & (similarities >= similarity)
+            taken[leader] = True
+            representatives[members[taken]] = scan_numbers[members[leader]]
+            unassigned &= ~taken
+    return dict(zip(scan_numbers.tolist(), representatives.tolist()))
@@ -0,0 +1,45 @@
+import numpy as np
+from models import MSRun, Scan
+from constants import ppm
+
+MIN_FRACTION = 0.5
+
+# Merges the peaks of several scans (scan_ids: the member index of each peak) into consensus peaks: peaks sorted by m/z
+# and chained by gaps of at most tolerance (ppm) form one consensus peak with their intensity-weighted mean m/z and
+# mean intensity over the n_scans members. Peaks seen in fewer than min_fraction of the members are dropped as noise.
+# Returns the m/z, intensity and number of contributing members of each consensus peak.
+def merge_peaks(mz, intensity, scan_ids, n_scans, tolerance, min_fraction=MIN_FRACTION):
+    if len(mz) == 0:
+        return np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64)
+    order = np.argsort(mz, kind="stable")
+    mz, intensity, scan_ids = mz[order], intensity[order].astype(np.float64), scan_ids[order]
+    new_peak = np.ones(len(mz), dtype=bool)
+    new_peak[1:] = np.diff(mz) > ppm(mz[1:], tolerance)
+    starts = np.flatnonzero(new_peak)
+    peak_ids = np.cumsum(new_peak) - 1
+
+    summed_intensity = np.add.reduceat(intensity, starts)
+    weighted_mz = np.add.reduceat(mz * intensity, starts)
+    mean_mz = np.add.reduceat(mz, starts) / np.diff(np.append(starts, len(mz)))
+    consensus_mz = np.divide(weighted_mz, summed_intensity, out=mean_mz, where=summed_intensity > 0)
+    # members contributing to each consensus peak, counting a member once however many of its peaks merged
+    pairs = np.unique(peak_ids * n_scans + scan_ids)
+    members = np.bincount(pairs // n_scans, minlength=len(starts))
+
+    keep = members >= max(1, int(np.ceil(min_fraction * n_scans)))
+    return consensus_mz[keep], summed_intensity[keep] / n_scans, members[keep]
+
+# Consensus MS2 spectrum of scans of the same precursor, as a Scan numbered after its most intense member, with the
+# intensity-weighted mean precursor m/z and the summed TIC of the members
+def consensus_spectrum(run: MSRun, scan_numbers, tolerance, min_fraction=MIN_FRACTION):
+    store = run.ms2_peaks
+    scans = [run.get_scan(scan_number) for scan_number in scan_numbers]
+    rows, peaks = store.gather(np.array([store.ordinal(scan_number) for scan_number in scan_numbers], dtype=np.int64))
+    mz, intensity, _ = merge_peaks(store.mz[peaks], store.intensity[peaks], rows, len(scans), tolerance, min_fraction)
+
+    tic = np.array([scan.tic if scan.tic is not None else 0.0 for scan in scans], dtype=np.float64)
+    weights = tic if tic.sum() > 0 else np.ones(len(scans))
+    leader = scans[int(np.argmax(tic))]
+    precursor_mz = float(np.average([scan.precursor_mz for scan in scans], weights=weights))
+    return Scan(leader.scan_number, leader.scan_type, 2, leader.isolation_window, mz, intensity, leader.rt, leader.iit,
+                float(tic.sum()), precursor_mz, leader.precursor_charge, leader.last_ms1_scan)
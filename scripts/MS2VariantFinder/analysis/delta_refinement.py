@@ -0,0 +1,119 @@
+from models import MSRun, Peptide, Modification
+from constants import ppm
+import numpy as np
+from table_reader import read_table
+
+# Scan numbers of all rows of an MS2VariantFinder table (any table format) whose USI carries the modification at
+# mod_index. Tables of several targets only contribute the rows of target, the target sequence as written in their
+# "target" column. With a run, rows whose scan is not an MS2 scan of the run, e.g. rows of a table of another file,
+# are skipped.
+def select_table_scans(table_file, mod_name, mod_index, target=None, run: MSRun = None):
+    table = read_table(table_file, columns=["scan number", "usi", "target"], text_columns=["usi", "target"])
+    scan_numbers = []
+    for i, (scan_number, usi) in enumerate(zip(table["scan number"], table["usi"])):
+        if target is not None and "target" in table and table["target"][i] != target:
+            continue
+        if mod_name not in usi:
+            continue
+        if run is not None and int(scan_number) not in run.ms2_peaks:
+            continue
+        # mzspec:<dataset>:<run>:<scan>:<sequence>/<charge>; the sequence itself may contain colons
+        sequence_string = usi.split(":", 4)[-1].rsplit("/", 1)[0]
+        peptide = Peptide.from_string(sequence_string)
+        if any(mod.name == mod_name and mod.position == mod_index and not mod.is_labile for mod in peptide.modifications):
+            scan_numbers.append(int(scan_number))
+    return scan_numbers
+
+# scan numbers of all MS2 scans whose neutral precursor mass is within tolerance (ppm) of the peptide carrying the
+# modification, from the run's precursor index
+def select_precursor_scans(run: MSRun, sequence: Peptide, modification: Modification, tolerance):
+    ordinals = run.precursor_index.query(sequence.mass(0) + modification.delta, tolerance)
+    return [run.ms2_spectra[i].scan_number for i in ordinals]
+
+# theoretical m/z of every fragment ion with the modification at its Unimod delta, and the slope of each ion's m/z
+# with respect to the modification delta (1 / charge if the ion carries the modification, else 0)
+def fragment_ladder(sequence: Peptide, modification: Modification, max_charge=2):
+    testing_sequence = Peptide(sequence.raw_sequence, [Modification(m.position, m.delta, m.name, m.is_labile) for m in sequence.modifications])
+    testing_modification = Modification(modification.position, modification.delta, modification.name, modification.is_labile)
+    testing_sequence.modifications.append(testing_modification)
+    all_ions = [ion for ion_list in testing_sequence.fragments(max_charge).values() for ion in ion_list]
+    ion_mz = np.array([ion.mz for ion in all_ions])
+    mod_coefficients = np.array([1 / ion.charge if any(mod is testing_modification for mod in ion.valid_mods) else 0.0 for ion in all_ions])
+    return ion_mz, mod_coefficients
+
+# tallest peak within tolerance of every ion m/z; returns the ion indices that matched with their peak m/z and intensity
+def match_fragments(sorted_mz_array, sorted_intensity_array, ion_mz, tolerance):
+    left = np.searchsorted(sorted_mz_array, ion_mz - ppm(ion_mz, tolerance), side="left")
+    right = np.searchsorted(sorted_mz_array, ion_mz + ppm(ion_mz, tolerance), side="right")
+    widths = right - left
+    matched = np.flatnonzero(widths > 0)
+    if len(matched) == 0:
+        return matched, np.zeros(0), np.zeros(0)
+
+    # windows are a few peaks wide, so gather them into a padded matrix and take the first maximum of each row
+    offsets = np.arange(widths[matched].max())
+    positions = left[matched, None] + offsets
+    in_window = offsets < widths[matched, None]
+    window_intensity = np.where(in_window, sorted_intensity_array[np.minimum(positions, len(sorted_mz_array) - 1)], -np.inf)
+    best_positions = positions[np.arange(len(matched)), np.argmax(window_intensity, axis=1)]
+    return matched, sorted_mz_array[best_positions], sorted_intensity_array[best_positions]
+
+# Pools the fragment residuals of many scans carrying the same modification at the same site. Each scan keeps its
+# own weighted mean residual (calibration offset) and intensity weights normalized to 1, so the delta minimizing the
+# pooled weighted residual variance is sum(cov_s) / sum(var_k_s) over scans. Intervals come from resampling scans.
+def refine_delta(run: MSRun, scan_numbers, sequence: Peptide, modification: Modification, tolerance,
+                 n_bootstrap=1000, confidence=0.95, seed=0):
+    ion_mz, mod_coefficients = fragment_ladder(sequence, modification, run.fragment_charge)
+    peaks = run.ms2_peaks
+
+    scan_ids = []
+    residuals = []
+    coefficients = []
+    intensities = []
+    used_scans = []
+    for scan_number in scan_numbers:
+        sorted_mz_array, sorted_intensity_array = peaks.get_peaks(peaks.ordinal(scan_number))
+        matched, found_mz, found_intensity = match_fragments(sorted_mz_array, sorted_intensity_array, ion_mz, tolerance)
+        if len(matched) == 0 or found_intensity.sum() <= 0:
+            continue
+        scan_ids.append(np.full(len(matched), len(used_scans)))
+        residuals.append(found_mz - ion_mz[matched])
+        coefficients.append(mod_coefficients[matched])
+        intensities.append(found_intensity)
+        used_scans.append(scan_number)
+
+    if len(used_scans) == 0:
+        raise ValueError("no fragment peaks found in any selected scan")
+
+    scan_ids = np.concatenate(scan_ids)
+    residuals = np.concatenate(residuals)
+    coefficients = np.concatenate(coefficients)
+    intensities = np.concatenate(intensities).astype(np.float64)
+    n_scans = len(used_scans)
+
+    weights = intensities / np.bincount(scan_ids, weights=intensities, minlength=n_scans)[scan_ids]
+    centered_residuals = residuals - np.bincount(scan_ids, weights=weights * residuals, minlength=n_scans)[scan_ids]
+    centered_coefficients = coefficients - np.bincount(scan_ids, weights=weights * coefficients, minlength=n_scans)[scan_ids]
+    scan_var_r = np.bincount(scan_ids, weights=weights * np.square(centered_residuals), minlength=n_scans)
+    scan_cov = np.bincount(scan_ids, weights=weights * centered_residuals * centered_coefficients, minlength=n_scans)
+    scan_var_k = np.bincount(scan_ids, weights=weights * np.square(centered_coefficients), minlength=n_scans)
+
+    if scan_var_k.sum() == 0:
+        raise ValueError("no matched fragment ions constrain the modification mass")
+    best_offset = scan_cov.sum() / scan_var_k.sum()
+    pooled_variance = max(scan_var_r.sum() - scan_cov.sum() ** 2 / scan_var_k.sum(), 0) / n_scans
+
+    # resample scans with replacement; each bootstrap estimate is a ratio of resampled sums
+    rng = np.random.default_rng(seed)
+    resampled = rng.integers(0, n_scans, size=(n_bootstrap, n_scans))
+    resampled_var_k = scan_var_k[resampled].sum(axis=1)
+    bootstrap_offsets = scan_cov[resampled].sum(axis=1)[resampled_var_k > 0] / resampled_var_k[resampled_var_k > 0]
+    lower, upper = np.quantile(bootstrap_offsets, [(1 - confidence) / 2, (1 + confidence) / 2])
+
+    return {"scans": n_scans,
+            "matched ions": len(residuals),
+            "best delta": modification.delta + best_offset,
+            "pooled stdev": np.sqrt(pooled_variance),
+            "lower bound": modification.delta + lower,
+            "upper bound": modification.delta + upper,
+            "scan numbers": used_scans}
@@ -0,0 +1,162 @@
+import numpy as np
+from dataclasses import dataclass
+from models import Peptide, Modification, Scan
+import unimod
+from constants import ppm
+from usi import score_ions, sorted_peaks
+
+@dataclass
+class Variant:
+    peptide: Peptide
+    label: str          # entry of the localization scores string, as written by localize and localize_synthesis_error
+    name: str           # "No mod", the Unimod name, or "missing X" / "extra X"
+    delta: float        # mass delta to the target
+    mod_type: str
+
+# every single-modification placement (each residue, N-term and labile), single-residue deletion and single-residue
+# insertion of a target, plus the target itself; variants with the same sequence string are kept once. With
+# approved_only, modifications are only placed on the sites Unimod lists for them.
+def variant_space(sequence: Peptide, modification_names=(), approved_only=False):
+    target_mass = sequence.mass(0)
+    variants = {}
+
+    def add(peptide, label, name, mod_type):
+        variants.setdefault(str(peptide), Variant(peptide, label, name, peptide.mass(0) - target_mass, mod_type))
+
+    add(sequence, "No mod", "No mod", "")
+    for name in modification_names:
+        mod_type = "cation" if "Cation" in name else ""
+        for position in range(-1 if approved_only else -2, len(sequence)):
+            if position == -2:
+                label = "Labile"
+            else:
+                residue = sequence.get_residue(position)
+                is_approved = unimod.is_approved(name, residue)
+                if approved_only and not is_approved:
+                    continue
+                label = residue.upper() if is_approved else residue.lower()
+            modification = Modification.from_string(max(position, -1), name, is_labile=position == -2)
+            peptide = Peptide(sequence.raw_sequence, [Modification(m.position, m.delta, m.name, m.is_labile) for m in sequence.modifications] + [modification])
+            add(peptide, label, name, mod_type)
+    for i in range(len(sequence)):
+        blanks = list(sequence.raw_sequence)
+        blanks[i] = "_"
+        add(sequence.remove_residues([i]), "".join(blanks), "missing " + sequence.raw_sequence[i], "synthesis error")
+    for residue_index in range(len(sequence)):
+        for position in range(len(sequence) + 1):
+            peptide = sequence.insert_residues(residue_index, position)
+            add(peptide, str(peptide), "extra " + sequence.get_residue(residue_index), "synthesis error")
+    return list(variants.values())
+
+# bin of each m/z on a log scale, so that one bin spans the same tolerance in ppm at every m/z
+def mz_bins(mz, tolerance):
+    return np.floor(np.log(mz) / np.log1p(tolerance / 1e6)).astype(np.int64)
+
+# fragment ion m/z of each variant, up to fragment charge max_charge
+def fragment_mzs(variants, max_charge=2):
+    fragment_mz = []
+    for variant in variants:
+        fragments = variant.peptide.fragments(max_charge)
+        fragment_mz.append(np.array([ion.mz for ion_list in fragments.values() for ion in ion_list], dtype=np.float64))
+    return fragment_mz
+
+# vote score of each variant from its fragments hit and the intensity of the hitting peaks, with the same weighting of
+# matched intensity and matched fragments as score_ions
+def vote_scores(fragment_hits, intensity_sums, fragment_counts, total_intensity):
+    scores = 5 * fragment_hits / np.maximum(fragment_counts, 1)
+    if total_intensity > 0:
+        scores = scores + 5 * intensity_sums / total_intensity
+    return scores
+
+# generate_usi result (sequence, localization scores, modification, expected mass delta, modification type) of the best
+# of the candidate variants by exact score; the localization scores list every candidate in the given order
+def score_candidates(variants, candidates, sorted_mz_array, sorted_intensity_array, tolerance, max_charge=2):
+    if len(candidates) == 0:
+        return None, None, None, None, None
+    total_intensity = np.sum(sorted_intensity_array)
+    best_score = -1.0
+    code_string_list = []
+    for candidate in candidates:
+        variant = variants[candidate]
+        fragments = variant.peptide.fragments(max_charge)
+        all_ions = [ion for ion_list in fragments.values() for ion in ion_list]
+        score = score_ions(all_ions, sorted_mz_array, sorted_intensity_array, total_intensity, tolerance)
+        code_string_list.append(f"{variant.label}-{score:.2f}")
+        if score > best_score:
+            best_score = score
+            best_variant = variant
+    return str(best_variant.peptide), ", ".join(code_string_list), best_variant.name, best_variant.delta, best_variant.mod_type
+
+class FragmentIndex:
+    # Inverted index from binned fragment m/z to the variants of a target peptide that produce a fragment in that bin,
+    # stored as the fragments sorted by bin with the unique bins and their offsets. The peaks of a spectrum vote for
+    # variants in one pass: each peak looks up its own and the neighbouring bins, and every variant collects the number
+    # of its fragments hit and the intensity of the peaks hitting them. Only the best-voted variants are then scored
+    # exactly with score_ions. Variants are only candidates for a scan if their mass delta matches the scan's within
+    # precursor_tolerance (ppm of the precursor mass), or always if precursor_tolerance is None. Fragments are indexed
+    # up to charge max_charge, e.g. 1 for charge-reduced spectra.
+    def __init__(self, variants, tolerance, precursor_tolerance=None, top_n=5, modification_names=(), max_charge=2):
+        self.variants = variants
+        self.tolerance = tolerance
+        self.precursor_tolerance = precursor_tolerance
+        self.top_n = top_n
+        self.modification_names = list(modification_names)
+        self.max_charge = max_charge
+        self.deltas = np.array([variant.delta for variant in variants], dtype=np.float64)
+        fragment_mz = fragment_mzs(variants, max_charge)
+        self.fragment_counts = np.array([len(mz) for mz in fragment_mz], dtype=np.int64)
+
+        bins = mz_bins(np.concatenate(fragment_mz), tolerance) if fragment_mz else np.zeros(0, dtype=np.int64)
+        variant_ids = np.repeat(np.arange(len(variants)), self.fragment_counts)
+        order = np.argsort(bins, kind="stable")
+        self.fragment_variants = variant_ids[order]
+        self.bins, starts = np.unique(bins[order], return_index=True)
+        self.offsets = np.append(starts, len(order))
+
+    @classmethod
+    def from_target(cls, sequence: Peptide, modification_names, tolerance, precursor_tolerance=None, top_n=5, max_charge=2):
+        return cls(variant_space(sequence, modification_names), tolerance, precursor_tolerance, top_n, modification_names, max_charge)
+
+    def __len__(self):
+        return len(self.variants)
+
+    # settings that change search results besides the target, charge and tolerance, e.g. for ResultCache keys
+    def signature(self):
+        return f"fragment index:{','.join(self.modification_names)}:{self.precursor_tolerance!r}:{self.top_n}:{self.max_charge}"
+
+    # (fragments hit, summed intensity of the hitting peaks) of every variant for m/z-sorted peaks
+    def votes(self, mz, intensity):
+        peak_bins = mz_bins(mz, self.tolerance)
+        # a fragment within tolerance of a peak lies in the peak's bin or a neighbouring one
+        query_bins = (peak_bins[:, None] + np.array([-1, 0, 1])).ravel()
+        query_intensity = np.repeat(intensity, 3)
+        positions = np.searchsorted(self.bins, query_bins)
+        found = positions < len(self.bins)
+        found[found] = self.bins[positions[found]] == query_bins[found]
+        starts, ends = self.offsets[positions[found]], self.offsets[positions[found] + 1]
+        lengths = ends - starts
+        # flat indices of all fragments in the hit bins, one run per (peak, bin) hit
+        runs = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        hit_variants = self.fragment_variants[runs]
+        hit_intensity = np.repeat(query_intensity[found], lengths)
+        fragment_hits = np.bincount(self.fragment_variants[np.unique(runs)], minlength=len(self.variants))
+        intensity_sums = np.bincount(hit_variants, weights=hit_intensity, minlength=len(self.variants))
+        return fragment_hits, intensity_sums
+
+    # indices of the top_n variants by vote score, among those whose delta matches mass_delta
+    def candidates(self, mz, intensity, mass_delta, precursor_mass):
+        fragment_hits, intensity_sums = self.votes(mz, intensity)
+        scores = vote_scores(fragment_hits, intensity_sums, self.fragment_counts, np.sum(intensity))
+        if self.precursor_tolerance is not None:
+            allowed = np.flatnonzero(np.abs(self.deltas - mass_delta) <= ppm(precursor_mass, self.precursor_tolerance))
+        else:
+            # in an open search, a variant needs at least one fragment hit to be a candidate
+            allowed = np.flatnonzero(fragment_hits > 0)
+        order = np.argsort(-scores[allowed], kind="stable")
+        return allowed[order[:self.top_n]]
+
+    # generate_usi result of a scan from exact scores of the best-voted variants
+    def search(self, spectrum: Scan, sequence: Peptide, mass_delta, peaks=None):
+        sorted_mz_array, sorted_intensity_array = sorted_peaks(spectrum, peaks)
+        candidates = self.candidates(sorted_mz_array, sorted_intensity_array, mass_delta, sequence.mass(0) + mass_delta)
+        return score_candidates(self.variants, candidates, sorted_mz_array, sorted_intensity_array, self.tolerance, self.max_charge)
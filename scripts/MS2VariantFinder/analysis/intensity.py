@@ -1,84 +1,39 @@
 from models import Scan, MSRun
 import numpy as np
-from constants import ppm
 
 def calculate_precursor_intensity(mz, spectrum: Scan, run: MSRun, tolerance):
-    max_precursor_intensity = 0.0
-    max_precursor_mz = 0.0
-    total_precursor_intensity = 0.0
-    intensity_row = []
-    mz_row = []
-
-    ms1_idx = run.ms1_spectra.index(spectrum)
+    if spectrum is None:
+        return 0.0, 0.0, 0.0, [], []
+    ms1_idx = run.ms1_peaks.ordinal(spectrum.scan_number)
     start = max(0, ms1_idx - 10)
     end = min(len(run.ms1_spectra), ms1_idx + 11)
 
-    for i in range(start, end):
-        curr_scan = run.ms1_spectra[i]
-        sorted_mz_array = np.sort(curr_scan.mz_array)
-        sorted_intensity_array = curr_scan.intensity_array[np.argsort(curr_scan.mz_array)]
-        left = np.searchsorted(sorted_mz_array, mz - ppm(mz, tolerance), side="left")
-        right = np.searchsorted(sorted_mz_array, mz + ppm(mz, tolerance), side="right")
-        mz_slice = sorted_mz_array[left:right]
-        intensity_slice = sorted_intensity_array[left:right]
-
-        if len(intensity_slice) == 0:
-            mz_row.append(None)
-            intensity_row.append(None)
-            continue
+    all_intensities, all_mzs, found = run.ms1_index.window_max(mz, tolerance)
+    found = found[start:end]
+    intensity_row = [intensity if hit else None for intensity, hit in zip(all_intensities[start:end], found)]
+    mz_row = [bp_mz if hit else None for bp_mz, hit in zip(all_mzs[start:end], found)]
 
-        bp_intensity = np.max(intensity_slice)
-        bp_mz = mz_slice[np.argmax(intensity_slice)]
-        if bp_intensity > max_precursor_intensity:
-            max_precursor_intensity = bp_intensity
-            max_precursor_mz = bp_mz
-        total_precursor_intensity += bp_intensity
-        intensity_row.append(bp_intensity)
-        mz_row.append(bp_mz)
+    if not np.any(found):
+        return 0.0, 0.0, 0.0, mz_row, intensity_row
+    window_intensities = all_intensities[start:end][found]
+    max_precursor_intensity = np.max(window_intensities)
+    max_precursor_mz = all_mzs[start:end][found][np.argmax(window_intensities)]
+    total_precursor_intensity = np.sum(window_intensities)
 
     return max_precursor_intensity, total_precursor_intensity, max_precursor_mz, mz_row, intensity_row
 
 def find_max_ms1(run: MSRun, mz, tolerance):
-    all_ms1_intensities = []
-    all_ms1_mzs = []
-    mz_row = []
-    intensity_row = []
-    best_sn_ratio = 0.0
-
-    for ms1_scan in run.ms1_spectra:
-        sorted_mz_array = np.sort(ms1_scan.mz_array)
-        sorted_intensity_array = ms1_scan.intensity_array[np.argsort(ms1_scan.mz_array)]
-        left = np.searchsorted(sorted_mz_array, mz - ppm(mz, tolerance), side="left")
-        right = np.searchsorted(sorted_mz_array, mz + ppm(mz, tolerance), side="right")
-        mz_slice = sorted_mz_array[left:right]
-        intensity_slice = sorted_intensity_array[left:right]
-
-        signal = np.sum(sorted_intensity_array[-3:-1]) / 2
-        noise = np.sum(sorted_intensity_array[0:2]) / 2
-        if signal / noise > best_sn_ratio:
-            best_sn_ratio = signal / noise
-
-        if len(intensity_slice) == 0: # just puts 0 if nothing found.
-            all_ms1_intensities.append(0.0)
-            all_ms1_mzs.append(0.0)
-            continue
-
-        bp_intensity = np.max(intensity_slice)
-        bp_mz = mz_slice[np.argmax(intensity_slice)]
-        all_ms1_intensities.append(bp_intensity)
-        all_ms1_mzs.append(bp_mz)
+    all_ms1_intensities, all_ms1_mzs, _ = run.ms1_index.window_max(mz, tolerance)
 
-    all_ms1_intensities = np.array(all_ms1_intensities)
-    all_ms1_mzs = np.array(all_ms1_mzs)
-    max_ms1_intensity = np.max(all_ms1_intensities)
-    max_ms1_idx = np.argmax(all_ms1_intensities)
+    max_ms1_idx = int(np.argmax(all_ms1_intensities))
+    max_ms1_intensity = all_ms1_intensities[max_ms1_idx]
     max_ms1_mz = all_ms1_mzs[max_ms1_idx]
     best_ms1_spectrum = run.ms1_spectra[max_ms1_idx]
+    best_sn_ratio = run.ms1_peaks.sn_ratio[max_ms1_idx]
 
-    start = max(0, int(max_ms1_idx) - 10)
-    end = min(len(run.ms1_spectra), int(max_ms1_idx) + 11)
-    for i in range(start, end):
-        mz_row.append(all_ms1_mzs[i])
-        intensity_row.append(all_ms1_intensities[i])
+    start = max(0, max_ms1_idx - 10)
+    end = min(len(run.ms1_spectra), max_ms1_idx + 11)
+    mz_row = list(all_ms1_mzs[start:end])
+    intensity_row = list(all_ms1_intensities[start:end])
 
-    return best_ms1_spectrum, max_ms1_intensity, max_ms1_mz, mz_row, intensity_row, best_sn_ratio
\ No newline at end of file
+    return best_ms1_spectrum, max_ms1_intensity, max_ms1_mz, mz_row, intensity_row, best_sn_ratio
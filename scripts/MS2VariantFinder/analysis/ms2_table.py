@@ -3,44 +3,149 @@ from models import Peptide
 import constants
 from usi import generate_usi
 from intensity import calculate_precursor_intensity, find_max_ms1
-import numpy as np
+from clustering import cluster_scans
+from consensus import consensus_spectrum
 
-def generate_ms2_table(run: MSRun, sequence: Peptide, charge: int, tolerance, run_type):         # PRM might need extra param for mod list
-    expected_mass = sequence.mass(charge)
+INTENSITY_WINDOW = 10
+# neutral mass range (Da) around a target in which a precursor is routed to it when several targets share a run
+DELTA_WINDOW = (-200.0, 400.0)
+
+MS2_TABLE_FIELDS = ["scan number", "retention time", "ion injection time", "total ion current", "precursor m/z",
+                    "precursor charge", "maximum precursor intensity", "relative intensity", "signal to noise ratio",
+                    "modification", "modification type", "expected mass delta", "mass delta difference",
+                    "localization scores", "usi", "confidence", "comments", "triage", "cluster"]
+
+INTENSITY_TABLE_FIELDS = (["scan number", "precursor scan number", "precursor m/z", "total ion current"] +
+                          [f"mz{n}" for n in range(-INTENSITY_WINDOW, INTENSITY_WINDOW + 1)] +
+                          [f"intensity{n}" for n in range(-INTENSITY_WINDOW, INTENSITY_WINDOW + 1)] +
+                          ["total ion intensity", "maximum precursor intensity"])
+
+# column types of the Parquet/Arrow tables, so every file has the same schema whatever rows come first
+MS2_TABLE_TYPES = {name: "string" for name in ["modification", "modification type", "localization scores", "usi", "confidence", "comments", "triage"]}
+MS2_TABLE_TYPES.update({name: "int64" for name in ["scan number", "precursor charge", "cluster"]})
+MS2_TABLE_TYPES.update({name: "float64" for name in MS2_TABLE_FIELDS if name not in MS2_TABLE_TYPES})
+INTENSITY_TABLE_TYPES = {name: "float64" for name in INTENSITY_TABLE_FIELDS}
+INTENSITY_TABLE_TYPES.update({"scan number": "int64", "precursor scan number": "int64"})
+
+# generate_usi result of one MS2 scan, from the fragment index or the variant library results if given
+def score_scan(scan, sequence: Peptide, mass_delta, tolerance, peaks, index=None, library_results=None, max_charge=2):
+    if library_results is not None:
+        return library_results[scan.scan_number]
+    if index is not None:
+        return index.search(scan, sequence, mass_delta, peaks)
+    return generate_usi(scan, sequence, mass_delta, tolerance, peaks, max_charge)
+
+# mass delta (Da) of a scan's precursor from the target
+def precursor_mass_delta(scan, sequence: Peptide, charge):
+    return scan.precursor_mz * scan.precursor_charge - sequence.mass(charge) - constants.PROTON_MASS * (scan.precursor_charge - charge)
+
+# generate_usi result of one MS2 scan, read from or added to the cache if there is one. A scan that is not in the run's
+# peak store, such as a consensus spectrum, is scored on its own m/z-sorted peak arrays.
+def predict_scan(run: MSRun, scan, sequence: Peptide, charge, tolerance, cache=None, method="", index=None, library_results=None, consensus=False):
+    if consensus:
+        peaks = (scan.mz_array, scan.intensity_array)
+    else:
+        # m/z-sorted peaks from the run's peak store, so scoring does not sort the spectrum again for every candidate
+        peaks = run.ms2_peaks.get_peaks(run.ms2_peaks.ordinal(scan.scan_number))
+    mass_delta = precursor_mass_delta(scan, sequence, charge)
+    if cache is None:
+        return score_scan(scan, sequence, mass_delta, tolerance, peaks, index, library_results, run.fragment_charge)
+    key = cache.key(scan, sequence, charge, tolerance, method, run.preprocessing.parameters() if run.preprocessing is not None else None)
+    result = cache.get(key)
+    if result is None:
+        result = score_scan(scan, sequence, mass_delta, tolerance, peaks, index, library_results, run.fragment_charge)
+        cache.put(key, result)
+    return result
+
+# row of the intensities table: the m/z and intensity found in each MS1 scan n scans away from the precursor scan
+def intensity_table_row(run: MSRun, scan_number, precursor, precursor_mz, tic, mz_row, intensity_row):
+    row = {"scan number": scan_number,
+           "precursor scan number": precursor.scan_number if precursor is not None else None,
+           "precursor m/z": precursor_mz,
+           "total ion current": tic}
+    if precursor is not None and len(mz_row) > 0:
+        center = run.ms1_peaks.ordinal(precursor.scan_number)
+        first_offset = max(0, center - INTENSITY_WINDOW) - center
+        for i, (mz, intensity) in enumerate(zip(mz_row, intensity_row)):
+            row[f"mz{first_offset + i}"] = mz
+            row[f"intensity{first_offset + i}"] = intensity
+    found_intensities = [intensity for intensity in intensity_row if intensity is not None]
+    row["total ion intensity"] = sum(found_intensities) if found_intensities else 0.0
+    row["maximum precursor intensity"] = max(found_intensities) if found_intensities else 0.0
+    return row
+
+# Yields one (MS2 table row, intensities table row) pair per scan, starting with the most intense MS1 spectrum, so
+# callers can stream rows to disk instead of collecting the whole table. With a ResultCache, USI predictions of scans
+# scored before with the same peptide, charge and tolerance are read from the cache instead of recomputed. Scans in
+# completed (scan number -> row pair, e.g. from a checkpoint) yield their stored rows without being scored again.
+# scans limits the table to a subset of run.ms2_spectra. With a Triage, scans it rejects are not scored and keep their
+# reason code in the triage column. With a FragmentIndex of the target's variants, scans are scored against the index
+# instead of generate_usi; with a VariantLibrary, all scans to be scored are searched in the library up front. With a
+# similarity, scans are clustered first (see cluster_scans) and only the cluster representatives are scored; the other
+# members take their representative's prediction, and the cluster column holds the representative's scan number.
+# With consensus, scans are clustered by precursor mass (and by similarity if given), and each cluster is scored once on
+# the consensus spectrum of all its members (see consensus_spectrum), numbered after its representative.
+def generate_ms2_table(run: MSRun, sequence: Peptide, charge: int, tolerance, run_type, ms1_tolerance=10, cache=None, completed=None, scans=None, triage=None, index=None, library=None, similarity=None, consensus=False):         # PRM might need extra param for mod list
     expected_mz = sequence.mz(charge)
-    spectra_data = []
-    intensity_data = []
-    best_ms1_spectrum, max_ms1_intensity, max_ms1_mz, best_mz_row, best_intensity_row, best_sn_ratio = find_max_ms1(run, expected_mz, 10)
-    intensity_data.append((best_intensity_row, best_mz_row))
-    spectra_data.append({"scan number": best_ms1_spectrum.scan_number,
-                         "retention time": best_ms1_spectrum.rt,
-                         "ion injection time": best_ms1_spectrum.iit,
-                         "total ion current": best_ms1_spectrum.tic,
-                         "precursor m/z": max_ms1_mz,
-                         "precursor charge": charge,
-                         "maximum precursor intensity": max_ms1_intensity,
-                         "relative intensity": 1,
-                         "signal to noise ratio": best_sn_ratio,
-                         "modification": "",
-                         "modification type": "",
-                         "expected mass delta": 0,
-                         "mass delta difference": max_ms1_mz - expected_mz,
-                         "localization scores": "",
-                         "usi": f"mzspec:PXD{999007}:{run}:{best_ms1_spectrum.scan_number}:{sequence}/{charge}",
-                         "confidence": "predicted"})
-
-    for scan in run.ms2_spectra:
-        mass_delta = scan.precursor_mz * scan.precursor_charge - expected_mass - constants.PROTON_MASS * (scan.precursor_charge - charge)
-
-        sorted_intensity = np.argsort(scan.intensity_array)
-        signal = np.sum(sorted_intensity[-3:-1]) / 2
-        noise = np.sum(sorted_intensity[0:2]) / 2
-        sn_ratio = signal / noise
-
-        max_precursor_intensity, total_precursor_intensity, max_precursor_mz, mz_row, intensity_row = calculate_precursor_intensity(scan.precursor_mz, run.get_precursor(scan), run, 10)
+    best_ms1_spectrum, max_ms1_intensity, max_ms1_mz, best_mz_row, best_intensity_row, best_sn_ratio = find_max_ms1(run, expected_mz, ms1_tolerance)
+    yield ({"scan number": best_ms1_spectrum.scan_number,
+            "retention time": best_ms1_spectrum.rt,
+            "ion injection time": best_ms1_spectrum.iit,
+            "total ion current": best_ms1_spectrum.tic,
+            "precursor m/z": max_ms1_mz,
+            "precursor charge": charge,
+            "maximum precursor intensity": max_ms1_intensity,
+            "relative intensity": 1.0,
+            "signal to noise ratio": best_sn_ratio,
+            "modification": "",
+            "modification type": "",
+            "expected mass delta": 0.0,
+            "mass delta difference": max_ms1_mz - expected_mz,
+            "localization scores": "",
+            "usi": f"mzspec:PXD{999007}:{run}:{best_ms1_spectrum.scan_number}:{sequence}/{charge}",
+            "confidence": "predicted"},
+           intensity_table_row(run, best_ms1_spectrum.scan_number, best_ms1_spectrum, max_ms1_mz, best_ms1_spectrum.tic, best_mz_row, best_intensity_row))
+
+    scans = run.ms2_spectra if scans is None else scans
+    reasons = triage.apply(run, sequence, scans) if triage is not None and triage.enabled else [""] * len(scans)
+    accepted = [scan for scan, reason in zip(scans, reasons) if not reason]
+    # clusters span finished scans too, so that a resumed run forms the same clusters
+    clusters = cluster_scans(run, accepted, similarity, ms1_tolerance) if similarity is not None or consensus else None
+    members = {}
+    if consensus:
+        for scan in accepted:
+            members.setdefault(clusters[scan.scan_number], []).append(scan.scan_number)
+    pending = [scan for scan in accepted if not (completed and scan.scan_number in completed)]
+    if clusters is not None:
+        pending = [run.get_scan(scan_number) for scan_number in sorted({clusters[scan.scan_number] for scan in pending})]
+    library_results = library.search_run(run, sequence, pending) if library is not None else None
+    method = index.signature() if index is not None else library.signature() if library is not None else ""
+    predictions = {}
+    for scan, reason in zip(scans, reasons):
+        if completed and scan.scan_number in completed:
+            yield completed[scan.scan_number]
+            continue
+
+        mass_delta = precursor_mass_delta(scan, sequence, charge)
+        sn_ratio = run.ms2_peaks.sn_ratio[run.ms2_peaks.ordinal(scan.scan_number)]
+
+        precursor = run.get_precursor(scan)
+        max_precursor_intensity, total_precursor_intensity, max_precursor_mz, mz_row, intensity_row = calculate_precursor_intensity(scan.precursor_mz, precursor, run, ms1_tolerance)
         relative_intensity = max_precursor_intensity / max_ms1_intensity
 
-        modded_sequence, scores, mod_string, theoretical_delta, mod_type = generate_usi(scan, sequence, mass_delta, tolerance)
+        representative = None
+        if reason:
+            modded_sequence, scores, mod_string, theoretical_delta, mod_type = "", "", "", None, ""
+        elif clusters is None:
+            modded_sequence, scores, mod_string, theoretical_delta, mod_type = predict_scan(run, scan, sequence, charge, tolerance, cache, method, index, library_results)
+        else:
+            representative = clusters[scan.scan_number]
+            if representative not in predictions:
+                # a single scan is its own consensus
+                pooled = consensus and len(members[representative]) > 1
+                spectrum = consensus_spectrum(run, members[representative], tolerance) if pooled else run.get_scan(representative)
+                predictions[representative] = predict_scan(run, spectrum, sequence, charge, tolerance, cache, method, index, library_results, pooled)
+            modded_sequence, scores, mod_string, theoretical_delta, mod_type = predictions[representative]
         if modded_sequence:
             usi = f"mzspec:PXD{999007}:{run}:{scan.scan_number}:{modded_sequence}/{scan.precursor_charge}" # predict USI
             confidence = "predicted"
@@ -48,23 +153,41 @@ def generate_ms2_table(run: MSRun, sequence: Peptide, charge: int, tolerance, ru
             usi = ""
             confidence = ""
 
-        spectra_data.append({"scan number": scan.scan_number,
-                             "retention time": scan.rt,
-                             "ion injection time": scan.iit,
-                             "total ion current": scan.tic,
-                             "precursor m/z": scan.precursor_mz,
-                             "precursor charge": scan.precursor_charge,
-                             "maximum precursor intensity": max_precursor_intensity,
-                             "relative intensity": relative_intensity,
-                             "signal to noise ratio": sn_ratio,
-                             "modification": mod_string,
-                             "modification type": mod_type,
-                             "expected mass delta": theoretical_delta,
-                             "mass delta difference": mass_delta - theoretical_delta,
-                             "localization scores": scores,
-                             "usi": usi,
-                             "confidence": confidence})
-        intensity_data.append((intensity_row, mz_row))
-
-    return spectra_data, intensity_data
+        yield ({"scan number": scan.scan_number,
+                "retention time": scan.rt,
+                "ion injection time": scan.iit,
+                "total ion current": scan.tic,
+                "precursor m/z": scan.precursor_mz,
+                "precursor charge": scan.precursor_charge,
+                "maximum precursor intensity": max_precursor_intensity,
+                "relative intensity": relative_intensity,
+                "signal to noise ratio": sn_ratio,
+                "modification": mod_string,
+                "modification type": mod_type,
+                "expected mass delta": theoretical_delta,
+                "mass delta difference": mass_delta - theoretical_delta if theoretical_delta is not None else None,
+                "localization scores": scores,
+                "usi": usi,
+                "confidence": confidence,
+                "triage": reason,
+                "cluster": representative},
+               intensity_table_row(run, scan.scan_number, precursor, scan.precursor_mz, scan.tic, mz_row, intensity_row))
+
+
+# Indices into run.ms2_spectra routed to each target: the scans whose neutral precursor mass lies within delta_window of
+# the target's neutral mass, looked up for all targets at once in the run's precursor index.
+def route_scans(run: MSRun, sequences, delta_window=DELTA_WINDOW):
+    return run.precursor_index.batch([sequence.mass(0) for sequence in sequences], delta_window=delta_window)
 
+# MS2 tables of several target peptides from one run, as row pairs with a leading "target" column. Each target only
+# scores the scans routed to it, and all targets share the run's peak store and MS1 index. completed is keyed by
+# (target, scan number). A Triage applies to the routed scans of each target; indexes and libraries map each target to
+# its FragmentIndex or VariantLibrary; similarity and consensus cluster the routed scans of each target.
+def generate_multi_target_table(run: MSRun, targets, tolerance, run_type, ms1_tolerance=10, delta_window=DELTA_WINDOW, cache=None, completed=None, triage=None, indexes=None, libraries=None, similarity=None, consensus=False):
+    routes = route_scans(run, [sequence for sequence, _ in targets], delta_window)
+    for (sequence, charge), indices in zip(targets, routes):
+        target = str(sequence)
+        target_completed = {scan_number: rows for (name, scan_number), rows in (completed or {}).items() if name == target}
+        for row, intensity_row in generate_ms2_table(run, sequence, charge, tolerance, run_type, ms1_tolerance, cache, target_completed,
+                                                     [run.ms2_spectra[i] for i in indices], triage, (indexes or {}).get(target), (libraries or {}).get(target), similarity, consensus):
+            yield {"target": target, **row}, {"target": target, **intensity_row}
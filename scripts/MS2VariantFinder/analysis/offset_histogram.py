@@ -0,0 +1,103 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from models import Peptide
+import unimod
+from constants import PROTON_MASS, AA_MASSES
+from ms2_table import DELTA_WINDOW
+
+BIN_WIDTH = 0.001           # Da
+PEAK_WIDTH = 0.02           # Da; offsets within half of it of a peak apex belong to the peak
+MS1_MIN_RELATIVE_INTENSITY = 0.01
+
+# mass offset (Da) of each precursor from the target: neutral precursor mass - target neutral mass
+def precursor_offsets(precursor_mz, precursor_charge, target_mass):
+    precursor_mz = np.asarray(precursor_mz, dtype=np.float64)
+    precursor_charge = np.asarray(precursor_charge, dtype=np.float64)
+    return (precursor_mz - PROTON_MASS) * precursor_charge - target_mass
+
+# offsets of the MS1 peaks of each spectrum at each of charges, keeping the peaks of at least min_relative_intensity of
+# their spectrum's most intense peak
+def ms1_feature_offsets(ms1_peaks, target_mass, charges=(1, 2, 3, 4), min_relative_intensity=MS1_MIN_RELATIVE_INTENSITY):
+    kept = [mz[intensity >= min_relative_intensity * intensity.max()] for mz, intensity in ms1_peaks if len(intensity) > 0]
+    mz = np.concatenate(kept) if kept else np.zeros(0)
+    return np.concatenate([precursor_offsets(mz, np.full(len(mz), charge), target_mass) for charge in charges])
+
+# counts of offsets in bins of bin_width across window, and the left bin edges
+def offset_histogram(offsets, window=DELTA_WINDOW, bin_width=BIN_WIDTH):
+    n_bins = int(np.ceil((window[1] - window[0]) / bin_width))
+    offsets = offsets[(offsets >= window[0]) & (offsets < window[1])]
+    bins = np.minimum(((offsets - window[0]) / bin_width).astype(np.int64), n_bins - 1)
+    return np.bincount(bins, minlength=n_bins), window[0] + np.arange(n_bins) * bin_width
+
+# Peaks of the offset distribution: apexes of the histogram smoothed over peak_width, at least peak_width apart and with
+# at least min_count offsets. Returns the mean offset and the number of offsets within peak_width / 2 of each apex.
+def detect_peaks(offsets, window=DELTA_WINDOW, bin_width=BIN_WIDTH, peak_width=PEAK_WIDTH, min_count=3):
+    counts, edges = offset_histogram(offsets, window, bin_width)
+    half = max(1, int(round(peak_width / bin_width / 2)))
+    cumulative = np.concatenate([[0], np.cumsum(counts)])
+    index = np.arange(len(counts))
+    smoothed = cumulative[np.minimum(index + half + 1, len(counts))] - cumulative[np.maximum(index - half, 0)]
+    local_max = sliding_window_view(np.pad(smoothed, half, constant_values=-1), 2 * half + 1).max(axis=1)
+    apex = (smoothed == local_max) & (smoothed >= min_count)
+    # a flat top counts once, at its middle: a cluster narrower than peak_width smooths into a flat top centered on it
+    continues = np.zeros(len(apex), dtype=bool)
+    continues[1:] = apex[1:] & apex[:-1] & (smoothed[1:] == smoothed[:-1])
+    starts = np.flatnonzero(apex & ~continues)
+    ends = np.flatnonzero(apex & ~np.append(continues[1:], False))
+    centers = (edges[starts] + edges[ends]) / 2 + bin_width / 2
+
+    sorted_offsets = np.sort(offsets)
+    sums = np.concatenate([[0.0], np.cumsum(sorted_offsets)])
+    left = np.searchsorted(sorted_offsets, centers - peak_width / 2, side="left")
+    right = np.searchsorted(sorted_offsets, centers + peak_width / 2, side="right")
+    peak_counts = right - left
+    return (sums[right] - sums[left]) / np.maximum(peak_counts, 1), peak_counts
+
+# known mass offsets of a target, sorted by mass: every Unimod modification, the loss of one or two residues and the
+# gain of one residue of the sequence
+def annotation_masses(sequence: Peptide):
+    names = ["No mod"]
+    masses = [0.0]
+    for entry in unimod.get_mods():
+        names.append(entry["name"])
+        masses.append(float(entry["delta_mono_mass"]))
+    for r in (1, 2):
+        for indices, mass in sequence.generate_error_masses(r).items():
+            names.append("missing " + "".join(sequence.raw_sequence[i] for i in indices))
+            masses.append(-mass)
+    for residue in sorted(set(sequence.raw_sequence)):
+        names.append("extra " + residue)
+        masses.append(AA_MASSES[residue])
+    order = np.argsort(masses, kind="stable")
+    return np.array(names, dtype=object)[order], np.array(masses)[order]
+
+# names of the known offsets within tolerance (Da) of each observed offset, closest first, and the closest known offset
+def annotate(offsets, names, masses, tolerance):
+    left = np.searchsorted(masses, offsets - tolerance, side="left")
+    right = np.searchsorted(masses, offsets + tolerance, side="right")
+    annotations = []
+    closest = np.full(len(offsets), np.nan)
+    for i, (offset, start, end) in enumerate(zip(offsets, left, right)):
+        order = start + np.argsort(np.abs(masses[start:end] - offset), kind="stable")
+        annotations.append("; ".join(names[order]))
+        if len(order) > 0:
+            closest[i] = masses[order[0]]
+    return np.array(annotations, dtype=object), closest
+
+# Ranked offset report of one source of offsets ("MS2" precursors or "MS1" features) as table columns, most populated
+# peak first; tolerance (ppm of the target mass) decides which known offsets annotate a peak.
+def offset_report(offsets, sequence: Peptide, source, tolerance=10, window=DELTA_WINDOW, bin_width=BIN_WIDTH, peak_width=PEAK_WIDTH, min_count=3, annotations=None):
+    peak_offsets, peak_counts = detect_peaks(offsets, window, bin_width, peak_width, min_count)
+    order = np.argsort(-peak_counts, kind="stable")
+    peak_offsets, peak_counts = peak_offsets[order], peak_counts[order]
+    names, masses = annotations if annotations is not None else annotation_masses(sequence)
+    labels, closest = annotate(peak_offsets, names, masses, sequence.mass(0) * tolerance / 1e6)
+    in_window = np.count_nonzero((offsets >= window[0]) & (offsets < window[1]))
+    return {"source": np.full(len(peak_offsets), source, dtype=object),
+            "rank": np.arange(1, len(peak_offsets) + 1),
+            "offset (Da)": peak_offsets,
+            "count": peak_counts,
+            "fraction": peak_counts / max(in_window, 1),
+            "annotation": labels,
+            "annotation offset (Da)": closest,
+            "error (mDa)": (peak_offsets - closest) * 1000}
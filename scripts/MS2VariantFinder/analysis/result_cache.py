@@ -0,0 +1,81 @@
+import hashlib
+import json
+import sqlite3
+import numpy as np
+import constants
+import models
+import unimod
+import usi
+import fragment_index
+import variant_library
+
+# hash of the source of the modules that decide a USI prediction; editing any of them invalidates every cached result
+def code_version():
+    digest = hashlib.sha1()
+    for module in (usi, fragment_index, variant_library, models, constants, unimod):
+        with open(module.__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+# hash of what the USI prediction of one MS2 scan reads from the run: the precursor and the peak arrays
+def spectrum_hash(scan: models.Scan):
+    digest = hashlib.sha1()
+    digest.update(f"{scan.scan_number}:{float(scan.precursor_mz)!r}:{scan.precursor_charge}".encode())
+    digest.update(np.ascontiguousarray(scan.mz_array, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(scan.intensity_array, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+class ResultCache:
+    # SQLite cache of generate_usi results, keyed by spectrum content, target peptide, charge, fragment tolerance,
+    # MS2 preprocessing and code version. Results of a run that was scored before are looked up instead of recomputed;
+    # only the scans whose key changed (e.g. after a new target sequence or tolerance) are scored again. New results are
+    # written in batches.
+    def __init__(self, cache_file, batch_size=1000):
+        self.connection = sqlite3.connect(cache_file)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS usi_results (key TEXT PRIMARY KEY, result TEXT NOT NULL)")
+        self.version = code_version()
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self._pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # method names the scoring method when it is not generate_usi, e.g. a FragmentIndex signature; preprocessing holds
+    # the Preprocessing parameters of the run, which change the scored peaks and the fragment charge but not the raw
+    # spectrum
+    def key(self, scan: models.Scan, sequence: models.Peptide, charge, tolerance, method="", preprocessing=None):
+        key = f"{spectrum_hash(scan)}|{sequence}|{charge}|{float(tolerance)!r}|{self.version}"
+        if method:
+            key = f"{key}|{method}"
+        if preprocessing is not None:
+            key = f"{key}|{json.dumps(preprocessing, sort_keys=True)}"
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    # cached result for a key, or None
+    def get(self, key):
+        row = self.connection.execute("SELECT result FROM usi_results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return tuple(json.loads(row[0]))
+
+    def put(self, key, result):
+        self._pending.append((key, json.dumps([value.item() if isinstance(value, np.generic) else value for value in result])))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO usi_results (key, result) VALUES (?, ?)", self._pending)
+            self._pending = []
+
+    def close(self):
+        self.flush()
+        self.connection.close()
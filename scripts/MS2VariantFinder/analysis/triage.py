@@ -0,0 +1,63 @@
+import numpy as np
+from collections import Counter
+from models import MSRun
+from models import Peptide
+from constants import PROTON_MASS
+
+# reason codes of rejected scans, in the order they are checked and reported
+REASONS = ["charge", "peak count", "tic", "delta window"]
+
+class Triage:
+    # Cheap pass over the precursor and peak store arrays of a run that rejects MS2 scans which cannot be a variant of
+    # the target before they are scored: precursor charge not in charges, fewer than min_peaks peaks, total ion current
+    # below min_tic, or a mass delta (neutral precursor mass - target neutral mass, Da) outside delta_window. Every
+    # filter is off by default. counts accumulates the scans failing each filter over all calls; a scan failing several
+    # filters is counted under each of them.
+    def __init__(self, delta_window=None, min_peaks=0, min_tic=0.0, charges=None):
+        self.delta_window = delta_window
+        self.min_peaks = min_peaks
+        self.min_tic = min_tic
+        self.charges = charges
+        self.counts = Counter()
+        self.passed = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self):
+        return self.delta_window is not None or self.min_peaks > 0 or self.min_tic > 0 or bool(self.charges)
+
+    def parameters(self):
+        return {"delta_window": self.delta_window, "min_peaks": self.min_peaks, "min_tic": self.min_tic, "charges": self.charges}
+
+    # reason code of each scan: "" if it passed, else the failed filters joined by ", "
+    def apply(self, run: MSRun, sequence: Peptide, scans):
+        n_scans = len(scans)
+        ordinals = np.array([run.ms2_peaks.ordinal(scan.scan_number) for scan in scans], dtype=np.int64)
+        charge = np.array([scan.precursor_charge for scan in scans], dtype=np.int64)
+        precursor_mz = np.array([scan.precursor_mz for scan in scans], dtype=np.float64)
+        tic = np.array([scan.tic if scan.tic is not None else np.nan for scan in scans], dtype=np.float64)
+
+        failed = {reason: np.zeros(n_scans, dtype=bool) for reason in REASONS}
+        if self.charges:
+            failed["charge"] = ~np.isin(charge, self.charges)
+        if self.min_peaks > 0:
+            failed["peak count"] = run.ms2_peaks.counts[ordinals] < self.min_peaks
+        if self.min_tic > 0:
+            # scans without a TIC fail the filter
+            failed["tic"] = ~(tic >= self.min_tic)
+        if self.delta_window is not None:
+            mass_delta = (precursor_mz - PROTON_MASS) * charge - sequence.mass(0)
+            failed["delta window"] = (mass_delta < self.delta_window[0]) | (mass_delta > self.delta_window[1])
+
+        reasons = np.full(n_scans, "", dtype=object)
+        for reason in REASONS:
+            mask = failed[reason]
+            self.counts[reason] += int(mask.sum())
+            reasons[mask] = [f"{previous}, {reason}" if previous else reason for previous in reasons[mask]]
+        n_passed = int((reasons == "").sum())
+        self.passed += n_passed
+        self.rejected += n_scans - n_passed
+        return reasons
+
+    def report(self):
+        return f"{self.passed} scans passed, {self.rejected} rejected ({', '.join(f'{reason}: {self.counts[reason]}' for reason in REASONS)})"
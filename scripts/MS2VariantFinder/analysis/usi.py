@@ -17,10 +17,16 @@ def score_ions(ions, sorted_mz_array, sorted_intensity_array, total_intensity, t
     score = 5 * intensity_sum / total_intensity + 5 * match_count / len(ions) # prioritizes intensity and number of matches
     return score
 
-def localize(sequence: Peptide, mod_name: str, tolerance, spectrum: Scan):
+# m/z-sorted peaks of a spectrum: the given (sorted m/z, intensity) views, e.g. from the run's PeakStore, or a sorted copy
+def sorted_peaks(spectrum: Scan, peaks=None):
+    if peaks is not None:
+        return peaks
+    order = np.argsort(spectrum.mz_array)
+    return spectrum.mz_array[order], spectrum.intensity_array[order]
+
+def localize(sequence: Peptide, mod_name: str, tolerance, spectrum: Scan, peaks=None, max_charge=2):
     # Returns likely location of specific modification.
-    sorted_mz_array = np.sort(spectrum.mz_array)
-    sorted_intensity_array = spectrum.intensity_array[np.argsort(spectrum.mz_array)]
+    sorted_mz_array, sorted_intensity_array = sorted_peaks(spectrum, peaks)
     total_intensity = np.sum(sorted_intensity_array)
     code_string_list = []
     best_score = 0.0
@@ -37,7 +43,7 @@ def localize(sequence: Peptide, mod_name: str, tolerance, spectrum: Scan):
         else:
             modification.is_labile = False
         modification.position = i if i > -2 else -1
-        fragments = testing_sequence.fragments()
+        fragments = testing_sequence.fragments(max_charge)
         all_ions = [ion for ion_list in fragments.values() for ion in ion_list]
         if modification.is_labile:
             code_string += "Labile-"
@@ -79,9 +85,8 @@ def synthesis_error(sequence: Peptide, mass_delta, tolerance):
             return errors
     return None
 
-def localize_synthesis_error(sequence: Peptide, errors, mass_delta, tolerance, spectrum: Scan):
-    sorted_mz_array = np.sort(spectrum.mz_array)
-    sorted_intensity_array = spectrum.intensity_array[np.argsort(spectrum.mz_array)]
+def localize_synthesis_error(sequence: Peptide, errors, mass_delta, tolerance, spectrum: Scan, peaks=None, max_charge=2):
+    sorted_mz_array, sorted_intensity_array = sorted_peaks(spectrum, peaks)
     total_intensity = np.sum(sorted_intensity_array)
     code_string_list = []
     best_score = 0.0
@@ -89,6 +94,8 @@ def localize_synthesis_error(sequence: Peptide, errors, mass_delta, tolerance, s
     best_error_str = ""
     if errors is None or len(errors) == 0:
         return None
+    # errors are (residue indices, mass) pairs from synthesis_error
+    errors = [indices for indices, _ in errors]
     if mass_delta < 0:
         for error in errors:
             sequence_with_blanks = list(sequence.raw_sequence)
@@ -97,7 +104,7 @@ def localize_synthesis_error(sequence: Peptide, errors, mass_delta, tolerance, s
             code_string = "".join(sequence_with_blanks) + "-"
             error_str = "".join(sequence.raw_sequence[i] for i in error)
             test_peptide = sequence.remove_residues(error)
-            fragments = test_peptide.fragments()
+            fragments = test_peptide.fragments(max_charge)
             all_ions = [ion for ion_list in fragments.values() for ion in ion_list]
 
             score = score_ions(all_ions, sorted_mz_array, sorted_intensity_array, total_intensity, tolerance)
@@ -119,7 +126,7 @@ def localize_synthesis_error(sequence: Peptide, errors, mass_delta, tolerance, s
                     continue
                 seen.add(signature)
                 test_peptide = sequence.insert_residues(error[0], i)
-                fragments = test_peptide.fragments()
+                fragments = test_peptide.fragments(max_charge)
                 all_ions = [ion for ion_list in fragments.values() for ion in ion_list]
                 code_string = str(test_peptide) + "-"
 
@@ -133,13 +140,15 @@ def localize_synthesis_error(sequence: Peptide, errors, mass_delta, tolerance, s
                     best_error_str = "extra " + residue_char
     return best_sequence, best_score, ", ".join(code_string_list), best_error_str
 
-def generate_usi(spectrum: Scan, sequence: Peptide, mass_delta, tolerance):
+# peaks: optional m/z-sorted (m/z, intensity) views of the spectrum, shared by every call on the same scan, e.g. the
+# preprocessed peaks of the run; max_charge: highest fragment ion charge to match (1 for charge-reduced peaks)
+def generate_usi(spectrum: Scan, sequence: Peptide, mass_delta, tolerance, peaks=None, max_charge=2):
     final_candidates = []
+    peaks = sorted_peaks(spectrum, peaks)
 
-    if abs(mass_delta) <= ppm(sequence.mz, tolerance):
-        fragments = sequence.fragments()
-        sorted_mz_array = np.sort(spectrum.mz_array)
-        sorted_intensity_array = spectrum.intensity_array[np.argsort(spectrum.mz_array)]
+    if abs(mass_delta) <= ppm(sequence.mz(spectrum.precursor_charge), tolerance):
+        fragments = sequence.fragments(max_charge)
+        sorted_mz_array, sorted_intensity_array = peaks
         total_intensity = np.sum(sorted_intensity_array)
         all_ions = [ion for ion_list in fragments.values() for ion in ion_list]
         no_mod_score = score_ions(all_ions, sorted_mz_array, sorted_intensity_array, total_intensity, tolerance)
@@ -148,9 +157,9 @@ def generate_usi(spectrum: Scan, sequence: Peptide, mass_delta, tolerance):
     candidate_mods = unimod.get_candidate_mods(mass_delta, tolerance, spectrum.precursor_mz)
     if candidate_mods is not None:
         # tiebreaking for mods with identical mass (score will not show any difference)
-        closest_mod_mass_diff = min(abs(x["delta_mono_mass"] - mass_delta) for x in candidate_mods)
+        closest_mod_mass_diff = min(abs(float(x["delta_mono_mass"]) - mass_delta) for x in candidate_mods)
         tied_mods = [mod for mod in candidate_mods if
-                     abs(mod["delta_mono_mass"] - spectrum.precursor_mz) == closest_mod_mass_diff]
+                     abs(float(mod["delta_mono_mass"]) - mass_delta) == closest_mod_mass_diff]
         approved_mods = []
         for mod in tied_mods:
             for locale in sequence.raw_sequence:
@@ -162,16 +171,16 @@ def generate_usi(spectrum: Scan, sequence: Peptide, mass_delta, tolerance):
             best_mod = approved_mods[0]
         else:
             best_mod = tied_mods[0]
-        best_mod_sequence, best_mod_score, mod_code_string = localize(sequence, best_mod["name"], tolerance, spectrum)
+        best_mod_sequence, best_mod_score, mod_code_string = localize(sequence, best_mod["name"], tolerance, spectrum, peaks, max_charge)
         mod_type = "cation" if "Cation" in best_mod["name"] else ""
-        final_candidates.append((best_mod_score, str(best_mod_sequence), mod_code_string, best_mod, best_mod["delta_mono_mass"], mod_type))
+        final_candidates.append((best_mod_score, str(best_mod_sequence), mod_code_string, best_mod["name"], float(best_mod["delta_mono_mass"]), mod_type))
 
     # tiebreaking for synthesis errors with identical mass (score will show difference)
     candidate_synthesis_errors = synthesis_error(sequence, mass_delta, tolerance)
     if candidate_synthesis_errors is not None:
         closest_error_mass_diff = min(candidate_synthesis_errors.values(), key=lambda x: abs(x - mass_delta))
         tied_errors = [error for error in candidate_synthesis_errors.items() if error[1] == closest_error_mass_diff]
-        best_error_sequence, best_error_score, error_code_string, best_error_str = localize_synthesis_error(sequence, tied_errors, mass_delta, tolerance, spectrum)
+        best_error_sequence, best_error_score, error_code_string, best_error_str = localize_synthesis_error(sequence, tied_errors, mass_delta, tolerance, spectrum, peaks, max_charge)
         final_candidates.append((best_error_score, str(best_error_sequence), error_code_string, best_error_str, closest_error_mass_diff, "synthesis error"))
 
     # comparing mods and synthesis errors if all plausible.
@@ -0,0 +1,89 @@
+import numpy as np
+import scipy.sparse as sparse
+from models import MSRun, Peptide
+import unimod
+from constants import PROTON_MASS, ppm
+from fragment_index import variant_space, mz_bins, fragment_mzs, vote_scores, score_candidates
+
+class VariantLibrary:
+    # Theoretical fragments of every variant of a target peptide as a sparse (variants x m/z bins) matrix of fragment
+    # counts, with bins as wide as the fragment tolerance on a log m/z axis. The MS2 spectra of a run are binned the same
+    # way, each peak spread over its own and the neighbouring bins, and scored against all variants with sparse products
+    # over chunks of chunk_size scans: peak presence times the library gives the fragments hit and peak intensity times
+    # the library the matched intensity, as FragmentIndex.votes does per scan. The top_n variants of each scan by vote
+    # score are then scored exactly with score_ions. Variants are only candidates for a scan if their mass delta matches
+    # within precursor_tolerance (ppm of the precursor mass), or if they have a fragment hit when precursor_tolerance is None.
+    # Fragments are binned up to charge max_charge, e.g. 1 for charge-reduced spectra.
+    def __init__(self, variants, tolerance, precursor_tolerance=None, top_n=5, modification_names=None, chunk_size=1000, max_charge=2):
+        self.variants = variants
+        self.tolerance = tolerance
+        self.precursor_tolerance = precursor_tolerance
+        self.top_n = top_n
+        self.modification_names = modification_names
+        self.chunk_size = chunk_size
+        self.max_charge = max_charge
+        self.deltas = np.array([variant.delta for variant in variants], dtype=np.float64)
+        fragment_mz = fragment_mzs(variants, max_charge)
+        self.fragment_counts = np.array([len(mz) for mz in fragment_mz], dtype=np.int64)
+
+        bins = mz_bins(np.concatenate(fragment_mz), tolerance)
+        self.first_bin = bins.min()
+        self.n_bins = int(bins.max() - self.first_bin + 1)
+        rows = np.repeat(np.arange(len(variants)), self.fragment_counts)
+        # duplicate (variant, bin) entries are summed, so fragments sharing a bin are all counted
+        self.matrix = sparse.csr_matrix((np.ones(len(bins)), (rows, bins - self.first_bin)), shape=(len(variants), self.n_bins))
+        self._matrix_t = self.matrix.T.tocsr()
+
+    # library of a target with every modification in modification_names (all of Unimod if None) on each site Unimod
+    # lists for it, and every single-residue deletion and insertion
+    @classmethod
+    def from_target(cls, sequence: Peptide, modification_names, tolerance, precursor_tolerance=None, top_n=5, chunk_size=1000, max_charge=2):
+        names = modification_names if modification_names else [entry["name"] for entry in unimod.get_mods()]
+        return cls(variant_space(sequence, names, approved_only=True), tolerance, precursor_tolerance, top_n, modification_names, chunk_size, max_charge)
+
+    def __len__(self):
+        return len(self.variants)
+
+    # settings that change search results besides the target, charge and tolerance, e.g. for ResultCache keys
+    def signature(self):
+        names = ",".join(self.modification_names) if self.modification_names else "unimod"
+        return f"variant library:{names}:{self.precursor_tolerance!r}:{self.top_n}:{self.max_charge}"
+
+    # (peak presence, peak intensity) matrices of scans (scans x m/z bins), total intensity of each scan, and the
+    # run's peak store slices of the scans
+    def bin_spectra(self, run: MSRun, scans):
+        store = run.ms2_peaks
+        ordinals = np.array([store.ordinal(scan.scan_number) for scan in scans], dtype=np.int64)
+        rows, peaks = store.gather(ordinals)
+        intensity = store.intensity[peaks].astype(np.float64)
+        total_intensity = np.bincount(rows, weights=intensity, minlength=len(scans))
+
+        # a fragment within tolerance of a peak lies in the peak's bin or a neighbouring one
+        columns = ((mz_bins(store.mz[peaks], self.tolerance) - self.first_bin)[:, None] + np.array([-1, 0, 1])).ravel()
+        rows, intensity = np.repeat(rows, 3), np.repeat(intensity, 3)
+        inside = (columns >= 0) & (columns < self.n_bins)
+        intensity_matrix = sparse.csr_matrix((intensity[inside], (rows[inside], columns[inside])), shape=(len(scans), self.n_bins))
+        presence_matrix = sparse.csr_matrix((np.ones(inside.sum()), (rows[inside], columns[inside])), shape=(len(scans), self.n_bins))
+        presence_matrix.data[:] = 1.0
+        return presence_matrix, intensity_matrix, total_intensity, ordinals
+
+    # generate_usi result of every scan by scan number, as FragmentIndex.search would return it
+    def search_run(self, run: MSRun, sequence: Peptide, scans):
+        target_mass = sequence.mass(0)
+        results = {}
+        for first in range(0, len(scans), self.chunk_size):
+            chunk = scans[first:first + self.chunk_size]
+            presence_matrix, intensity_matrix, total_intensity, ordinals = self.bin_spectra(run, chunk)
+            fragment_hits = (presence_matrix @ self._matrix_t).toarray()
+            intensity_sums = (intensity_matrix @ self._matrix_t).toarray()
+            for i, scan in enumerate(chunk):
+                scores = vote_scores(fragment_hits[i], intensity_sums[i], self.fragment_counts, total_intensity[i])
+                precursor_mass = (scan.precursor_mz - PROTON_MASS) * scan.precursor_charge
+                if self.precursor_tolerance is not None:
+                    allowed = np.flatnonzero(np.abs(self.deltas - (precursor_mass - target_mass)) <= ppm(precursor_mass, self.precursor_tolerance))
+                else:
+                    allowed = np.flatnonzero(fragment_hits[i] > 0)
+                candidates = allowed[np.argsort(-scores[allowed], kind="stable")[:self.top_n]]
+                sorted_mz_array, sorted_intensity_array = run.ms2_peaks.get_peaks(ordinals[i])
+                results[scan.scan_number] = score_candidates(self.variants, candidates, sorted_mz_array, sorted_intensity_array, self.tolerance, self.max_charge)
+        return results
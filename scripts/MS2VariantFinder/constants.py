@@ -26,6 +26,7 @@ PROTON_MASS = 1.007276470
 WATER_MASS = 18.010564683
 OXYGEN_MASS = 15.994914619
 CARBON_MASS = 12
+ISOTOPE_SPACING = 1.003354835
 
 def ppm(mz, tolerance):
     return tolerance / 1000000 * mz
\ No newline at end of file
@@ -0,0 +1,188 @@
+# py generate_ms2_table.py --mzml_file example.mzML.gz --sequence AQDSQVLEEER[Label:13C(6)15N(4)] --run_type DDA --output example_output.csv
+# py generate_ms2_table.py --mzml_file example.mzML.gz --sequence AQDSQVLEEER[Label:13C(6)15N(4)] --run_type PRM --modifications Cation:Na Cation:Al[III] --output example_output --format parquet
+# py generate_ms2_table.py --mzml_file pooled.mzML.gz --sequence AQDSQVLEEER[Label:13C(6)15N(4)] LGEYGFQNALIVR --run_type DDA --output pooled_output.csv
+
+import os
+import sys
+import argparse
+import timeit
+
+sys.path[1:1] = [os.path.join(os.path.dirname(os.path.abspath(__file__)), directory) for directory in ("analysis", "visuals", "mzml_tools")]
+
+from mzml_io import read_mzml
+from models import Peptide, Modification
+from intensity import find_max_ms1
+from ms2_table import generate_ms2_table, generate_multi_target_table, MS2_TABLE_FIELDS, INTENSITY_TABLE_FIELDS, MS2_TABLE_TYPES, INTENSITY_TABLE_TYPES, DELTA_WINDOW
+from table_writer import TableWriter, FORMATS, output_path
+from result_cache import ResultCache, code_version
+from checkpoint import Checkpoint
+from triage import Triage
+from fragment_index import FragmentIndex
+from variant_library import VariantLibrary
+from preprocessing import Preprocessing, WINDOW
+
+# charge (1-4) whose m/z gives the most intense precursor peak across all MS1 scans
+def best_charge(run, sequence, tolerance):
+    intensities = {charge: find_max_ms1(run, sequence.mz(charge), tolerance)[1] for charge in range(1, 5)}
+    return max(intensities, key=intensities.get)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tabulate all MS2 spectra of an mzML file and predict a USI for each as a variant of one or more target peptides")
+    parser.add_argument("--mzml_file", required=True, help="Input mzML file (.mzML or .mzML.gz)")
+    parser.add_argument("--sequence", required=True, nargs="+", help="Sequence of main peptide; several space-separated sequences for runs of pooled peptides")
+    parser.add_argument("--delta_window", default=f"{DELTA_WINDOW[0]:g},{DELTA_WINDOW[1]:g}", help="With several sequences, the range of mass deltas in Da within which an MS2 scan is scored against a target, e.g. \"-200,400\"")
+    parser.add_argument("--ms2_fragment_tolerance", type=float, default=20, help="Tolerance in ppm to search for MS2 fragment ions")
+    parser.add_argument("--ms1_precursor_tolerance", type=float, default=10, help="Tolerance in ppm to search for precursor peaks")
+    parser.add_argument("--run_type", required=True, choices=["DDA", "PRM"], help="Run type (DDA or PRM)")
+    parser.add_argument("--modifications", nargs="+", help="Space-separated Unimod names of the modifications in the PRM method, or of the modifications placed by --fragment_index or --variant_library")
+    parser.add_argument("--scan_range", default=None, help="Only read scans in this inclusive range, e.g. \"1420,1520\"")
+    parser.add_argument("--rt_range", default=None, help="Only read scans in this inclusive retention time range in minutes, e.g. \"20.5,31\"")
+    parser.add_argument("--format", default=None, choices=FORMATS, help="Output table format (default: from the --output extension, else csv)")
+    parser.add_argument("--row_group_size", type=int, default=10000, help="Rows buffered before each write to the output files")
+    parser.add_argument("--triage_delta_window", default=None, help="Only score MS2 scans whose mass delta to the target lies within this range in Da, e.g. \"-50,300\"; other scans are listed unscored")
+    parser.add_argument("--min_peaks", type=int, default=0, help="Only score MS2 scans with at least this many peaks")
+    parser.add_argument("--min_tic", type=float, default=0, help="Only score MS2 scans with at least this total ion current")
+    parser.add_argument("--charges", type=int, nargs="+", default=None, help="Only score MS2 scans with one of these precursor charges")
+    parser.add_argument("--centroid", action="store_true", help="Centroid the spectra that the mzML file marks as profile mode when loading the run")
+    parser.add_argument("--top_peaks", type=int, default=None, help="Keep only this many most intense peaks per --peak_window of each MS2 spectrum when loading the run")
+    parser.add_argument("--peak_window", type=float, default=WINDOW, help="Width in m/z of the windows of --top_peaks")
+    parser.add_argument("--deisotope", action="store_true", help="Collapse the isotope envelopes of MS2 spectra into their monoisotopic peaks when loading the run")
+    parser.add_argument("--charge_reduction", action="store_true", help="Deisotope MS2 spectra and move multiply charged fragments to their singly charged m/z when loading the run; only singly charged fragment ions are then matched")
+    parser.add_argument("--fragment_index", action="store_true", help="Score MS2 scans against a fragment index of every placement of --modifications and every single-residue deletion and insertion of the target, exactly scoring only the best-voted variants")
+    parser.add_argument("--variant_library", action="store_true", help="Score all MS2 scans at once against a sparse library of every Unimod modification (or --modifications) on each approved site and every single-residue deletion and insertion of the target, exactly scoring only the best-voted variants")
+    parser.add_argument("--top_candidates", type=int, default=5, help="With --fragment_index or --variant_library, the number of best-voted variants scored exactly per scan")
+    parser.add_argument("--open_search", action="store_true", help="With --fragment_index or --variant_library, let every variant compete regardless of the precursor mass")
+    parser.add_argument("--cluster_similarity", type=float, default=None, help="Cluster MS2 scans with the same precursor mass whose spectra have at least this cosine similarity, e.g. 0.9, and only score one representative per cluster")
+    parser.add_argument("--consensus", action="store_true", help="Cluster MS2 scans by precursor mass (and --cluster_similarity if given) and score each cluster once on the intensity-weighted consensus spectrum of its members")
+    parser.add_argument("--cache", default=None, help="SQLite file caching USI predictions between runs; scans already scored with the same sequence, charge and fragment tolerance are not scored again")
+    parser.add_argument("--checkpoint_interval", type=int, default=100, help="Finished scans between flushes of the checkpoint file [output].checkpoint.jsonl to disk")
+    parser.add_argument("--resume", action="store_true", help="Resume an interrupted run from its checkpoint file, skipping scans already finished")
+    parser.add_argument("--output", required=True, help="Output file name; writes [output] and [output]_intensities")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.mzml_file):
+        print(f"ERROR: File '{args.mzml_file}' not found or not a file")
+        return
+
+    if args.fragment_index and args.variant_library:
+        print("ERROR: Use only one of --fragment_index and --variant_library")
+        return
+
+    if args.consensus and args.variant_library:
+        print("ERROR: --consensus cannot be used with --variant_library, which scores the scans as read")
+        return
+
+    if args.run_type == "PRM" and not args.modifications:
+        print("ERROR: Parameter --modifications must be provided for PRM runs. See --help for more information")
+        return
+
+    start = timeit.default_timer()
+    sequences = [Peptide.from_string(sequence) for sequence in args.sequence]
+    delta_window = tuple(map(float, args.delta_window.split(",")))
+    preprocessing = Preprocessing(args.top_peaks, args.peak_window, args.deisotope, args.charge_reduction, args.ms2_fragment_tolerance)
+    triage = Triage(tuple(map(float, args.triage_delta_window.split(","))) if args.triage_delta_window else None, args.min_peaks, args.min_tic, args.charges)
+    if args.modifications:
+        # fails early on names that are not in Unimod
+        modifications = [Modification.from_string(-1, name) for name in args.modifications]
+        print(f"INFO: PRM targets: {', '.join(f'{modification.name} ({modification.delta:+.4f})' for modification in modifications)}")
+
+    scan_range = tuple(map(int, args.scan_range.split(","))) if args.scan_range else None
+    rt_range = tuple(map(float, args.rt_range.split(","))) if args.rt_range else None
+    run = read_mzml(args.mzml_file, args.run_type, scan_range, rt_range, preprocessing, args.centroid)
+    if not run.ms1_spectra or not run.ms2_spectra:
+        print(f"ERROR: No MS1 or MS2 spectra found in {args.mzml_file} within the selected range")
+        return
+    if preprocessing.enabled:
+        print(f"INFO: Preprocessing: {preprocessing.report()}")
+
+    # one run load, peak store and MS1 index serve every target
+    targets = []
+    for sequence in sequences:
+        charge = best_charge(run, sequence, args.ms1_precursor_tolerance)
+        print(f"INFO: Most intense precursor charge of {sequence}: {charge}")
+        targets.append((sequence, charge))
+    multi_target = len(targets) > 1
+
+    if args.modifications:
+        # targeted variant check: MS2 scans whose precursor matches each target carrying each PRM modification
+        for sequence in sequences:
+            matches = run.precursor_index.batch([sequence.mass(0) + modification.delta for modification in modifications], args.ms1_precursor_tolerance)
+            print(f"INFO: MS2 scans matching {sequence} variants: {', '.join(f'{modification.name} {len(ordinals)}' for modification, ordinals in zip(modifications, matches))}")
+
+    table_file = output_path(args.output, args.format)
+    intensity_file = output_path(args.output, args.format, "_intensities")
+    # every parameter that changes the rows, so that a checkpoint is never resumed into a different table
+    mzml_stat = os.stat(args.mzml_file)
+    parameters = {"mzml_file": os.path.abspath(args.mzml_file), "mzml_size": mzml_stat.st_size, "mzml_mtime": mzml_stat.st_mtime,
+                  "sequence": [str(sequence) for sequence in sequences], "delta_window": delta_window if multi_target else None, "ms2_fragment_tolerance": args.ms2_fragment_tolerance,
+                  "ms1_precursor_tolerance": args.ms1_precursor_tolerance, "run_type": args.run_type,
+                  "modifications": args.modifications, "scan_range": scan_range, "rt_range": rt_range, "centroid": args.centroid, "preprocessing": preprocessing.parameters(), "triage": triage.parameters(),
+                  "fragment_index": [args.top_candidates, args.open_search] if args.fragment_index else None,
+                  "variant_library": [args.top_candidates, args.open_search] if args.variant_library else None, "cluster_similarity": args.cluster_similarity, "consensus": args.consensus, "code_version": code_version()}
+    checkpoint_file = os.path.splitext(table_file)[0] + ".checkpoint.jsonl"
+    try:
+        checkpoint = Checkpoint(checkpoint_file, parameters, args.checkpoint_interval, args.resume)
+    except ValueError as e:
+        print(f"ERROR: {e}. Run without --resume to start over")
+        return
+    if checkpoint.completed:
+        print(f"INFO: Resuming from {checkpoint_file}: {len(checkpoint.completed)} scans already finished")
+
+    indexes = {}
+    if args.fragment_index:
+        precursor_tolerance = None if args.open_search else args.ms1_precursor_tolerance
+        for sequence in sequences:
+            index = FragmentIndex.from_target(sequence, args.modifications or [], args.ms2_fragment_tolerance, precursor_tolerance, args.top_candidates, run.fragment_charge)
+            print(f"INFO: Fragment index of {sequence}: {len(index)} variants, {len(index.fragment_variants)} fragments")
+            indexes[str(sequence)] = index
+    libraries = {}
+    if args.variant_library:
+        precursor_tolerance = None if args.open_search else args.ms1_precursor_tolerance
+        for sequence in sequences:
+            library = VariantLibrary.from_target(sequence, args.modifications, args.ms2_fragment_tolerance, precursor_tolerance, args.top_candidates, max_charge=run.fragment_charge)
+            print(f"INFO: Variant library of {sequence}: {len(library)} variants, {library.matrix.nnz} fragment bins")
+            libraries[str(sequence)] = library
+
+    cache = ResultCache(args.cache) if args.cache else None
+    if multi_target:
+        # rows of several targets: keyed by (target, scan number) and labelled with a leading target column
+        rows = generate_multi_target_table(run, targets, args.ms2_fragment_tolerance, args.run_type, args.ms1_precursor_tolerance, delta_window, cache, checkpoint.completed, triage=triage, indexes=indexes, libraries=libraries, similarity=args.cluster_similarity, consensus=args.consensus)
+        row_key = lambda row: (row["target"], row["scan number"])
+        table_fields, intensity_fields = ["target"] + MS2_TABLE_FIELDS, ["target"] + INTENSITY_TABLE_FIELDS
+        table_types, intensity_types = {"target": "string", **MS2_TABLE_TYPES}, {"target": "string", **INTENSITY_TABLE_TYPES}
+    else:
+        sequence, charge = targets[0]
+        rows = generate_ms2_table(run, sequence, charge, args.ms2_fragment_tolerance, args.run_type, args.ms1_precursor_tolerance, cache, checkpoint.completed, triage=triage, index=indexes.get(str(sequence)), library=libraries.get(str(sequence)), similarity=args.cluster_similarity, consensus=args.consensus)
+        row_key = lambda row: row["scan number"]
+        table_fields, intensity_fields = MS2_TABLE_FIELDS, INTENSITY_TABLE_FIELDS
+        table_types, intensity_types = MS2_TABLE_TYPES, INTENSITY_TABLE_TYPES
+
+    with checkpoint, TableWriter(table_file, table_fields, args.format, args.row_group_size, table_types) as table_writer, \
+         TableWriter(intensity_file, intensity_fields, args.format, args.row_group_size, intensity_types) as intensity_writer:
+        representatives = set()
+        for row, intensity_row in rows:
+            if row.get("cluster") is not None:
+                representatives.add((row.get("target"), row["cluster"]))
+            table_writer.writerow(row)
+            intensity_writer.writerow(intensity_row)
+            if row_key(row) not in checkpoint.completed:
+                checkpoint.write(row_key(row), row, intensity_row)
+    os.remove(checkpoint_file)
+    if cache is not None:
+        cache.close()
+        print(f"INFO: Reused {cache.hits} cached USI predictions and computed {cache.misses} in {args.cache}")
+
+    if args.consensus:
+        print(f"INFO: Clustered MS2 scans into {len(representatives)} clusters; each was scored once on its consensus spectrum")
+    elif args.cluster_similarity is not None:
+        print(f"INFO: Clustered MS2 scans into {len(representatives)} clusters; only their representatives were scored")
+    if triage.enabled:
+        print(f"INFO: Triage: {triage.report()}")
+    if multi_target:
+        routed = table_writer.rows_written - len(targets)
+        print(f"INFO: Routed {routed} (scan, target) pairs from {len(run.ms2_spectra)} MS2 scans and {len(targets)} targets")
+    print(f"INFO: Wrote {table_writer.rows_written} rows to {table_file} and {intensity_file}")
+    print(f"INFO: Elapsed time: {timeit.default_timer() - start:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# py generate_stdev_plot.py --mzml_file example.mzML --sequence AQDSQVLEEER[Label:13C(6)15N(4)] --modification Cation:Al[III] --mod_index 2 --scan_number 1484 --run_type DDA --output output
+# py generate_stdev_plot.py --mzml_file example.mzML --sequence AQDSQVLEEER[Label:13C(6)15N(4)] --modification Cation:Al[III] --mod_index 2 --scan_numbers 1484 1502 1517 --run_type DDA --output output
+# py generate_stdev_plot.py --mzml_file example.mzML --sequence AQDSQVLEEER[Label:13C(6)15N(4)] --modification Cation:Al[III] --mod_index 2 --ms2_table example_output.csv --run_type DDA --output output
+# py generate_stdev_plot.py --mzml_file example.mzML --sequence AQDSQVLEEER[Label:13C(6)15N(4)] --modification Cation:Al[III] --mod_index 2 --precursor_tolerance 10 --run_type DDA --output output
+# py generate_stdev_plot.py --mzml_file example.mzML --sequence AQDSQVLEEER[Label:13C(6)15N(4)] --modification Cation:Al[III] --mod_index 2 --precursor_tolerance 10 --consensus --run_type DDA --output output
+
+import os
+import sys
+import argparse
+import timeit
+
+sys.path[1:1] = [os.path.join(os.path.dirname(os.path.abspath(__file__)), directory) for directory in ("analysis", "visuals", "mzml_tools")]
+
+from mzml_io import read_mzml
+from models import Peptide, Modification
+from stdev_plot import calculate_stdev, optimize_delta, plot_stdev
+from delta_refinement import select_table_scans, select_precursor_scans, refine_delta
+from consensus import consensus_spectrum, MIN_FRACTION
+from table_writer import TableWriter, FORMATS, output_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Constrain the delta mass of a modification from the fragment ion residuals of MS2 scans")
+    parser.add_argument("--mzml_file", required=True, help="Input mzML file")
+    parser.add_argument("--sequence", required=True, help="Sequence of main peptide")
+    parser.add_argument("--modification", required=True, help="Unimod name of the investigated modification")
+    parser.add_argument("--mod_index", type=int, required=True, help="0-based index of the modification on the peptide (-1 for N-term)")
+    parser.add_argument("--scan_number", type=int, help="Scan number of the MS2 spectrum to plot")
+    parser.add_argument("--scan_numbers", type=int, nargs="+", help="Scan numbers of MS2 spectra to summarize in one CSV")
+    parser.add_argument("--ms2_table", help="MS2VariantFinder table in any table format; pools all scans assigned the modification at --mod_index (of the --sequence target in tables of several targets)")
+    parser.add_argument("--precursor_tolerance", type=float, help="Pools all MS2 scans whose precursor mass is within this tolerance in ppm of the modified peptide; with --ms2_table, only the table scans that also match")
+    parser.add_argument("--consensus", action="store_true", help="Also estimate the delta mass once on the consensus spectrum of the pooled scans (or of --scan_numbers)")
+    parser.add_argument("--min_fraction", type=float, default=MIN_FRACTION, help="With --consensus, keep only consensus peaks found in at least this fraction of the scans")
+    parser.add_argument("--n_bootstrap", type=int, default=1000, help="Number of bootstrap resamples for the pooled delta mass interval")
+    parser.add_argument("--tolerance", type=float, default=6, help="Tolerance in ppm to identify fragment ions")
+    parser.add_argument("--delta_range", type=float, default=0.002, help="Half-width in Da of the swept delta mass range")
+    parser.add_argument("--step", type=float, default=0.000001, help="Step in Da of the swept delta mass range")
+    parser.add_argument("--run_type", required=True, help="Run type (DDA or PRM)")
+    parser.add_argument("--output", required=True, help="Output file name")
+    parser.add_argument("--format", default="csv", choices=FORMATS, help="Format of the --scan_numbers and --ms2_table output tables")
+    parser.add_argument("--row_group_size", type=int, default=10000, help="Rows written to the output tables at a time")
+    args = parser.parse_args()
+
+    if args.scan_number is None and not args.scan_numbers and args.ms2_table is None and args.precursor_tolerance is None:
+        print("ERROR: One of --scan_number, --scan_numbers, --ms2_table or --precursor_tolerance must be provided. See --help for more information")
+        return
+
+    if args.consensus and not args.scan_numbers and args.ms2_table is None and args.precursor_tolerance is None:
+        print("ERROR: --consensus needs the scans of --scan_numbers, --ms2_table or --precursor_tolerance")
+        return
+
+    if not os.path.isfile(args.mzml_file):
+        print(f"ERROR: File '{args.mzml_file}' not found or not a file")
+        return
+
+    start = timeit.default_timer()
+    run = read_mzml(args.mzml_file, args.run_type)
+    sequence = Peptide.from_string(args.sequence)
+    modification = Modification.from_string(args.mod_index, args.modification)
+
+    if args.scan_number is not None:
+        results = calculate_stdev(run.get_scan(args.scan_number), sequence, modification, args.tolerance, args.delta_range, args.step)
+        plot_stdev(os.path.splitext(args.output)[0], modification.delta, results, args.scan_number)
+
+    if args.scan_numbers:
+        output_file = output_path(os.path.splitext(args.output)[0], args.format)
+        fieldnames = ["scan number", "matched ions", "best delta", "best stdev", "lower bound", "upper bound"]
+        written = 0
+        with TableWriter(output_file, fieldnames, args.format, args.row_group_size) as writer:
+            for scan_number in args.scan_numbers:
+                try:
+                    best_delta, best_stdev, lower, upper, matched_ions = optimize_delta(run.get_scan(scan_number), sequence, modification, args.tolerance)
+                except (KeyError, ValueError) as error:
+                    print(f"WARNING: Skipping scan {scan_number}: {error}")
+                    continue
+                writer.writerow({"scan number": scan_number,
+                                 "matched ions": matched_ions,
+                                 "best delta": best_delta,
+                                 "best stdev": best_stdev,
+                                 "lower bound": lower,
+                                 "upper bound": upper})
+                written += 1
+        print(f"INFO: Wrote delta mass estimates for {written} of {len(args.scan_numbers)} scans to {output_file}")
+
+    scan_numbers = args.scan_numbers or []
+    if args.ms2_table or args.precursor_tolerance is not None:
+        if args.ms2_table:
+            scan_numbers = select_table_scans(args.ms2_table, args.modification, args.mod_index, str(sequence), run)
+            print(f"INFO: Found {len(scan_numbers)} scans with {args.modification} at index {args.mod_index} in {args.ms2_table}")
+        if args.precursor_tolerance is not None:
+            precursor_scans = select_precursor_scans(run, sequence, modification, args.precursor_tolerance)
+            print(f"INFO: Found {len(precursor_scans)} scans with a precursor within {args.precursor_tolerance:g} ppm of {sequence} + {args.modification}")
+            if args.ms2_table:
+                matching = set(precursor_scans)
+                scan_numbers = [scan_number for scan_number in scan_numbers if scan_number in matching]
+                print(f"INFO: {len(scan_numbers)} table scans have a matching precursor")
+            else:
+                scan_numbers = precursor_scans
+    # checked before the pooled refinement, which would otherwise run on an empty selection first
+    if args.consensus and not scan_numbers:
+        print("ERROR: No scans selected for the consensus spectrum")
+        return
+
+    if args.ms2_table or args.precursor_tolerance is not None:
+        try:
+            result = refine_delta(run, scan_numbers, sequence, modification, args.tolerance, args.n_bootstrap)
+        except (KeyError, ValueError) as error:
+            print(f"ERROR: No pooled delta mass from {len(scan_numbers)} scans: {error}")
+            return
+        output_file = output_path(os.path.splitext(args.output)[0], args.format, "_pooled")
+        fieldnames = ["modification", "mod index", "scans", "matched ions", "best delta", "pooled stdev", "lower bound", "upper bound"]
+        with TableWriter(output_file, fieldnames, args.format, args.row_group_size) as writer:
+            writer.writerow({"modification": args.modification, "mod index": args.mod_index, **result})
+        print(f"INFO: Pooled delta mass from {result['scans']} scans: {result['best delta']:.6f} "
+              f"({result['lower bound']:.6f} to {result['upper bound']:.6f}). Output file: {output_file}")
+
+    if args.consensus:
+        spectrum = consensus_spectrum(run, scan_numbers, args.tolerance, args.min_fraction)
+        try:
+            best_delta, best_stdev, lower, upper, matched_ions = optimize_delta(spectrum, sequence, modification, args.tolerance)
+        except ValueError as error:
+            print(f"ERROR: No delta mass from the consensus spectrum: {error}")
+            return
+        output_file = output_path(os.path.splitext(args.output)[0], args.format, "_consensus")
+        fieldnames = ["modification", "mod index", "scans", "consensus peaks", "matched ions", "best delta", "best stdev", "lower bound", "upper bound", "member scans"]
+        with TableWriter(output_file, fieldnames, args.format, args.row_group_size) as writer:
+            writer.writerow({"modification": args.modification, "mod index": args.mod_index, "scans": len(scan_numbers),
+                             "consensus peaks": len(spectrum.mz_array), "matched ions": matched_ions, "best delta": best_delta,
+                             "best stdev": best_stdev, "lower bound": lower, "upper bound": upper,
+                             "member scans": " ".join(map(str, scan_numbers))})
+        print(f"INFO: Consensus delta mass from {len(scan_numbers)} scans: {best_delta:.6f} ({lower:.6f} to {upper:.6f}). Output file: {output_file}")
+
+    print(f"INFO: Elapsed time: {timeit.default_timer() - start:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
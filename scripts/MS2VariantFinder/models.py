@@ -4,6 +4,9 @@ import unimod
 from constants import *
 import numpy as np
 from collections import defaultdict
+from peak_store import PeakStore
+from peak_index import MzIndex
+from precursor_index import PrecursorIndex
 
 class Scan:
     def __init__(
@@ -37,12 +40,32 @@ class Scan:
             self.last_ms1_scan = last_ms1_scan
 
 class MSRun:
-    def __init__(self, scans: list[Scan], run_type):
+    # with a Preprocessing, the MS2 spectra are preprocessed once here, and every later use of their peaks sees the
+    # preprocessed peaks
+    def __init__(self, scans: list[Scan], run_type, name="", preprocessing=None):
         self.scans = scans
         self.run_type = run_type
+        self.name = name
+        self.preprocessing = preprocessing if preprocessing is not None and preprocessing.enabled else None
         self.indexed_scans = {scan.scan_number: scan for scan in scans}
         self.ms1_spectra = [scan for scan in scans if scan.ms_level == 1]
         self.ms2_spectra = [scan for scan in scans if scan.ms_level == 2]
+        self.ms1_peaks = PeakStore.from_scans(self.ms1_spectra)
+        self.ms2_peaks = PeakStore.from_scans(self.ms2_spectra) if self.preprocessing is None else self.preprocessing.apply_to_scans(self.ms2_spectra)
+        # ordinals of the precursor index are positions in ms2_spectra
+        self.precursor_index = PrecursorIndex.from_scans(self.ms2_spectra)
+        self.ms1_index = MzIndex.from_peak_store(self.ms1_peaks,
+                                                 rt=[scan.rt for scan in self.ms1_spectra],
+                                                 iit=[scan.iit for scan in self.ms1_spectra])
+
+    # highest fragment ion charge to match in the MS2 spectra: 1 once their peaks are reduced to singly charged ions
+    @property
+    def fragment_charge(self):
+        return 1 if self.preprocessing is not None and self.preprocessing.charge_reduction else 2
+
+    # the run name used in USIs
+    def __str__(self):
+        return self.name
 
     def get_scan(self, scan_number):
         if scan_number in self.indexed_scans:
@@ -71,8 +94,9 @@ class MSRun:
                         precursor = sim_scan
                     return precursor
 
+        # the precursor scan may lie outside a scan or retention time range that was read
         if self.run_type == "DDA":
-            return self.indexed_scans[scan.last_ms1_scan]
+            return self.indexed_scans.get(scan.last_ms1_scan)
 
         return None
 
@@ -193,8 +217,11 @@ class Peptide:
         return self.mass(charge) / charge
 
     # returns fragment ion masses
-    def fragments(self):
+    # fragment ions by series; with max_charge=1 (e.g. for charge-reduced spectra), without the b2 and y2 ions
+    def fragments(self, max_charge=2):
         fragments = {"a": self.a_ions(), "b": self.b_ions(1), "b2": self.b_ions(2), "y": self.y_ions(1), "y2": self.y_ions(2)}
+        if max_charge < 2:
+            del fragments["b2"], fragments["y2"]
         return fragments
 
     # returns a-ion masses
@@ -0,0 +1,44 @@
+import numpy as np
+
+MAX_GAP = 5.0               # spacings; a gap this many times the median point spacing (in ppm) ends a profile peak
+
+# True if the spectrum's CV terms mark it as profile mode; spectra marked as centroided or not marked are left alone
+def is_profile(spectrum):
+    return "profile spectrum" in spectrum and "centroid spectrum" not in spectrum
+
+# Centroids of a profile spectrum. Points are split into profile peaks at local minima, zero-intensity points and gaps
+# of more than max_gap times the median point spacing; each peak with a nonzero apex gives one centroid at the
+# intensity-weighted mean m/z of its points above half the apex height, with the apex intensity.
+def centroid(mz, intensity, max_gap=MAX_GAP):
+    mz = np.asarray(mz, dtype=np.float64)
+    intensity = np.asarray(intensity, dtype=np.float64)
+    if len(mz) < 3:
+        return mz, intensity
+    new_peak = np.zeros(len(mz), dtype=bool)
+    new_peak[0] = True
+    new_peak[1:] |= intensity[:-1] == 0
+    spacing = np.diff(mz) / mz[1:]
+    new_peak[1:] |= spacing > max_gap * np.median(spacing)
+    # the point after a local minimum starts a new peak: the signal rises again after falling or staying flat. A point
+    # that already starts a peak is not a minimum, since the fall before it is across a zero point or gap.
+    rising = np.diff(intensity) > 0
+    new_peak[2:] |= rising[1:] & ~rising[:-1] & ~new_peak[1:-1]
+    starts = np.flatnonzero(new_peak)
+    peak_ids = np.cumsum(new_peak) - 1
+
+    apex = np.maximum.reduceat(intensity, starts)
+    weights = np.where(intensity >= apex[peak_ids] / 2, intensity, 0.0)
+    weight_sums = np.add.reduceat(weights, starts)
+    found = apex > 0
+    centroid_mz = np.add.reduceat(weights * mz, starts)[found] / weight_sums[found]
+    return centroid_mz, apex[found]
+
+# Replaces the peak arrays of a decoded profile spectrum (a pyteomics spectrum dict) with its centroids and marks it as
+# centroided. Returns whether the spectrum was centroided.
+def centroid_spectrum(spectrum, max_gap=MAX_GAP):
+    if not is_profile(spectrum) or "m/z array" not in spectrum:
+        return False
+    spectrum["m/z array"], spectrum["intensity array"] = centroid(spectrum["m/z array"], spectrum["intensity array"], max_gap)
+    del spectrum["profile spectrum"]
+    spectrum["centroid spectrum"] = ""
+    return True
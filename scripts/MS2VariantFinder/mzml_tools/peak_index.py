@@ -0,0 +1,119 @@
+from spectrum_reader import read_spectra
+import numpy as np
+import re
+
+class MzIndex:
+    # All peaks of a set of scans sorted by m/z, with parallel scan-ordinal and intensity arrays. An XIC for any m/z is
+    # a searchsorted slice of the index plus a bincount over the slice's scan ordinals.
+    def __init__(self, mz, intensity, ordinals, scan_numbers, rt=None, iit=None, sim_windows=None):
+        order = np.argsort(mz, kind="stable")
+        self.mz = mz[order]
+        self.intensity = intensity[order]
+        self.ordinals = ordinals[order]
+        self.scan_numbers = np.asarray(scan_numbers, dtype=np.int64)
+
+        n_scans = len(self.scan_numbers)
+        self.rt = np.asarray(rt, dtype=np.float64) if rt is not None else np.full(n_scans, np.nan)
+        self.iit = np.asarray(iit, dtype=np.float64) if iit is not None else np.full(n_scans, np.nan)
+        # SIM isolation windows; full scans have NaN bounds and never contain a target
+        sim_windows = np.asarray(sim_windows, dtype=np.float64).reshape(-1, 2) if sim_windows is not None else np.full((n_scans, 2), np.nan)
+        self.sim_low = sim_windows[:, 0]
+        self.sim_high = sim_windows[:, 1]
+
+    @classmethod
+    def from_arrays(cls, scan_numbers, mz_arrays, intensity_arrays, **columns):
+        counts = np.array([len(mz_array) for mz_array in mz_arrays], dtype=np.int64)
+        ordinals = np.repeat(np.arange(len(counts)), counts)
+        mz = np.concatenate(mz_arrays) if len(mz_arrays) > 0 else np.zeros(0, dtype=np.float64)
+        intensity = np.concatenate(intensity_arrays) if len(intensity_arrays) > 0 else np.zeros(0, dtype=np.float32)
+        return cls(mz, intensity, ordinals, scan_numbers, **columns)
+
+    @classmethod
+    def from_peak_store(cls, peaks, **columns):
+        return cls(peaks.mz, peaks.intensity, peaks.ordinals, peaks.scan_numbers, **columns)
+
+    def __len__(self):
+        return len(self.scan_numbers)
+
+    # selects scans by inclusive scan number and retention time ranges, and optionally only SIM scans whose
+    # isolation window contains sim_mz
+    def scan_mask(self, scan_range=None, rt_range=None, sim_mz=None):
+        mask = np.ones(len(self), dtype=bool)
+        if scan_range:
+            mask &= (self.scan_numbers >= scan_range[0]) & (self.scan_numbers <= scan_range[1])
+        if rt_range:
+            mask &= (self.rt >= rt_range[0]) & (self.rt <= rt_range[1])
+        if sim_mz is not None:
+            mask &= (self.sim_low <= sim_mz) & (sim_mz <= self.sim_high)
+        return mask
+
+    # index slice of all peaks within tolerance (ppm) of mz, bounds inclusive
+    def window(self, mz, tolerance):
+        tolerance_da = mz * tolerance / 1e6
+        left = np.searchsorted(self.mz, mz - tolerance_da, side="left")
+        right = np.searchsorted(self.mz, mz + tolerance_da, side="right")
+        return slice(left, right)
+
+    # summed intensity within tolerance of mz for every scan
+    def xic(self, mz, tolerance):
+        window = self.window(mz, tolerance)
+        return np.bincount(self.ordinals[window], weights=self.intensity[window], minlength=len(self))
+
+    # summed intensity and intensity-weighted mean m/z within tolerance of mz for every scan
+    def weighted_mz(self, mz, tolerance):
+        window = self.window(mz, tolerance)
+        intensity = self.intensity[window].astype(np.float64)
+        total_intensity = np.bincount(self.ordinals[window], weights=intensity, minlength=len(self))
+        weighted_sum = np.bincount(self.ordinals[window], weights=self.mz[window] * intensity, minlength=len(self))
+        observed_mz = np.divide(weighted_sum, total_intensity, out=np.zeros(len(self)), where=total_intensity != 0)
+        return total_intensity, observed_mz
+
+    # tallest peak within tolerance of mz for every scan (lowest m/z on ties); scans without a peak get 0 and found=False
+    def window_max(self, mz, tolerance):
+        window = self.window(mz, tolerance)
+        mz_slice = self.mz[window]
+        intensity_slice = self.intensity[window]
+        ordinal_slice = self.ordinals[window]
+        order = np.lexsort((mz_slice, -intensity_slice, ordinal_slice))
+        hit_ordinals, first = np.unique(ordinal_slice[order], return_index=True)
+
+        max_intensity = np.zeros(len(self), dtype=np.float64)
+        max_mz = np.zeros(len(self), dtype=np.float64)
+        found = np.zeros(len(self), dtype=bool)
+        max_intensity[hit_ordinals] = intensity_slice[order[first]]
+        max_mz[hit_ordinals] = mz_slice[order[first]]
+        found[hit_ordinals] = True
+        return max_intensity, max_mz, found
+
+# builds an MzIndex over all MS1 spectra of an mzML file (path or open file object) in one pass, optionally reading
+# only the spectra within an inclusive scan number and/or retention time range; with centroid, profile-mode spectra
+# are centroided before they are indexed
+def read_ms1_index(source, scan_range=None, rt_range=None, centroid=False):
+    scan_numbers = []
+    mz_arrays = []
+    intensity_arrays = []
+    rts = []
+    iits = []
+    sim_windows = []
+
+    for spectrum in read_spectra(source, scan_range, rt_range, centroid=centroid):
+        if spectrum.get("ms level", 1) != 1:
+            continue
+        try:
+            scan = spectrum["scanList"]["scan"][0]
+        except (KeyError, IndexError):
+            scan = {}
+        filter_string = scan.get("filter string", "")
+        match = re.search(r"\[(\d+\.?\d*)-(\d+\.?\d*)\]", filter_string)
+
+        scan_numbers.append(int(spectrum["id"].split("=")[-1]))
+        mz_arrays.append(spectrum["m/z array"])
+        intensity_arrays.append(spectrum["intensity array"])
+        rts.append(scan.get("scan start time", np.nan))
+        iits.append(scan.get("ion injection time", np.nan))
+        if "SIM" in filter_string.upper() and match:
+            sim_windows.append((float(match.group(1)), float(match.group(2))))
+        else:
+            sim_windows.append((np.nan, np.nan))
+
+    return MzIndex.from_arrays(scan_numbers, mz_arrays, intensity_arrays, rt=rts, iit=iits, sim_windows=sim_windows)
@@ -0,0 +1,91 @@
+import numpy as np
+
+class PeakStore:
+    # Peaks of a list of scans concatenated into flat arrays. Each scan owns the slice offsets[i]:offsets[i+1],
+    # and within that slice the peaks are sorted by m/z.
+    def __init__(self, scan_numbers, mz_arrays, intensity_arrays):
+        self.scan_numbers = np.asarray(scan_numbers, dtype=np.int64)
+        self.counts = np.array([len(mz_array) for mz_array in mz_arrays], dtype=np.int64)
+        self.offsets = np.zeros(len(self.counts) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=self.offsets[1:])
+        self.ordinals = np.repeat(np.arange(len(self.counts)), self.counts)
+        self._ordinal_index = {int(scan_number): i for i, scan_number in enumerate(self.scan_numbers)}
+
+        if len(self.counts) == 0 or self.offsets[-1] == 0:
+            self.mz = np.zeros(0, dtype=np.float64)
+            self.intensity = np.zeros(0, dtype=np.float32)
+        else:
+            mz = np.concatenate(mz_arrays)
+            intensity = np.concatenate(intensity_arrays)
+            order = np.lexsort((mz, self.ordinals)) # sorts by scan first, then by m/z within each scan
+            self.mz = mz[order]
+            self.intensity = intensity[order]
+
+        self.noise, self.noise_mad, self.signal, self.sn_ratio = estimate_noise(self.intensity, self.ordinals, self.offsets)
+
+    @classmethod
+    def from_scans(cls, scans):
+        return cls([scan.scan_number for scan in scans],
+                   [scan.mz_array for scan in scans],
+                   [scan.intensity_array for scan in scans])
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def starts(self):
+        return self.offsets[:-1]
+
+    @property
+    def ends(self):
+        return self.offsets[1:]
+
+    def __contains__(self, scan_number):
+        return scan_number in self._ordinal_index
+
+    def ordinal(self, scan_number):
+        if scan_number in self._ordinal_index:
+            return self._ordinal_index[scan_number]
+        raise KeyError(f"Scan {scan_number} not found")
+
+    # returns m/z-sorted views of the peaks of one scan
+    def get_peaks(self, ordinal):
+        start, end = self.offsets[ordinal], self.offsets[ordinal + 1]
+        return self.mz[start:end], self.intensity[start:end]
+
+    # (row, peak index) of every peak of the scans at ordinals, where row is the scan's position in ordinals
+    def gather(self, ordinals):
+        starts, ends = self.offsets[ordinals], self.offsets[np.asarray(ordinals) + 1]
+        lengths = ends - starts
+        peaks = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return np.repeat(np.arange(len(lengths)), lengths), peaks
+
+# median of every scan slice of an array that is already sorted within each scan
+def _sorted_median(sorted_values, offsets):
+    counts = np.diff(offsets)
+    median = np.zeros(len(counts), dtype=np.float64)
+    non_empty = counts > 0
+    lower = (offsets[:-1] + (counts - 1) // 2)[non_empty]
+    upper = (offsets[:-1] + counts // 2)[non_empty]
+    median[non_empty] = (sorted_values[lower].astype(np.float64) + sorted_values[upper]) / 2
+    return median
+
+# per-scan noise model: noise is the median peak intensity, noise_mad the scaled median absolute deviation around it,
+# and signal the mean of the 2nd and 3rd most intense peaks.
+def estimate_noise(intensity, ordinals, offsets):
+    counts = np.diff(offsets)
+    starts, ends = offsets[:-1], offsets[1:]
+    sorted_intensity = intensity[np.lexsort((intensity, ordinals))]
+    noise = _sorted_median(sorted_intensity, offsets)
+
+    deviation = np.abs(intensity - noise[ordinals])
+    noise_mad = 1.4826 * _sorted_median(deviation[np.lexsort((deviation, ordinals))], offsets)
+
+    signal = np.zeros(len(counts), dtype=np.float64)
+    non_empty = counts > 0
+    second = np.maximum(ends - 2, starts)[non_empty]
+    third = np.maximum(ends - 3, starts)[non_empty]
+    signal[non_empty] = (sorted_intensity[second].astype(np.float64) + sorted_intensity[third]) / 2
+
+    sn_ratio = np.divide(signal, noise, out=np.zeros_like(signal), where=noise > 0)
+    return noise, noise_mad, signal, sn_ratio
@@ -0,0 +1,52 @@
+import numpy as np
+from constants import PROTON_MASS
+
+class PrecursorIndex:
+    # Precursors of a list of MS2 scans sorted by neutral mass, with parallel m/z, charge, scan number and ordinal
+    # (index into the scan list) arrays. Mass lookups are searchsorted slices.
+    def __init__(self, mz, charge, scan_numbers, ordinals=None):
+        mz = np.asarray(mz, dtype=np.float64)
+        charge = np.asarray(charge, dtype=np.int64)
+        mass = mz * charge - PROTON_MASS * charge
+        ordinals = np.arange(len(mz)) if ordinals is None else np.asarray(ordinals, dtype=np.int64)
+        order = np.argsort(mass, kind="stable")
+        self.mass = mass[order]
+        self.mz = mz[order]
+        self.charge = charge[order]
+        self.scan_numbers = np.asarray(scan_numbers, dtype=np.int64)[order]
+        self.ordinals = ordinals[order]
+
+    @classmethod
+    def from_scans(cls, scans):
+        return cls([scan.precursor_mz for scan in scans],
+                   [scan.precursor_charge for scan in scans],
+                   [scan.scan_number for scan in scans])
+
+    def __len__(self):
+        return len(self.mass)
+
+    # index slice of all precursors with neutral mass in [low, high]
+    def window(self, low, high):
+        return slice(np.searchsorted(self.mass, low, side="left"), np.searchsorted(self.mass, high, side="right"))
+
+    # ordinals, in scan order, of the precursors with neutral mass in [low, high]
+    def range(self, low, high):
+        return np.sort(self.ordinals[self.window(low, high)])
+
+    # ordinals, in scan order, of the precursors within tolerance (ppm) of a neutral mass
+    def query(self, mass, tolerance):
+        tolerance_da = mass * tolerance / 1e6
+        return self.range(mass - tolerance_da, mass + tolerance_da)
+
+    # ordinals, in scan order, for many neutral masses at once: within tolerance (ppm) of each mass, or within
+    # delta_window (Da, low and high offsets) of each mass
+    def batch(self, masses, tolerance=None, delta_window=None):
+        masses = np.asarray(masses, dtype=np.float64)
+        if delta_window is not None:
+            lows, highs = masses + delta_window[0], masses + delta_window[1]
+        else:
+            tolerance_da = masses * tolerance / 1e6
+            lows, highs = masses - tolerance_da, masses + tolerance_da
+        lefts = np.searchsorted(self.mass, lows, side="left")
+        rights = np.searchsorted(self.mass, highs, side="right")
+        return [np.sort(self.ordinals[left:right]) for left, right in zip(lefts, rights)]
@@ -0,0 +1,127 @@
+import numpy as np
+from peak_store import PeakStore
+from constants import PROTON_MASS, ISOTOPE_SPACING, ppm
+
+WINDOW = 100.0              # m/z
+MAX_CHARGE = 3
+ISOTOPE_RATIO = 1.5         # an isotope peak may be at most this many times as intense as the peak it follows
+
+# Mask of the n most intense peaks of each window m/z wide in each scan, over the concatenated peaks of many scans
+# (ordinals: the scan of each peak). Ties keep the peak that comes first.
+def top_n_per_window(mz, intensity, ordinals, n, window=WINDOW):
+    windows = (mz // window).astype(np.int64)
+    order = np.lexsort((-intensity, windows, ordinals))
+    groups = ordinals[order] * (int(windows.max()) + 1 if len(windows) else 1) + windows[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.zeros(0, dtype=np.int64)
+    ranks = np.arange(len(order)) - np.repeat(starts, np.diff(np.append(starts, len(order))))
+    keep = np.zeros(len(mz), dtype=bool)
+    keep[order[ranks < n]] = True
+    return keep
+
+# Isotope envelopes of peaks sorted by scan, then m/z. A peak is an isotope of the peak ISOTOPE_SPACING / z below it in
+# the same scan (within tolerance, ppm) if it is at most ISOTOPE_RATIO times as intense, trying the highest charge z
+# first. Chains of isotopes lead back to a monoisotopic peak, which takes the summed intensity of its envelope and the
+# charge of its isotope spacing (0 if it has no isotopes). Returns the mask of monoisotopic peaks, their summed
+# intensities and charges, all over the input peaks.
+def deisotope(mz, intensity, ordinals, tolerance, max_charge=MAX_CHARGE):
+    n_peaks = len(mz)
+    # m/z offset by scan, so that one searchsorted only finds peaks of the same scan
+    span = float(mz.max()) + 10 if n_peaks else 1.0
+    keys = ordinals * span + mz
+    width = ppm(mz, tolerance)
+    parent = np.arange(n_peaks)
+    link_charge = np.zeros(n_peaks, dtype=np.int64)
+    for charge in range(max_charge, 0, -1):
+        target = keys - ISOTOPE_SPACING / charge
+        left = np.searchsorted(keys, target - width, side="left")
+        right = np.searchsorted(keys, target + width, side="right")
+        # the most intense peak in the window is the one the isotope follows
+        linked = np.flatnonzero((right > left) & (link_charge == 0))
+        if len(linked) == 0:
+            continue
+        offsets = np.arange((right - left)[linked].max())
+        positions = left[linked, None] + offsets
+        inside = positions < right[linked, None]
+        window_intensity = np.where(inside, intensity[np.minimum(positions, n_peaks - 1)], -np.inf)
+        previous = left[linked] + np.argmax(window_intensity, axis=1)
+        isotope = intensity[linked] <= ISOTOPE_RATIO * intensity[previous]
+        parent[linked[isotope]] = previous[isotope]
+        link_charge[linked[isotope]] = charge
+
+    monoisotopic = parent == np.arange(n_peaks)
+    charges = np.zeros(n_peaks, dtype=np.int64)
+    direct = ~monoisotopic & monoisotopic[parent]
+    np.maximum.at(charges, parent[direct], link_charge[direct])
+    # follow every chain back to its monoisotopic peak
+    while True:
+        root = parent[parent]
+        if np.array_equal(root, parent):
+            break
+        parent = root
+    summed_intensity = np.bincount(parent, weights=intensity, minlength=n_peaks)
+    return monoisotopic, summed_intensity, charges
+
+# m/z of each peak as a singly charged ion, for peaks of a known charge above 1
+def reduce_charges(mz, charges):
+    return np.where(charges > 1, (mz - PROTON_MASS) * charges + PROTON_MASS, mz)
+
+class Preprocessing:
+    # MS2 peak preprocessing applied once when a run is loaded, over the concatenated peaks of all MS2 scans: with
+    # deisotope, isotope envelopes collapse into their monoisotopic peak (see deisotope); with charge_reduction,
+    # monoisotopic peaks of a multiply charged envelope also move to their singly charged m/z, which needs deisotoping
+    # to know the charge; with top_n, only the top_n most intense peaks of every window m/z wide are kept. Spectra
+    # are scored against singly charged fragments only once their peaks are charge reduced.
+    def __init__(self, top_n=None, window=WINDOW, deisotope=False, charge_reduction=False, tolerance=20, max_charge=MAX_CHARGE):
+        self.top_n = top_n
+        self.window = window
+        self.deisotope = deisotope or charge_reduction
+        self.charge_reduction = charge_reduction
+        self.tolerance = tolerance
+        self.max_charge = max_charge
+        self.peaks_before = 0
+        self.peaks_after = 0
+
+    @property
+    def enabled(self):
+        return self.top_n is not None or self.deisotope
+
+    # settings that change the preprocessed peaks, e.g. for checkpoint fingerprints
+    def parameters(self):
+        if not self.enabled:
+            return None
+        return {"top_n": self.top_n, "window": self.window if self.top_n is not None else None, "deisotope": self.deisotope,
+                "charge_reduction": self.charge_reduction, "tolerance": self.tolerance if self.deisotope else None,
+                "max_charge": self.max_charge if self.deisotope else None}
+
+    def report(self):
+        return f"{self.peaks_before} MS2 peaks reduced to {self.peaks_after}"
+
+    # (m/z, intensity, ordinals) of the preprocessed peaks of a peak store, sorted by scan, then m/z
+    def apply(self, store: PeakStore):
+        mz, intensity, ordinals = store.mz, store.intensity.astype(np.float64), store.ordinals
+        if self.deisotope:
+            monoisotopic, summed_intensity, charges = deisotope(mz, intensity, ordinals, self.tolerance, self.max_charge)
+            mz, intensity, ordinals, charges = mz[monoisotopic], summed_intensity[monoisotopic], ordinals[monoisotopic], charges[monoisotopic]
+            if self.charge_reduction:
+                mz = reduce_charges(mz, charges)
+                order = np.lexsort((mz, ordinals))
+                mz, intensity, ordinals = mz[order], intensity[order], ordinals[order]
+        if self.top_n is not None:
+            keep = top_n_per_window(mz, intensity, ordinals, self.top_n, self.window)
+            mz, intensity, ordinals = mz[keep], intensity[keep], ordinals[keep]
+        self.peaks_before += len(store.mz)
+        self.peaks_after += len(mz)
+        return mz, intensity.astype(store.intensity.dtype), ordinals
+
+    # Replaces the peak arrays of scans with their preprocessed peaks, and returns their peak store. The store keeps the
+    # noise model of the raw peaks, since preprocessing removes the low peaks it is estimated from.
+    def apply_to_scans(self, scans):
+        raw_store = PeakStore.from_scans(scans)
+        mz, intensity, ordinals = self.apply(raw_store)
+        boundaries = np.searchsorted(ordinals, np.arange(1, len(scans)))
+        for scan, mz_array, intensity_array in zip(scans, np.split(mz, boundaries), np.split(intensity, boundaries)):
+            scan.mz_array = mz_array
+            scan.intensity_array = intensity_array
+        store = PeakStore.from_scans(scans)
+        store.noise, store.noise_mad, store.signal, store.sn_ratio = raw_store.noise, raw_store.noise_mad, raw_store.signal, raw_store.sn_ratio
+        return store
@@ -0,0 +1,78 @@
+from spectrum_reader import read_spectra
+from tic_reader import spectrum_tic
+import numpy as np
+import re
+
+# retention time in seconds; pyteomics keeps the unit of scan start time, which is minutes unless the file says seconds
+def to_seconds(rt):
+    return float(rt) if getattr(rt, "unit_info", "minute") == "second" else float(rt) * 60
+
+# Scan headers of every spectrum as numpy columns, read in one pass without decoding peak arrays. SIM scans get the
+# isolation window from their filter string and MS2 scans from the precursor isolation window (falling back to the
+# selected ion m/z); full MS1 scans have NaN window bounds. Precursors without a charge state have charge 0. With
+# ms1_peaks, the peak arrays of full MS1 scans are decoded too and returned as (m/z, intensity) pairs under "ms1 peaks".
+def read_scan_headers(source, scan_range=None, rt_range=None, ms1_peaks=False):
+    scan_numbers = []
+    ms_levels = []
+    rts = []
+    iits = []
+    tics = []
+    is_sim = []
+    window_low = []
+    window_high = []
+    precursor_mzs = []
+    precursor_charges = []
+    peaks = []
+
+    for spectrum in read_spectra(source, scan_range, rt_range, decode_binary=False):
+        try:
+            scan = spectrum["scanList"]["scan"][0]
+        except (KeyError, IndexError):
+            scan = {}
+        filter_string = scan.get("filter string", "")
+        ms_level = int(spectrum.get("ms level", 1))
+        sim = ms_level == 1 and "SIM" in filter_string.upper()
+
+        low, high, precursor_mz, precursor_charge = np.nan, np.nan, np.nan, 0
+        if sim:
+            match = re.search(r"\[(\d+\.?\d*)-(\d+\.?\d*)\]", filter_string)
+            if match:
+                low, high = float(match.group(1)), float(match.group(2))
+        elif ms_level > 1 and "precursorList" in spectrum:
+            precursor = spectrum["precursorList"]["precursor"][0]
+            try:
+                selected_ion = precursor["selectedIonList"]["selectedIon"][0]
+                precursor_mz = float(selected_ion["selected ion m/z"])
+                precursor_charge = int(selected_ion.get("charge state", 0))
+            except (KeyError, IndexError):
+                pass
+            isolation_window = precursor.get("isolationWindow", {})
+            target = float(isolation_window.get("isolation window target m/z", precursor_mz))
+            low = target - float(isolation_window.get("isolation window lower offset", 0))
+            high = target + float(isolation_window.get("isolation window upper offset", 0))
+
+        scan_numbers.append(int(spectrum["id"].split("=")[-1]))
+        ms_levels.append(ms_level)
+        rts.append(to_seconds(scan["scan start time"]) if "scan start time" in scan else np.nan)
+        iits.append(scan.get("ion injection time", np.nan))
+        tics.append(spectrum_tic(spectrum))
+        is_sim.append(sim)
+        window_low.append(low)
+        window_high.append(high)
+        precursor_mzs.append(precursor_mz)
+        precursor_charges.append(precursor_charge)
+        if ms1_peaks and ms_level == 1 and not sim:
+            arrays = [spectrum[name] for name in ("m/z array", "intensity array")]
+            peaks.append(tuple(np.asarray(array.decode() if hasattr(array, "decode") else array, dtype=np.float64) for array in arrays))
+
+    return {"scan number": np.array(scan_numbers, dtype=np.int64),
+            "ms level": np.array(ms_levels, dtype=np.int64),
+            "retention time": np.array(rts, dtype=np.float64),
+            "ion injection time": np.array(iits, dtype=np.float64),
+            "tic": np.array(tics, dtype=np.float64),
+            "sim": np.array(is_sim, dtype=bool),
+            "window low": np.array(window_low, dtype=np.float64),
+            "window high": np.array(window_high, dtype=np.float64),
+            "precursor mz": np.array(precursor_mzs, dtype=np.float64),
+            "precursor charge": np.array(precursor_charges, dtype=np.int64),
+            **({"ms1 peaks": peaks} if ms1_peaks else {})}
@@ -0,0 +1,64 @@
+from pyteomics import mzml
+from bisect import bisect_left, bisect_right
+from contextlib import nullcontext
+import gzip
+import re
+from centroid import centroid_spectrum
+
+# scan number from a spectrum id ("... scan=1484"), falling back to the 1-based position in the file
+def scan_number_from_id(spectrum_id, position):
+    match = re.search(r"scan=(\d+)", spectrum_id)
+    return int(match.group(1)) if match else position + 1
+
+# scan start time in minutes; pyteomics keeps the unit of the file, which is minutes unless the file says seconds
+def _scan_start_time(reader, position):
+    rt = reader.get_by_index(position)["scanList"]["scan"][0]["scan start time"]
+    return float(rt) / 60 if getattr(rt, "unit_info", "minute") == "second" else float(rt)
+
+# Positions of the spectra within an inclusive scan number range and/or retention time range in minutes. Scan numbers
+# come from the offset index alone; retention times are found by binary search, decoding only O(log n) spectra.
+def spectrum_positions(reader, scan_range=None, rt_range=None):
+    spectrum_ids = list(reader.index["spectrum"].keys())
+    start, end = 0, len(spectrum_ids)
+
+    if scan_range:
+        scan_numbers = [scan_number_from_id(spectrum_id, i) for i, spectrum_id in enumerate(spectrum_ids)]
+        start = bisect_left(scan_numbers, scan_range[0])
+        end = bisect_right(scan_numbers, scan_range[1])
+
+    if rt_range and start < end:
+        positions = range(start, end)
+        first = bisect_left(positions, rt_range[0], key=lambda i: _scan_start_time(reader, i))
+        last = bisect_right(positions, rt_range[1], key=lambda i: _scan_start_time(reader, i))
+        start, end = positions.start + first, positions.start + last
+
+    return range(start, end)
+
+# gzip-compressed mzML paths are opened as binary streams; other paths and open file objects are passed through
+def open_source(source):
+    if isinstance(source, str) and source.endswith(".gz"):
+        return gzip.open(source, "rb")
+    return nullcontext(source)
+
+# Iterates the spectra of an mzML file (path, .gz path or open binary file object). Without ranges, the file is read
+# sequentially; with a scan number and/or retention time range (in minutes, whatever the unit of the file), the reader
+# seeks to the first spectrum in range through the offset index and stops after the last one. With decode_binary=False,
+# peak arrays are left encoded and can be decoded on demand with their decode() method. With centroid, spectra whose
+# CV terms mark them as profile mode are centroided as they are read (see centroid_spectrum); centroided spectra pass
+# through unchanged.
+def read_spectra(source, scan_range=None, rt_range=None, decode_binary=True, centroid=False):
+    for spectrum in _read_spectra(source, scan_range, rt_range, decode_binary):
+        if centroid and decode_binary:
+            centroid_spectrum(spectrum)
+        yield spectrum
+
+def _read_spectra(source, scan_range=None, rt_range=None, decode_binary=True):
+    with open_source(source) as source:
+        if not scan_range and not rt_range:
+            with mzml.read(source, decode_binary=decode_binary) as reader:
+                yield from reader
+            return
+
+        with mzml.PreIndexedMzML(source, decode_binary=decode_binary) as reader:
+            for position in spectrum_positions(reader, scan_range, rt_range):
+                yield reader.get_by_index(position)
@@ -0,0 +1,80 @@
+import csv
+import numpy as np
+from table_writer import format_from_extension
+
+# types a column of text cells in one pass: int64 if every cell is an integer, float64 if every non-empty cell is a
+# number (empty cells become NaN), otherwise an array of strings. Empty columns stay strings.
+def parse_column(values):
+    text = np.array(values, dtype=str)
+    if len(text) == 0 or not np.char.strip(text).any():
+        return text.astype(object)
+    try:
+        return text.astype(np.int64)
+    except ValueError:
+        pass
+    try:
+        return np.where(np.char.strip(text) == "", "nan", text).astype(np.float64)
+    except ValueError:
+        return text.astype(object)
+
+# a column as strings, with empty cells, None and NaN as ""
+def as_text(values):
+    return np.array(["" if value is None or (isinstance(value, (float, np.floating)) and np.isnan(value)) else str(value) for value in values], dtype=object)
+
+def _read_delimited(input_file, delimiter, columns, text_columns):
+    with open(input_file, newline="") as file:
+        reader = csv.reader(file, delimiter=delimiter)
+        header = next(reader, [])
+        rows = [row for row in reader if any(row)]
+    selected = [i for i, name in enumerate(header) if columns is None or name in columns]
+    width = len(header)
+    rows = [row + [""] * (width - len(row)) if len(row) < width else row for row in rows]
+    cells = list(zip(*rows)) if rows else [()] * width
+    return {header[i]: np.array(cells[i], dtype=object) if header[i] in text_columns else parse_column(cells[i]) for i in selected}
+
+def _read_xlsx(input_file, columns, text_columns):
+    from openpyxl import load_workbook
+    workbook = load_workbook(input_file, read_only=True, data_only=True)
+    rows = workbook.active.iter_rows(values_only=True)
+    header = [str(name) if name is not None else "" for name in next(rows, ())]
+    rows = [row for row in rows if any(cell not in (None, "") for cell in row)]
+    workbook.close()
+    table = {}
+    for i, name in enumerate(header):
+        if columns is not None and name not in columns:
+            continue
+        cells = ["" if i >= len(row) or row[i] is None else row[i] for row in rows]
+        table[name] = as_text(cells) if name in text_columns else parse_column(cells)
+    return table
+
+def _read_arrow_table(table, text_columns):
+    import pyarrow as pa
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if name in text_columns and not pa.types.is_string(column.type):
+            column = column.cast(pa.string())
+        if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+            # text columns: nulls read back as empty strings, as from a CSV
+            columns[name] = column.fill_null("").to_numpy(zero_copy_only=False).astype(object)
+        else:
+            columns[name] = column.to_numpy(zero_copy_only=False)
+    return columns
+
+# Reads a table written by TableWriter (or any CSV/TSV/XLSX/Parquet/Arrow table with a header row) into a dict of
+# numpy columns. Parquet and Arrow columns keep their stored types and only the requested columns are read; text
+# tables are typed column by column, except for text_columns, which are always read as strings. Requested columns that
+# are not in the file are left out of the result.
+def read_table(input_file, columns=None, input_format=None, text_columns=()):
+    input_format = input_format or format_from_extension(input_file) or "csv"
+    if input_format == "parquet":
+        import pyarrow.parquet as pq
+        available = pq.read_schema(input_file).names
+        return _read_arrow_table(pq.read_table(input_file, columns=[name for name in available if columns is None or name in columns]), text_columns)
+    if input_format == "arrow":
+        import pyarrow as pa
+        with pa.memory_map(input_file) as source:
+            table = pa.ipc.open_file(source).read_all()
+        return _read_arrow_table(table.select([name for name in table.column_names if columns is None or name in columns]), text_columns)
+    if input_format == "xlsx":
+        return _read_xlsx(input_file, columns, text_columns)
+    return _read_delimited(input_file, "," if input_format == "csv" else "\t", columns, text_columns)
@@ -0,0 +1,147 @@
+import csv
+import os
+import numpy as np
+
+FORMATS = ("csv", "tsv", "xlsx", "parquet", "arrow")
+EXTENSIONS = {".csv": "csv", ".tsv": "tsv", ".txt": "tsv", ".xlsx": "xlsx", ".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow"}
+
+# output format implied by a file extension, or None if the extension is not a known table format
+def format_from_extension(output_file):
+    return EXTENSIONS.get(os.path.splitext(output_file)[1].lower())
+
+# output file for a file root and table format; an explicit format replaces a known table extension of the root
+def output_path(output_file, output_format=None, suffix=""):
+    root, extension = os.path.splitext(output_file)
+    if extension.lower() not in EXTENSIONS:
+        root, extension = output_file, ""
+    output_format = output_format or EXTENSIONS.get(extension.lower(), "csv")
+    return f"{root}{suffix}.{output_format}"
+
+# xlsx cell value: NaN becomes an empty cell and numpy scalars become Python scalars
+def _cell(value):
+    if isinstance(value, (float, np.floating)) and np.isnan(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+# csv/tsv cell value: None and NaN become empty cells, as in xlsx
+def _text_cell(value):
+    if value is None or (isinstance(value, (float, np.floating)) and np.isnan(value)):
+        return ""
+    return value
+
+class TableWriter:
+    # Streams a table to CSV/TSV, write-only XLSX, Parquet or Arrow IPC. Rows and column chunks are buffered as columns
+    # and flushed every row_group_size rows (one Parquet row group or Arrow record batch per flush), so the full table
+    # never has to be held in memory. Columnar formats keep typed columns; types are inferred from the first chunk
+    # unless given as a {column: pyarrow type or type name} dict.
+    def __init__(self, output_file, fieldnames, output_format=None, row_group_size=10000, types=None):
+        self.output_file = output_file
+        self.fieldnames = list(fieldnames)
+        self.output_format = output_format or format_from_extension(output_file) or "csv"
+        if self.output_format not in FORMATS:
+            raise ValueError(f"Unknown output format '{self.output_format}'. Choose from {', '.join(FORMATS)}")
+        self.row_group_size = row_group_size
+        self.types = types or {}
+        self.rows_written = 0
+        self._buffer = {name: [] for name in self.fieldnames}
+        self._buffered = 0
+        self._writer = None
+        self._file = None
+        self._schema = None
+
+        if self.output_format in ("csv", "tsv"):
+            self._file = open(output_file, "w", newline="")
+            self._writer = csv.writer(self._file, delimiter="," if self.output_format == "csv" else "\t")
+            self._writer.writerow(self.fieldnames)
+        elif self.output_format == "xlsx":
+            from openpyxl import Workbook
+            self._workbook = Workbook(write_only=True)
+            self._writer = self._workbook.create_sheet()
+            self._writer.append(self.fieldnames)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # appends one row given as a dict; missing columns are left empty and extra keys are ignored
+    def writerow(self, row):
+        for name in self.fieldnames:
+            self._buffer[name].append(row.get(name))
+        self._buffered += 1
+        if self._buffered >= self.row_group_size:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    # appends a chunk of rows given as equal-length columns (lists or numpy arrays); missing columns are left empty
+    def write_columns(self, columns):
+        n_rows = len(next(iter(columns.values()))) if columns else 0
+        if self._buffered:
+            self.flush()
+        for start in range(0, n_rows, self.row_group_size):
+            end = min(start + self.row_group_size, n_rows)
+            self._write_chunk({name: columns[name][start:end] if name in columns else [None] * (end - start) for name in self.fieldnames}, end - start)
+
+    def flush(self):
+        if self._buffered:
+            self._write_chunk(self._buffer, self._buffered)
+            self._buffer = {name: [] for name in self.fieldnames}
+            self._buffered = 0
+
+    def _write_chunk(self, columns, n_rows):
+        if self.output_format in ("csv", "tsv"):
+            self._writer.writerows(zip(*[[_text_cell(cell) for cell in columns[name]] for name in self.fieldnames]))
+        elif self.output_format == "xlsx":
+            for row in zip(*[[_cell(cell) for cell in columns[name]] for name in self.fieldnames]):
+                self._writer.append(row)
+        else:
+            self._write_batch(columns)
+        self.rows_written += n_rows
+
+    def _write_batch(self, columns):
+        import pyarrow as pa
+        if self._schema is None:
+            fields = []
+            for name in self.fieldnames:
+                if name in self.types:
+                    fields.append(pa.field(name, self.types[name]))
+                    continue
+                inferred = pa.array(columns[name] if isinstance(columns[name], np.ndarray) else list(columns[name]), from_pandas=True).type
+                fields.append(pa.field(name, pa.string() if pa.types.is_null(inferred) else inferred))
+            self._schema = pa.schema(fields)
+            if self.output_format == "parquet":
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.output_file, self._schema)
+            else:
+                self._file = pa.OSFile(self.output_file, "wb")
+                self._writer = pa.ipc.new_file(self._file, self._schema)
+
+        arrays = [pa.array(columns[name] if isinstance(columns[name], np.ndarray) else list(columns[name]), type=field.type, from_pandas=True)
+                  for name, field in zip(self.fieldnames, self._schema)]
+        self._writer.write_batch(pa.record_batch(arrays, schema=self._schema))
+
+    def close(self):
+        self.flush()
+        if self.output_format in ("csv", "tsv"):
+            self._file.close()
+        elif self.output_format == "xlsx":
+            self._workbook.save(self.output_file)
+        else:
+            if self._writer is None:
+                # empty table: write the header-only schema
+                self._write_batch({name: [] for name in self.fieldnames})
+            self._writer.close()
+            if self._file is not None:
+                self._file.close()
+
+# writes a whole table given as columns in one call
+def write_table(output_file, columns, output_format=None, row_group_size=10000, types=None, fieldnames=None):
+    with TableWriter(output_file, fieldnames or list(columns.keys()), output_format, row_group_size, types) as writer:
+        writer.write_columns(columns)
+    return writer.rows_written
@@ -0,0 +1,38 @@
+from spectrum_reader import read_spectra
+import numpy as np
+
+# total ion current of a spectrum: the value stored in the file, or the sum of the intensity array when there is none.
+# Works for spectra read with or without decode_binary.
+def spectrum_tic(spectrum):
+    if "total ion current" in spectrum:
+        return float(spectrum["total ion current"])
+    intensity_array = spectrum.get("intensity array")
+    if intensity_array is None:
+        return 0.0
+    if hasattr(intensity_array, "decode"):
+        intensity_array = intensity_array.decode()
+    return float(np.sum(intensity_array, dtype=np.float64))
+
+# Per-spectrum TIC, scan time and injection time of all spectra of one MS level, read from the spectrum headers without
+# decoding peak arrays. Only spectra that do not store their TIC are decoded and summed.
+def read_spectrum_tics(source, ms_level=1, scan_range=None, rt_range=None):
+    scan_numbers = []
+    scan_times = []
+    injection_times = []
+    tics = []
+    for spectrum in read_spectra(source, scan_range, rt_range, decode_binary=False):
+        if spectrum.get("ms level", 1) != ms_level:
+            continue
+        try:
+            scan = spectrum["scanList"]["scan"][0]
+        except (KeyError, IndexError):
+            scan = {}
+        scan_numbers.append(int(spectrum["id"].split("=")[-1]))
+        scan_times.append(scan.get("scan start time", np.nan))
+        injection_times.append(scan.get("ion injection time", np.nan))
+        tics.append(spectrum_tic(spectrum))
+
+    return {"scan number": np.array(scan_numbers, dtype=np.int64),
+            "scan time": np.array(scan_times, dtype=np.float64),
+            "ion injection time": np.array(injection_times, dtype=np.float64),
+            "tic": np.array(tics, dtype=np.float64)}
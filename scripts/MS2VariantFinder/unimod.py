@@ -45,6 +45,11 @@ def get_mod(name):
             return i
     return None
 
+# all Unimod entries
+def get_mods():
+    _load()
+    return _unimod_list
+
 # list of all mods that have masses within a specific mass delta tolerance
 def get_candidate_mods(mass_delta, tolerance, precursor_mz):
     _load()
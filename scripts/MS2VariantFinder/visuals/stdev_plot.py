@@ -2,18 +2,21 @@ from models import Scan
 from models import Peptide, Modification
 import numpy as np
 from constants import ppm
+from usi import sorted_peaks
 from matplotlib import pyplot as plt
 
-def initialize_peaks(spectrum: Scan, sequence: Peptide, modification: Modification, tolerance):
-    sorted_mz_array = np.sort(spectrum.mz_array)
-    sorted_intensity_array = spectrum.intensity_array[np.argsort(spectrum.mz_array)]
+# peaks: optional m/z-sorted (m/z, intensity) arrays of the spectrum, e.g. preprocessed; max_charge: highest fragment ion
+# charge to match (1 for charge-reduced peaks)
+def initialize_peaks(spectrum: Scan, sequence: Peptide, modification: Modification, tolerance, peaks=None, max_charge=2):
+    sorted_mz_array, sorted_intensity_array = sorted_peaks(spectrum, peaks)
     testing_sequence = Peptide(sequence.raw_sequence, [Modification(m.position, m.delta, m.name, m.is_labile) for m in sequence.modifications])
     testing_modification = Modification(modification.position, modification.delta, modification.name, modification.is_labile)
     testing_sequence.modifications.append(testing_modification)
-    fragments = testing_sequence.fragments()
+    fragments = testing_sequence.fragments(max_charge)
     all_ions = [ion for ion_list in fragments.values() for ion in ion_list]
     found_peaks = []
-    relevant_ions = []
+    expected_peaks = []
+    mod_coefficients = []
     intensities = []
 
     for ion in all_ions:
@@ -25,32 +28,54 @@ def initialize_peaks(spectrum: Scan, sequence: Peptide, modification: Modificati
             continue
         best_index = np.argmax(intensity_slice) # registers tallest peak in window
         found_peaks.append(mz_slice[best_index])
-        relevant_ions.append(ion)
+        expected_peaks.append(ion.mz)
+        # ion m/z shifts by delta / charge when the ion carries the tested modification
+        mod_coefficients.append(1 / ion.charge if any(mod is testing_modification for mod in ion.valid_mods) else 0.0)
         intensities.append(intensity_slice[best_index])
 
     found_peaks = np.array(found_peaks)
+    expected_peaks = np.array(expected_peaks)
+    mod_coefficients = np.array(mod_coefficients)
     intensities = np.array(intensities)
-    weights = intensities / intensities.sum()
-    return testing_sequence, testing_modification, found_peaks, relevant_ions, weights
+    weights = intensities / intensities.sum() if len(intensities) > 0 else intensities
+    return testing_sequence, testing_modification, found_peaks, expected_peaks, mod_coefficients, weights
 
-def calculate_stdev(spectrum: Scan, sequence: Peptide, modification: Modification, tolerance):
-    testing_sequence, testing_modification, found_peaks, relevant_ions, weights = initialize_peaks(spectrum, sequence, modification, tolerance)
+# weighted variance of the residuals, their covariance with the mod coefficients and the coefficients' variance.
+# The residual variance at delta offset d is then var_r - 2 * d * cov + d ** 2 * var_k.
+def residual_moments(found_peaks, expected_peaks, mod_coefficients, weights):
+    residuals = found_peaks - expected_peaks
+    centered_residuals = residuals - np.dot(weights, residuals)
+    centered_coefficients = mod_coefficients - np.dot(weights, mod_coefficients)
+    var_r = np.dot(weights, np.square(centered_residuals))
+    cov = np.dot(weights, centered_residuals * centered_coefficients)
+    var_k = np.dot(weights, np.square(centered_coefficients))
+    return var_r, cov, var_k
+
+def calculate_stdev(spectrum: Scan, sequence: Peptide, modification: Modification, tolerance, delta_range=0.002, step=0.000001, peaks=None, max_charge=2):
+    testing_sequence, testing_modification, found_peaks, expected_peaks, mod_coefficients, weights = initialize_peaks(spectrum, sequence, modification, tolerance, peaks, max_charge)
     if len(found_peaks) == 0:
         raise ValueError("no peaks found")
 
-    base_delta = testing_modification.delta
-    results = []
+    var_r, cov, var_k = residual_moments(found_peaks, expected_peaks, mod_coefficients, weights)
+    offsets = np.arange(-round(delta_range / step), round(delta_range / step)) * step
+    stdevs = np.sqrt(np.maximum(var_r - 2 * offsets * cov + np.square(offsets) * var_k, 0))
+
+    return list(zip(testing_modification.delta + offsets, stdevs))
 
-    for i in range(-2000, 2000):
-        testing_modification.delta = base_delta + i / 1000000
-        expected_ion_masses = np.array([ion.mz for ion in relevant_ions])
-        residuals = found_peaks - expected_ion_masses
-        weighted_mean = np.dot(weights, residuals)
-        weighted_variance = np.dot(weights, np.square(residuals - weighted_mean))
-        stdev = np.sqrt(weighted_variance)
-        results.append((base_delta + i / 1000000, stdev))
+# closed-form minimum of the residual stdev curve and the deltas where it crosses threshold * minimum
+def optimize_delta(spectrum: Scan, sequence: Peptide, modification: Modification, tolerance, threshold=1.1, peaks=None, max_charge=2):
+    testing_sequence, testing_modification, found_peaks, expected_peaks, mod_coefficients, weights = initialize_peaks(spectrum, sequence, modification, tolerance, peaks, max_charge)
+    if len(found_peaks) == 0:
+        raise ValueError("no peaks found")
 
-    return results
+    var_r, cov, var_k = residual_moments(found_peaks, expected_peaks, mod_coefficients, weights)
+    if var_k == 0:
+        raise ValueError("no matched fragment ions constrain the modification mass")
+    best_offset = cov / var_k
+    best_variance = max(var_r - cov ** 2 / var_k, 0)
+    half_width = np.sqrt((threshold ** 2 - 1) * best_variance / var_k)
+    best_delta = testing_modification.delta + best_offset
+    return best_delta, np.sqrt(best_variance), best_delta - half_width, best_delta + half_width, len(found_peaks)
 
 def plot_stdev(output, mass_delta, results, scan_number):
     plt.xlabel("Mass delta difference (Da)")
@@ -79,7 +104,7 @@ def plot_stdev(output, mass_delta, results, scan_number):
     plt.axhline(1.10 * best_stdev, linestyle="--")
     print("best stdev is " + str(best_stdev))
     plt.axvline(0, linestyle="--", lw = 0.5)
-    plt.xlim(-0.002, 0.002)
+    plt.xlim(min(xlist), max(xlist))
     plt.title(f"Scan {scan_number}")
     plt.tight_layout()
-    plt.savefig(f"C:\\Users\\carol\\OneDrive - Bellevue School District\\2025-2026\\6-7 Internship\\python_testing\\ncORF-89\\temp_directory\\new_stdev_{output}1")
+    plt.savefig(output if output.endswith(".png") else f"{output}.png")
@@ -0,0 +1,256 @@
+# py RunQC.py --mzml_file example.mzML --output example_qc --format xlsx
+# py RunQC.py --mzml_file example.mzML.gz --output example_qc --format parquet --scan_range "1000,5000"
+
+import os
+import sys
+import argparse
+import timeit
+import gzip
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+
+sys.path.extend(os.path.join(os.path.dirname(os.path.abspath(__file__)), "MS2VariantFinder", directory) for directory in ("mzml_tools", "analysis", ""))
+from scan_headers import read_scan_headers
+from table_writer import write_table, format_from_extension, FORMATS
+from models import Peptide
+from offset_histogram import precursor_offsets, ms1_feature_offsets, offset_report, annotation_masses
+
+def open_mzml_file(filename):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rb")
+    else:
+        return open(filename, "rb")
+
+# time from each scan to the next scan of the same group (NaN for the last scan of every group and for scans with a
+# negative group id)
+def group_cycle_times(rt, groups):
+    cycle_times = np.full(len(rt), np.nan)
+    order = np.lexsort((rt, groups))
+    order = order[groups[order] >= 0]
+    same_group = groups[order][1:] == groups[order][:-1]
+    cycle_times[order[:-1][same_group]] = np.diff(rt[order])[same_group]
+    return cycle_times
+
+# per-scan QC columns: scan type (MS1, SIM or MS<n>), isolation window label, full MS1 cycle time and the cycle time of
+# every SIM and MSn isolation window
+def compute_scan_qc(headers):
+    ms_level = headers["ms level"]
+    sim = headers["sim"]
+    full_ms1 = (ms_level == 1) & ~sim
+
+    scan_type = np.where(sim, "SIM", np.char.add("MS", ms_level.astype(str)))
+    # MSn windows are labelled by their isolation target so repeated triggers of one precursor share a window
+    center = (headers["window low"] + headers["window high"]) / 2
+    window = np.full(len(ms_level), "", dtype=object)
+    has_window = ~full_ms1 & ~np.isnan(center)
+    window[has_window & sim] = [f"{low:.4f}-{high:.4f}" for low, high in zip(headers["window low"][has_window & sim], headers["window high"][has_window & sim])]
+    window[has_window & ~sim] = [f"{mz:.2f}" for mz in center[has_window & ~sim]]
+
+    _, window_ids = np.unique(np.char.add(scan_type.astype(str), window.astype(str)), return_inverse=True)
+    window_ids = np.where(has_window, window_ids, -1)
+
+    return {"scan number": headers["scan number"],
+            "scan type": scan_type,
+            "window": window,
+            "retention time (s)": headers["retention time"],
+            "ion injection time (ms)": headers["ion injection time"],
+            "tic": headers["tic"],
+            "full cycle time (s)": group_cycle_times(headers["retention time"], np.where(full_ms1, 0, -1)),
+            "window cycle time (s)": group_cycle_times(headers["retention time"], window_ids)}
+
+# one row per SIM/MSn isolation window: scan count and cycle time statistics
+def summarize_windows(scan_qc):
+    has_window = scan_qc["window"] != ""
+    scan_type = scan_qc["scan type"][has_window]
+    window = scan_qc["window"][has_window].astype(str)
+    cycle_times = scan_qc["window cycle time (s)"][has_window]
+    keys, window_ids, counts = np.unique(np.char.add(np.char.add(scan_type.astype(str), "|"), window), return_inverse=True, return_counts=True)
+
+    valid = ~np.isnan(cycle_times)
+    cycle_counts = np.bincount(window_ids[valid], minlength=len(keys))
+    cycle_sums = np.bincount(window_ids[valid], weights=cycle_times[valid], minlength=len(keys))
+    mean_cycle = np.divide(cycle_sums, cycle_counts, out=np.full(len(keys), np.nan), where=cycle_counts > 0)
+    median_cycle = np.array([np.median(cycle_times[valid & (window_ids == i)]) if cycle_counts[i] else np.nan for i in range(len(keys))])
+
+    return {"scan type": [key.split("|")[0] for key in keys],
+            "window": [key.split("|")[1] for key in keys],
+            "scans": counts,
+            "mean cycle time (s)": mean_cycle,
+            "median cycle time (s)": median_cycle}
+
+# one row per scan type: scan count, acquisition rate, injection time distribution and cycle time
+def summarize_scan_types(scan_qc):
+    rt = scan_qc["retention time (s)"]
+    duration = np.nanmax(rt) - np.nanmin(rt) if len(rt) > 1 else np.nan
+    rows = {"scan type": [], "scans": [], "scans per second": [], "median tic": [],
+            "mean injection time (ms)": [], "median injection time (ms)": [], "5th percentile injection time (ms)": [],
+            "95th percentile injection time (ms)": [], "max injection time (ms)": [], "median cycle time (s)": []}
+
+    for scan_type in np.unique(scan_qc["scan type"]):
+        selected = scan_qc["scan type"] == scan_type
+        iit = scan_qc["ion injection time (ms)"][selected]
+        iit = iit[~np.isnan(iit)]
+        cycle_times = scan_qc["full cycle time (s)" if scan_type == "MS1" else "window cycle time (s)"][selected]
+        cycle_times = cycle_times[~np.isnan(cycle_times)]
+
+        rows["scan type"].append(scan_type)
+        rows["scans"].append(int(selected.sum()))
+        rows["scans per second"].append(selected.sum() / duration if duration > 0 else np.nan)
+        rows["median tic"].append(np.median(scan_qc["tic"][selected]))
+        rows["mean injection time (ms)"].append(np.mean(iit) if len(iit) else np.nan)
+        rows["median injection time (ms)"].append(np.median(iit) if len(iit) else np.nan)
+        rows["5th percentile injection time (ms)"].append(np.percentile(iit, 5) if len(iit) else np.nan)
+        rows["95th percentile injection time (ms)"].append(np.percentile(iit, 95) if len(iit) else np.nan)
+        rows["max injection time (ms)"].append(np.max(iit) if len(iit) else np.nan)
+        rows["median cycle time (s)"].append(np.median(cycle_times) if len(cycle_times) else np.nan)
+    return rows
+
+def plot_qc(scan_qc, window_summary, output_file, bin_seconds=60):
+    rt = scan_qc["retention time (s)"]
+    scan_types = np.unique(scan_qc["scan type"])
+    full_ms1 = scan_qc["scan type"] == "MS1"
+    cmap = plt.get_cmap("tab10")
+
+    with PdfPages(output_file) as pdf:
+        # page 1: TIC of full MS1 scans
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.plot(rt[full_ms1] / 60, scan_qc["tic"][full_ms1], linewidth=1)
+        ax.set_xlabel("Retention Time (min)")
+        ax.set_ylabel("TIC")
+        ax.set_title("Full MS1 Total Ion Chromatogram")
+        ax.grid(True)
+        pdf.savefig(fig)
+        plt.close(fig)
+
+        # page 2: full MS1 and per-window cycle times
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.plot(rt[full_ms1] / 60, scan_qc["full cycle time (s)"][full_ms1], linewidth=1, color="black", label="Full MS1")
+        for i, scan_type in enumerate(scan_types[scan_types != "MS1"]):
+            selected = scan_qc["scan type"] == scan_type
+            ax.scatter(rt[selected] / 60, scan_qc["window cycle time (s)"][selected], s=4, color=cmap(i % cmap.N), label=f"{scan_type} windows")
+        ax.set_xlabel("Retention Time (min)")
+        ax.set_ylabel("Cycle Time (s)")
+        ax.set_title("Cycle Time")
+        ax.legend(loc="upper left")
+        ax.grid(True)
+        pdf.savefig(fig)
+        plt.close(fig)
+
+        # page 3: injection time distribution per scan type
+        fig, ax = plt.subplots(figsize=(10, 6))
+        for i, scan_type in enumerate(scan_types):
+            iit = scan_qc["ion injection time (ms)"][scan_qc["scan type"] == scan_type]
+            iit = iit[~np.isnan(iit)]
+            if len(iit):
+                ax.hist(iit, bins=50, histtype="step", linewidth=1.5, color=cmap(i % cmap.N), label=scan_type)
+        ax.set_xlabel("Ion Injection Time (ms)")
+        ax.set_ylabel("Scans")
+        ax.set_title("Injection Time Distribution")
+        ax.legend(loc="upper right")
+        ax.grid(True)
+        pdf.savefig(fig)
+        plt.close(fig)
+
+        # page 4: acquisition rate over the run
+        fig, ax = plt.subplots(figsize=(10, 6))
+        valid = ~np.isnan(rt)
+        if np.any(valid):
+            n_bins = int(np.floor((np.nanmax(rt) - np.nanmin(rt)) / bin_seconds)) + 1
+            for i, scan_type in enumerate(scan_types):
+                selected = valid & (scan_qc["scan type"] == scan_type)
+                bins = np.floor((rt[selected] - np.nanmin(rt)) / bin_seconds).astype(np.int64)
+                rate = np.bincount(bins, minlength=n_bins) / bin_seconds
+                ax.plot((np.nanmin(rt) + (np.arange(n_bins) + 0.5) * bin_seconds) / 60, rate, color=cmap(i % cmap.N), label=scan_type)
+        ax.set_xlabel("Retention Time (min)")
+        ax.set_ylabel("Scans per Second")
+        ax.set_title(f"Acquisition Rate ({bin_seconds} s bins)")
+        ax.legend(loc="upper left")
+        ax.grid(True)
+        pdf.savefig(fig)
+        plt.close(fig)
+
+        # page 5: MS2 scans per precursor window, most sampled first
+        ms2 = np.array([scan_type != "MS1" and scan_type != "SIM" for scan_type in window_summary["scan type"]], dtype=bool)
+        if np.any(ms2):
+            counts = np.asarray(window_summary["scans"])[ms2]
+            labels = np.asarray(window_summary["window"])[ms2]
+            top = np.argsort(-counts, kind="stable")[:40]
+            fig, ax = plt.subplots(figsize=(10, 6))
+            ax.bar(np.arange(len(top)), counts[top])
+            ax.set_xticks(np.arange(len(top)))
+            ax.set_xticklabels(labels[top], rotation=90, fontsize=7)
+            ax.set_xlabel("Precursor Window (m/z)")
+            ax.set_ylabel("MS2 Scans")
+            ax.set_title(f"MS2 Scans per Precursor Window (top {len(top)} of {len(counts)})")
+            fig.tight_layout()
+            pdf.savefig(fig)
+            plt.close(fig)
+
+    print(f"INFO: Saved QC plots to {output_file}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run QC from one pass over the scan headers of an mzML file: cycle times, TIC, injection times and acquisition rates")
+    parser.add_argument("--mzml_file", required=True, help="Input mzML file (.mzML or .mzML.gz)")
+    parser.add_argument("--output", required=True, help="Output file root; writes [output]_scans, [output]_windows, [output]_summary and [output].pdf")
+    parser.add_argument("--format", default=None, choices=FORMATS, help="Format of the output tables (default: from the --output extension, else csv)")
+    parser.add_argument("--row_group_size", type=int, default=10000, help="Rows written to the output tables at a time")
+    parser.add_argument("--scan_range", default=None, help="Only read scans in this inclusive range, e.g. \"1420,1520\"")
+    parser.add_argument("--rt_range", default=None, help="Only read scans in this inclusive retention time range in minutes, e.g. \"20.5,31\"")
+    parser.add_argument("--sequence", default=None, help="Sequence of the target peptide; writes [output]_offsets, a ranked report of the precursor mass offsets from the target annotated with Unimod and synthesis errors")
+    parser.add_argument("--offset_tolerance", type=float, default=10, help="Tolerance in ppm of the target mass to annotate an offset peak")
+    parser.add_argument("--min_offset_count", type=int, default=3, help="Minimum number of offsets in a reported offset peak")
+    parser.add_argument("--ms1_features", action="store_true", help="With --sequence, also report the offsets of MS1 peaks at charges 1-4 (decodes the MS1 peak arrays)")
+    args = parser.parse_args()
+
+    if not os.path.isfile(args.mzml_file):
+        print(f"ERROR: File '{args.mzml_file}' not found or not a file")
+        return
+
+    scan_range = tuple(map(int, args.scan_range.split(","))) if args.scan_range else None
+    rt_range = tuple(map(float, args.rt_range.split(","))) if args.rt_range else None
+
+    start = timeit.default_timer()
+    with open_mzml_file(args.mzml_file) as infile:
+        headers = read_scan_headers(infile, scan_range, rt_range, ms1_peaks=args.sequence is not None and args.ms1_features)
+    if len(headers["scan number"]) == 0:
+        print(f"ERROR: No scans found in {args.mzml_file} within the selected range")
+        return
+    print(f"INFO: Read {len(headers['scan number'])} scan headers from {args.mzml_file}")
+
+    scan_qc = compute_scan_qc(headers)
+    window_summary = summarize_windows(scan_qc)
+    scan_type_summary = summarize_scan_types(scan_qc)
+
+    output_format = args.format or format_from_extension(args.output) or "csv"
+    output_root = os.path.splitext(args.output)[0] if args.output.endswith((".csv", ".tsv", ".parquet", ".arrow", ".xlsx", ".pdf")) else args.output
+    for table, suffix in ((scan_qc, "scans"), (window_summary, "windows"), (scan_type_summary, "summary")):
+        output_file = f"{output_root}_{suffix}.{output_format}"
+        rows_written = write_table(output_file, table, output_format, args.row_group_size)
+        print(f"INFO: Wrote {rows_written} rows to {output_file}")
+    plot_qc(scan_qc, window_summary, f"{output_root}.pdf")
+
+    if args.sequence:
+        sequence = Peptide.from_string(args.sequence)
+        target_mass = sequence.mass(0)
+        annotations = annotation_masses(sequence)
+        has_precursor = (headers["ms level"] > 1) & (headers["precursor charge"] > 0)
+        offsets = precursor_offsets(headers["precursor mz"][has_precursor], headers["precursor charge"][has_precursor], target_mass)
+        reports = [offset_report(offsets, sequence, "MS2", args.offset_tolerance, min_count=args.min_offset_count, annotations=annotations)]
+        if args.ms1_features:
+            reports.append(offset_report(ms1_feature_offsets(headers["ms1 peaks"], target_mass), sequence, "MS1", args.offset_tolerance,
+                                         min_count=args.min_offset_count, annotations=annotations))
+        offset_table = {name: np.concatenate([report[name] for report in reports]) for name in reports[0]}
+        output_file = f"{output_root}_offsets.{output_format}"
+        rows_written = write_table(output_file, offset_table, output_format, args.row_group_size)
+        print(f"INFO: Wrote {rows_written} offset peaks to {output_file}")
+        for offset, count, annotation in list(zip(reports[0]["offset (Da)"], reports[0]["count"], reports[0]["annotation"]))[:5]:
+            print(f"INFO: MS2 precursor offset {offset:+.4f} Da: {count} scans{f' ({annotation})' if annotation else ''}")
+
+    for scan_type, scans, rate, iit, cycle_time in zip(scan_type_summary["scan type"], scan_type_summary["scans"], scan_type_summary["scans per second"],
+                                                       scan_type_summary["median injection time (ms)"], scan_type_summary["median cycle time (s)"]):
+        print(f"INFO: {scan_type}: {scans} scans, {rate:.2f} scans/s, median injection time {iit:.2f} ms, median cycle time {cycle_time:.3f} s")
+    print(f"INFO: Elapsed time: {timeit.default_timer() - start:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,25 @@
 # Content largely adapted from generate_ms2_table.py.
 
 import os
+import sys
 import argparse
 import os.path
 import timeit
 
 import pandas as pd
-import csv
 import numpy as np
 import matplotlib.pyplot as plt
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "MS2VariantFinder", "mzml_tools"))
+from table_reader import read_table
+from table_writer import EXTENSIONS
+
 class MS2Plot:
     def __init__(self):
         parser = argparse.ArgumentParser(
             prog="PlotMS2",
-            description="Plots original and zoomed MS2 spectra from annotated CSV file: total ion current (TIC) vs. scan number.")
-        parser.add_argument("--file", help="Name of CSV file")
+            description="Plots original and zoomed MS2 spectra from annotated MS2 table: total ion current (TIC) vs. scan number.")
+        parser.add_argument("--file", help="Name of MS2 table (accepts CSV, TSV, XLSX, Parquet, Arrow files)")
         parser.add_argument("--xmin", help="Minimum x-axis (scan number) value for zoomed graph. Exponential notation accepted (ex. 1e8)")
         parser.add_argument("--xmax", help="Maximum x-axis (scan number) value for zoomed graph. Exponential notation accepted (ex. 1e8)")
         parser.add_argument("--ymin", help="Minimum y-axis (TIC) value. Exponential notation accepted (ex. 1e8)")
@@ -41,32 +45,28 @@ class MS2Plot:
         self.xmax = float(args.xmax)
         self.ymin = float(args.ymin)
         self.ymax = float(args.ymax)
-        self.spectra = []
+        self.spectra = {}
+        self.columns = ['scan number', 'scan time', 'total ion current', 'precursor m/z', 'confidence', 'modification', 'usi', 'comments']
+        self.text_columns = ['confidence', 'modification', 'usi', 'comments']
 
+    # loads only the plotted columns; Parquet and Arrow tables are read column-wise with their stored types
     def read_file(self):
         ext = os.path.splitext(self.file)[1].lower()
-        d = ","
-
-        if ext == '.csv':
-            d = ','
-        else:
+        if ext not in EXTENSIONS:
             print(f"ERROR: Unsupported file extension '{ext}'")
+            return
+
+        table = read_table(self.file, columns=self.columns, text_columns=self.text_columns)
+        missing = [name for name in self.columns if name not in table]
+        if missing:
+            print(f"ERROR: Column(s) {', '.join(missing)} not found in '{self.file}'")
+            return
 
-        with open(self.file, newline = '') as file:
-            reader = csv.DictReader(file, delimiter = d)
-            for row in reader:
-                if not any(row.values()):
-                    continue
-
-                annotation_data = {'scan number' : int(row["scan number"]),
-                                   'scan time' : float(row["scan time"]),
-                                   'total ion current' : float(row["total ion current"]),
-                                   'precursor m/z' : float(row["precursor m/z"]),
-                                   "confidence" : row["confidence"],
-                                   "modification" : row["modification"],
-                                   "usi" : row["usi"],
-                                   "comments" : row["comments"]}
-                self.spectra.append(annotation_data)
+        self.spectra = {'scan number' : table['scan number'].astype(np.int64),
+                        'scan time' : table['scan time'].astype(np.float64),
+                        'total ion current' : table['total ion current'].astype(np.float64),
+                        'precursor m/z' : table['precursor m/z'].astype(np.float64)}
+        self.spectra.update({name: table[name] for name in self.text_columns})
 
     def plot_tic(self):
         df = pd.DataFrame(self.spectra)
@@ -92,13 +92,13 @@ class MS2Plot:
         labels = []
         for i in tallest.index:
             x = tallest['scan number'][i]
-            if self.spectra[i]["modification"] != "":
-                label = str(x) + "\n" + self.spectra[i]["modification"]
-                labels.append(str(x) + ": " + self.spectra[i]["modification"])
+            if df["modification"][i] != "":
+                label = str(x) + "\n" + df["modification"][i]
+                labels.append(str(x) + ": " + df["modification"][i])
             else:
                 label = str(x)
             if tallest['total ion current'][i] >= self.ymax:
-                if self.spectra[i]["modification"] != "":
+                if df["modification"][i] != "":
                     y = 0.9*self.ymax
                 else:
                     y = self.ymax
@@ -113,7 +113,7 @@ class MS2Plot:
             x = tallest['scan number'][i]
             label = str(x)
             if tallest['total ion current'][i] >= self.ymax:
-                if self.spectra[i]["modification"] != "":
+                if df["modification"][i] != "":
                     y = 0.9*self.ymax
                 else:
                     y = self.ymax
@@ -129,7 +129,7 @@ class MS2Plot:
 
 def main():
     ms2_plot = MS2Plot()
-    print(f"INFO: Reading CSV File {ms2_plot.file}")
+    print(f"INFO: Reading MS2 table {ms2_plot.file}")
     ms2_plot.read_file()
     print(f"INFO: Plotting to plot.png and plot_zoomed.png")
     ms2_plot.plot_tic()
@@ -0,0 +1,49 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# the scripts import their modules flat, so the tests put the same directories on the path as the CLIs do
+SCRIPTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+MS2_VARIANT_FINDER = os.path.join(SCRIPTS, "MS2VariantFinder")
+sys.path[0:0] = [os.path.join(MS2_VARIANT_FINDER, directory) for directory in ("analysis", "visuals", "mzml_tools")] + [MS2_VARIANT_FINDER, SCRIPTS]
+
+from models import Scan, MSRun
+
+def ms1_scan(scan_number, mz=(400.0,), intensity=(1000.0,), rt=None):
+    mz = np.asarray(mz, dtype=np.float64)
+    intensity = np.asarray(intensity, dtype=np.float32)
+    return Scan(scan_number, "MS1", 1, None, mz, intensity, scan_number / 100 if rt is None else rt, 10.0, float(intensity.sum()))
+
+def ms2_scan(scan_number, mz, intensity, precursor_mz=500.0, precursor_charge=2, tic=None, last_ms1_scan=1):
+    mz = np.asarray(mz, dtype=np.float64)
+    intensity = np.asarray(intensity, dtype=np.float32)
+    order = np.argsort(mz)
+    return Scan(scan_number, "MS2", 2, (precursor_mz - 1, precursor_mz + 1), mz[order], intensity[order], scan_number / 100, 20.0,
+                float(intensity.sum()) if tic is None else tic, precursor_mz, precursor_charge, last_ms1_scan)
+
+# run of hand-made scans; without MS1 scans, one MS1 scan with a single peak comes first
+@pytest.fixture
+def make_run():
+    def make(ms2_scans=(), ms1_scans=None):
+        return MSRun(list(ms1_scans if ms1_scans is not None else [ms1_scan(1)]) + list(ms2_scans), "DDA")
+    return make
+
+# a few Unimod entries in place of the downloaded ontology
+UNIMOD_ENTRIES = [
+    {"name": "Cation:Al[III]", "delta_mono_mass": "23.958063", "locales": ["D", "E", "C-term"]},
+    {"name": "Cation:Na", "delta_mono_mass": "21.981943", "locales": ["D", "E", "C-term"]},
+    {"name": "Oxidation", "delta_mono_mass": "15.994915", "locales": ["M", "W"]},
+]
+
+@pytest.fixture
+def offline_unimod(monkeypatch):
+    import unimod
+    number_index = {}
+    name_index = {}
+    for entry in UNIMOD_ENTRIES:
+        number_index.setdefault(int(float(entry["delta_mono_mass"])), []).append(entry)
+        name_index.setdefault(entry["name"][0], []).append(entry)
+    monkeypatch.setattr(unimod, "_unimod_list", UNIMOD_ENTRIES)
+    monkeypatch.setattr(unimod, "_number_index", number_index)
+    monkeypatch.setattr(unimod, "_name_index", name_index)
@@ -0,0 +1,51 @@
+import subprocess
+import sys
+import numpy as np
+import pytest
+from BatchRunner import run_name, collect_runs, concatenate_tables, expected_outputs, run_error, memory_limiter
+
+def test_run_name_drops_the_mzml_and_gzip_extensions():
+    assert run_name("data/run_01.mzML") == "run_01"
+    assert run_name("data/run_01.mzML.gz") == "run_01"
+    assert run_name("data/run_01.raw") == "run_01.raw"
+
+def test_collect_runs_from_a_manifest_resolves_paths_next_to_it(tmp_path):
+    manifest = tmp_path / "runs.csv"
+    manifest.write_text("mzml_file,args\na.mzML,--sequence PEPTIDEK\nb.mzML.gz,\n,--ignored\n")
+    runs = collect_runs([], str(manifest))
+    assert runs == [(str(tmp_path / "a.mzML"), ["--sequence", "PEPTIDEK"]), (str(tmp_path / "b.mzML.gz"), [])]
+
+def test_collect_runs_from_globs_lists_each_file_once(tmp_path):
+    for name in ("b.mzML", "a.mzML", "c.txt"):
+        (tmp_path / name).write_text("")
+    runs = collect_runs([str(tmp_path / "*.mzML"), str(tmp_path / "a.*")], None)
+    assert runs == [(str(tmp_path / "a.mzML"), []), (str(tmp_path / "b.mzML"), [])]
+
+def test_concatenate_tables_adds_a_run_column_and_fills_missing_columns():
+    columns, fieldnames = concatenate_tables([("a", {"scan": np.array([1, 2]), "label": np.array(["x", "y"], dtype=object)}),
+                                              ("b", {"scan": np.array([3]), "tic": np.array([5.0])})])
+    assert fieldnames == ["run", "scan", "label", "tic"]
+    assert columns["run"].tolist() == ["a", "a", "b"]
+    assert columns["scan"].tolist() == [1, 2, 3]
+    assert columns["label"].tolist() == ["x", "y", ""]
+    assert np.allclose(columns["tic"], [np.nan, np.nan, 5.0], equal_nan=True)
+
+def test_expected_outputs_leave_out_optional_tables():
+    assert expected_outputs("RunQC", "csv") == ["qc_scans.csv", "qc_windows.csv", "qc_summary.csv"]
+    assert expected_outputs("MS1XICExtractor", "csv") == ["xic.pdf"]
+
+def test_run_error_reads_the_exit_code_log_and_outputs(tmp_path):
+    log_file = tmp_path / "run.log"
+    log_file.write_text("INFO: Reading run\n")
+    assert run_error("CalculateCycleTime", str(tmp_path), str(log_file), 1, "csv") == "exit code 1"
+    assert run_error("CalculateCycleTime", str(tmp_path), str(log_file), 0, "csv") == "missing cycle_times.csv"
+    (tmp_path / "cycle_times.csv").write_text("")
+    assert run_error("CalculateCycleTime", str(tmp_path), str(log_file), 0, "csv") == ""
+    log_file.write_text("INFO: Reading run\nERROR: No MS1 scans found\n")
+    assert run_error("CalculateCycleTime", str(tmp_path), str(log_file), 0, "csv") == "ERROR: No MS1 scans found"
+
+def test_memory_limiter_sets_the_limit_in_the_child():
+    pytest.importorskip("resource")
+    assert memory_limiter(None) == []
+    command = memory_limiter(2) + [sys.executable, "-c", "import resource; print(resource.getrlimit(resource.RLIMIT_AS)[0])"]
+    assert int(subprocess.run(command, capture_output=True, text=True, check=True).stdout) == 2 * 1024 ** 3
@@ -0,0 +1,48 @@
+import numpy as np
+from centroid import centroid, centroid_spectrum
+
+GRID = 500.0 + 0.01 * np.arange(11)
+
+def test_centroid_splits_at_zero_points():
+    intensity = np.array([0, 1, 4, 10, 4, 1, 0, 2, 8, 2, 0], dtype=np.float64)
+    mz, apex = centroid(GRID, intensity)
+    np.testing.assert_allclose(mz, [GRID[3], GRID[8]])
+    np.testing.assert_array_equal(apex, [10.0, 8.0])
+
+def test_centroid_splits_at_local_minima():
+    intensity = np.array([1, 5, 10, 5, 3, 6, 12, 6, 1, 0, 0], dtype=np.float64)
+    mz, apex = centroid(GRID, intensity)
+    # only the points above half the apex height weight the centroid m/z
+    np.testing.assert_allclose(mz, [GRID[2], GRID[6]])
+    np.testing.assert_array_equal(apex, [10.0, 12.0])
+
+def test_centroid_splits_at_gaps():
+    mz = np.concatenate([GRID[:5], GRID[:5] + 1.0])
+    intensity = np.array([2, 6, 8, 6, 2, 2, 6, 8, 6, 2], dtype=np.float64)
+    centroid_mz, apex = centroid(mz, intensity)
+    np.testing.assert_allclose(centroid_mz, [GRID[2], GRID[2] + 1.0])
+    np.testing.assert_array_equal(apex, [8.0, 8.0])
+
+def test_centroid_keeps_the_first_point_after_a_gap():
+    mz = np.concatenate([GRID[:5], GRID[:5] + 1.0])
+    # the peak after the gap starts lower than the peak before it ends, which is not a local minimum
+    intensity = np.array([2, 6, 8, 6, 2.5, 1, 6, 8, 6, 2], dtype=np.float64)
+    centroid_mz, apex = centroid(mz, intensity)
+    np.testing.assert_allclose(centroid_mz, [GRID[2], GRID[2] + 1.0])
+    np.testing.assert_array_equal(apex, [8.0, 8.0])
+
+def test_centroid_passes_short_spectra_through():
+    mz, intensity = centroid(GRID[:2], np.array([1.0, 2.0]))
+    np.testing.assert_array_equal(mz, GRID[:2])
+    np.testing.assert_array_equal(intensity, [1.0, 2.0])
+
+def test_centroid_spectrum_only_changes_profile_spectra():
+    intensity = np.array([0, 1, 4, 10, 4, 1, 0, 2, 8, 2, 0], dtype=np.float64)
+    profile = {"profile spectrum": "", "m/z array": GRID, "intensity array": intensity}
+    assert centroid_spectrum(profile)
+    assert "centroid spectrum" in profile and "profile spectrum" not in profile
+    assert len(profile["m/z array"]) == 2
+
+    centroided = {"centroid spectrum": "", "m/z array": GRID, "intensity array": intensity}
+    assert not centroid_spectrum(centroided)
+    assert centroided["m/z array"] is GRID
@@ -0,0 +1,59 @@
+import json
+import pytest
+from checkpoint import Checkpoint
+
+PARAMETERS = {"sequence": "PEPTIDEK", "tolerance": 20}
+
+def test_resume_drops_a_truncated_last_line(tmp_path):
+    checkpoint_file = str(tmp_path / "table.checkpoint")
+    with Checkpoint(checkpoint_file, PARAMETERS) as checkpoint:
+        checkpoint.write(1, {"scan number": 1}, {"scan number": 1})
+        checkpoint.write(["target", 2], {"scan number": 2}, {"scan number": 2})
+    # a crash in the middle of the next line
+    with open(checkpoint_file, "a") as file:
+        file.write('{"key": 3, "row": {"scan num')
+
+    with Checkpoint(checkpoint_file, PARAMETERS, resume=True) as checkpoint:
+        assert checkpoint.completed == {1: ({"scan number": 1}, {"scan number": 1}), ("target", 2): ({"scan number": 2}, {"scan number": 2})}
+        checkpoint.write(3, {"scan number": 3}, {"scan number": 3})
+
+    with open(checkpoint_file) as file:
+        lines = [json.loads(line) for line in file]
+    assert [line["key"] for line in lines[1:]] == [1, ["target", 2], 3]
+    with Checkpoint(checkpoint_file, PARAMETERS, resume=True) as checkpoint:
+        assert set(checkpoint.completed) == {1, ("target", 2), 3}
+
+def test_resume_with_other_parameters_fails(tmp_path):
+    checkpoint_file = str(tmp_path / "table.checkpoint")
+    Checkpoint(checkpoint_file, PARAMETERS).close()
+    with pytest.raises(ValueError):
+        Checkpoint(checkpoint_file, {**PARAMETERS, "tolerance": 10}, resume=True)
+
+def test_without_resume_starts_over(tmp_path):
+    checkpoint_file = str(tmp_path / "table.checkpoint")
+    with Checkpoint(checkpoint_file, PARAMETERS) as checkpoint:
+        checkpoint.write(1, {}, {})
+    with Checkpoint(checkpoint_file, PARAMETERS) as checkpoint:
+        assert checkpoint.completed == {}
+    with Checkpoint(checkpoint_file, PARAMETERS, resume=True) as checkpoint:
+        assert checkpoint.completed == {}
+
+def test_resume_of_a_file_with_crlf_line_endings(tmp_path):
+    checkpoint_file = str(tmp_path / "table.checkpoint")
+    with Checkpoint(checkpoint_file, PARAMETERS) as checkpoint:
+        checkpoint.write(1, {"scan number": 1}, {"scan number": 1})
+        checkpoint.write(2, {"scan number": 2}, {"scan number": 2})
+    # as written in text mode on Windows, then cut short
+    with open(checkpoint_file, "rb") as file:
+        whole_lines = file.read().replace(b"\n", b"\r\n")
+    with open(checkpoint_file, "wb") as file:
+        file.write(whole_lines + b'{"key": 3, "row": {"scan num')
+
+    with Checkpoint(checkpoint_file, PARAMETERS, resume=True) as checkpoint:
+        assert set(checkpoint.completed) == {1, 2}
+        checkpoint.write(3, {"scan number": 3}, {"scan number": 3})
+
+    with open(checkpoint_file, "rb") as file:
+        content = file.read()
+    assert content.startswith(whole_lines)
+    assert json.loads(content[len(whole_lines):])["key"] == 3
@@ -0,0 +1,39 @@
+from models import Peptide
+from clustering import cluster_scans, precursor_buckets
+from ms2_table import generate_ms2_table
+from conftest import ms1_scan, ms2_scan
+
+def scans():
+    return [ms2_scan(2, [200.0, 300.0, 400.0], [10.0, 20.0, 30.0], precursor_mz=500.0, tic=60.0),
+            ms2_scan(3, [200.0, 300.0, 400.0], [11.0, 19.0, 31.0], precursor_mz=500.001, tic=90.0),
+            ms2_scan(4, [250.0, 350.0, 450.0], [10.0, 20.0, 30.0], precursor_mz=500.002, tic=30.0),
+            ms2_scan(5, [200.0, 300.0, 400.0], [10.0, 20.0, 30.0], precursor_mz=510.0, tic=10.0),
+            ms2_scan(6, [200.0, 300.0, 400.0], [10.0, 20.0, 30.0], precursor_mz=500.0, precursor_charge=3, tic=10.0)]
+
+def test_precursor_buckets_split_by_mass_and_charge():
+    buckets = precursor_buckets(scans(), tolerance=10)
+    assert buckets[0] == buckets[1] == buckets[2]
+    assert len(set(buckets[2:].tolist())) == 3
+
+def test_cluster_scans_by_similarity(make_run):
+    run = make_run(scans())
+    # the most intense scan leads its bucket; the dissimilar scan of the same bucket leads its own cluster
+    assert cluster_scans(run, run.ms2_spectra, similarity=0.9) == {2: 3, 3: 3, 4: 4, 5: 5, 6: 6}
+
+def test_cluster_scans_by_precursor_only(make_run):
+    run = make_run(scans())
+    assert cluster_scans(run, run.ms2_spectra, similarity=None) == {2: 3, 3: 3, 4: 3, 5: 5, 6: 6}
+
+def test_cluster_scans_of_no_scans(make_run):
+    assert cluster_scans(make_run([]), []) == {}
+
+def test_members_take_the_prediction_of_their_representative(make_run, offline_unimod):
+    sequence = Peptide("AQDSQVLEEER", [])
+    mz = [ion.mz for ion_list in sequence.fragments().values() for ion in ion_list]
+    run = make_run([ms2_scan(2, mz, [100.0] * len(mz), sequence.mz(2), tic=100.0),
+                    ms2_scan(3, mz, [200.0] * len(mz), sequence.mz(2), tic=200.0)],
+                   [ms1_scan(1, [sequence.mz(2)], [1000.0])])
+    rows = [row for row, _ in generate_ms2_table(run, sequence, 2, 10, "DDA", similarity=0.9)][1:]
+    assert [row["cluster"] for row in rows] == [3, 3]
+    assert [row["modification"] for row in rows] == ["No mod", "No mod"]
+    assert rows[0]["usi"].endswith(":2:AQDSQVLEEER/2")
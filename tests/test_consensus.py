@@ -0,0 +1,36 @@
+import numpy as np
+from consensus import merge_peaks, consensus_spectrum
+from conftest import ms2_scan
+
+def test_merge_peaks_weights_mz_and_drops_rare_peaks():
+    mz = np.array([500.000, 600.0, 700.000, 700.002, 500.002, 700.001, 499.998, 800.0])
+    intensity = np.array([10.0, 50.0, 1.0, 1.0, 30.0, 2.0, 20.0, 9.0])
+    scan_ids = np.array([0, 0, 0, 0, 1, 1, 2, 2])
+
+    merged_mz, merged_intensity, members = merge_peaks(mz, intensity, scan_ids, 3, tolerance=10)
+
+    # 600 and 800 are each seen in one of three scans; the two peaks of scan 0 at 700 count it once
+    np.testing.assert_allclose(merged_mz, [(500.0 * 10 + 500.002 * 30 + 499.998 * 20) / 60, (700.0 + 700.002 + 700.001 * 2) / 4])
+    np.testing.assert_allclose(merged_intensity, [20.0, 4.0 / 3])
+    np.testing.assert_array_equal(members, [3, 2])
+
+def test_merge_peaks_min_fraction():
+    mz = np.array([500.0, 600.0, 500.0])
+    scan_ids = np.array([0, 0, 1])
+    merged_mz, _, members = merge_peaks(mz, np.ones(3), scan_ids, 2, tolerance=10, min_fraction=0.0)
+    np.testing.assert_allclose(merged_mz, [500.0, 600.0])
+    np.testing.assert_array_equal(members, [2, 1])
+
+def test_merge_peaks_of_no_peaks():
+    merged_mz, merged_intensity, members = merge_peaks(np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64), 2, tolerance=10)
+    assert len(merged_mz) == len(merged_intensity) == len(members) == 0
+
+def test_consensus_spectrum_is_named_after_its_most_intense_member(make_run):
+    run = make_run([ms2_scan(2, [300.0, 400.0], [10.0, 10.0], precursor_mz=500.0, tic=100.0),
+                    ms2_scan(3, [300.001, 450.0], [30.0, 10.0], precursor_mz=500.002, tic=300.0)])
+    spectrum = consensus_spectrum(run, [2, 3], tolerance=10)
+    assert spectrum.scan_number == 3
+    assert spectrum.tic == 400.0
+    assert spectrum.precursor_mz == (500.0 * 100 + 500.002 * 300) / 400
+    np.testing.assert_allclose(spectrum.mz_array, [(300.0 * 10 + 300.001 * 30) / 40, 400.0, 450.0])
+    np.testing.assert_allclose(spectrum.intensity_array, [20.0, 5.0, 5.0])
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from models import Peptide, Modification
+from delta_refinement import select_table_scans, select_precursor_scans, refine_delta
+from constants import PROTON_MASS
+from table_writer import write_table
+from conftest import ms2_scan
+
+MODIFICATION = Modification(2, 23.958, "Cation:Al[III]", False)
+SEQUENCE = Peptide("AQDSQVLEEER", [])
+TOLERANCE = 20
+
+# MS2 scan with a peak at every fragment of the peptide carrying the modification at true_delta, all shifted by offset
+def modified_scan(scan_number, true_delta, offset=0.0, seed=0):
+    peptide = Peptide("AQDSQVLEEER", [Modification(2, true_delta, MODIFICATION.name, False)])
+    mz = np.array([ion.mz for ion_list in peptide.fragments().values() for ion in ion_list])
+    rng = np.random.default_rng(seed)
+    return ms2_scan(scan_number, mz + offset, rng.uniform(10, 100, len(mz)))
+
+def test_refine_delta_pools_scans_with_their_own_calibration_offsets(make_run):
+    true_delta = MODIFICATION.delta + 0.0004
+    run = make_run([modified_scan(2, true_delta, 0.0003, seed=0), modified_scan(3, true_delta, -0.0002, seed=1),
+                    modified_scan(4, true_delta, 0.0, seed=2), ms2_scan(5, [50.0], [100.0])])
+    result = refine_delta(run, [2, 3, 4, 5], SEQUENCE, MODIFICATION, TOLERANCE, n_bootstrap=200)
+    assert result["scans"] == 3
+    assert result["scan numbers"] == [2, 3, 4]
+    assert abs(result["best delta"] - true_delta) < 1e-6
+    assert result["lower bound"] <= result["best delta"] <= result["upper bound"]
+
+def test_refine_delta_without_fragment_peaks_raises(make_run):
+    run = make_run([ms2_scan(2, [50.0], [100.0])])
+    with pytest.raises(ValueError):
+        refine_delta(run, [2], SEQUENCE, MODIFICATION, TOLERANCE)
+
+def test_select_table_scans_keeps_rows_with_the_modification_at_mod_index(tmp_path, offline_unimod):
+    table = tmp_path / "ms2.csv"
+    table.write_text("scan number,usi\n"
+                     "2,mzspec:PXD0:run:2:AQD[Cation:Al[III]]SQVLEEER/2\n"
+                     "3,mzspec:PXD0:run:3:AQDSQVLE[Cation:Al[III]]EER/2\n"
+                     "4,mzspec:PXD0:run:4:AQDSQVLEEER/2\n"
+                     "5,mzspec:PXD0:run:5:AQD[Cation:Na]SQVLEEER/2\n"
+                     "6,mzspec:PXD0:run:6:AQD[Cation:Al[III]]SQVLEEER/3\n")
+    assert select_table_scans(table, "Cation:Al[III]", 2) == [2, 6]
+
+def test_select_precursor_scans_finds_the_modified_precursors(make_run):
+    modified_mass = SEQUENCE.mass(0) + MODIFICATION.delta
+    run = make_run([ms2_scan(2, [100.0], [1.0], (modified_mass + 2 * PROTON_MASS) / 2, 2),
+                    ms2_scan(3, [100.0], [1.0], SEQUENCE.mz(2), 2),
+                    ms2_scan(4, [100.0], [1.0], (modified_mass + 3 * PROTON_MASS) / 3, 3)])
+    assert select_precursor_scans(run, SEQUENCE, MODIFICATION, 10) == [2, 4]
+
+def test_select_table_scans_reads_the_target_rows_of_any_table_format(tmp_path, offline_unimod):
+    table = str(tmp_path / "ms2.parquet")
+    write_table(table, {"target": ["AQDSQVLEEER", "AQDSQVLEEER", "PEPTIDEK"],
+                        "scan number": [2, 3, 4],
+                        "usi": ["mzspec:PXD0:run:2:AQD[Cation:Al[III]]SQVLEEER/2", "", "mzspec:PXD0:run:4:PEPTID[Cation:Al[III]]EK/2"]})
+    assert select_table_scans(table, "Cation:Al[III]", 2, "AQDSQVLEEER") == [2]
+    assert select_table_scans(table, "Cation:Al[III]", 5) == [4]
+
+def test_select_table_scans_skips_scans_that_are_not_ms2_scans_of_the_run(tmp_path, make_run, offline_unimod):
+    table = tmp_path / "ms2.csv"
+    table.write_text("scan number,usi\n"
+                     "1,mzspec:PXD0:run:1:AQD[Cation:Al[III]]SQVLEEER/2\n"
+                     "2,mzspec:PXD0:run:2:AQD[Cation:Al[III]]SQVLEEER/2\n"
+                     "7,mzspec:PXD0:run:7:AQD[Cation:Al[III]]SQVLEEER/2\n")
+    # scan 1 is the MS1 scan of the run and scan 7 is not in it
+    run = make_run([modified_scan(2, MODIFICATION.delta)])
+    assert select_table_scans(table, "Cation:Al[III]", 2, run=run) == [2]
@@ -0,0 +1,50 @@
+import numpy as np
+from FindPrecursorIntensity import find_peaks_in_scans, process_ms1_windows
+
+# peak closest to guess_mz within ppm of one scan, the lower m/z on ties, as the per-peak loop did
+def reference_nearest_peak(mz_array, intensity_array, guess_mz, ppm):
+    best = None
+    for mz, intensity in sorted(zip(mz_array, intensity_array), key=lambda peak: peak[0]):
+        distance = abs(mz - guess_mz)
+        if distance <= guess_mz * ppm / 1e6 and (best is None or distance < abs(best[0] - guess_mz)):
+            best = (mz, intensity)
+    return best
+
+def test_find_peaks_in_scans_matches_a_per_peak_search():
+    rng = np.random.default_rng(0)
+    mz_arrays = [rng.uniform(499.99, 500.01, rng.integers(0, 6)) for _ in range(5)]
+    intensity_arrays = [rng.uniform(1, 100, len(mz_array)).astype(np.float32) for mz_array in mz_arrays]
+    ordinals = rng.integers(0, 5, 40)
+    guess_mzs = rng.uniform(499.995, 500.005, 40)
+    closest_mzs, closest_intensities, found = find_peaks_in_scans(mz_arrays, intensity_arrays, ordinals, guess_mzs, 10)
+    for query, (ordinal, guess_mz) in enumerate(zip(ordinals, guess_mzs)):
+        expected = reference_nearest_peak(mz_arrays[ordinal], intensity_arrays[ordinal], guess_mz, 10)
+        assert found[query] == (expected is not None)
+        if expected is None:
+            assert np.isnan(closest_mzs[query]) and closest_intensities[query] == 0
+        else:
+            assert closest_mzs[query] == expected[0]
+            assert closest_intensities[query] == expected[1]
+
+def test_find_peaks_in_scans_ties_keep_the_lower_mz():
+    mz_arrays = [np.array([499.999, 500.001])]
+    intensity_arrays = [np.array([1.0, 2.0], dtype=np.float32)]
+    closest_mzs, closest_intensities, found = find_peaks_in_scans(mz_arrays, intensity_arrays, np.array([0]), np.array([500.0]), 10)
+    assert found[0] and closest_mzs[0] == 499.999 and closest_intensities[0] == 1.0
+
+def test_process_ms1_windows_pads_scans_outside_the_run():
+    mz_arrays = [np.array([500.0]) for _ in range(4)]
+    intensity_arrays = [np.array([float(ordinal + 1)], dtype=np.float32) for ordinal in range(4)]
+    mz_values, intensity_values = process_ms1_windows(mz_arrays, intensity_arrays, np.array([1]), np.array([500.0]), 2, 10)
+    assert mz_values.shape == (1, 20)
+    assert list(mz_values[0, :4]) == [500.0] * 4 and all(value == "NA" for value in mz_values[0, 4:])
+    assert intensity_values[0, :4].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert not intensity_values[0, 4:].any()
+
+def test_intensities_keep_the_dtype_of_the_intensity_arrays():
+    mz_arrays = [np.array([500.0])]
+    intensity_arrays = [np.array([16777217.0], dtype=np.float64)]
+    _, closest_intensities, _ = find_peaks_in_scans(mz_arrays, intensity_arrays, np.array([0]), np.array([500.0]), 10)
+    assert closest_intensities.dtype == np.float64 and closest_intensities[0] == 16777217.0
+    _, intensity_values = process_ms1_windows(mz_arrays, intensity_arrays, np.array([0]), np.array([500.0]), 2, 10)
+    assert intensity_values[0, 0] == 16777217.0
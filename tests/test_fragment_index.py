@@ -0,0 +1,65 @@
+import numpy as np
+from models import Peptide
+from fragment_index import Variant, FragmentIndex, fragment_mzs, mz_bins
+
+TOLERANCE = 10
+
+# the target and its deletion of the first residue: the y ions are shared, the b ions differ
+def variants():
+    target = Peptide("PEPTIDEK", [])
+    deletion = target.remove_residues([0])
+    return [Variant(target, "No mod", "No mod", 0.0, ""),
+            Variant(deletion, "_EPTIDEK", "missing P", deletion.mass(0) - target.mass(0), "synthesis error")]
+
+# fragments hit and summed intensity per variant by comparing every peak with every fragment
+def brute_force_votes(index, mz, intensity):
+    peak_bins = mz_bins(mz, index.tolerance)
+    fragment_hits, intensity_sums = [], []
+    for fragment_mz in fragment_mzs(index.variants, index.max_charge):
+        near = np.abs(mz_bins(fragment_mz, index.tolerance)[:, None] - peak_bins[None, :]) <= 1
+        fragment_hits.append(np.count_nonzero(near.any(axis=1)))
+        intensity_sums.append((near * intensity).sum())
+    return np.array(fragment_hits), np.array(intensity_sums)
+
+def test_votes_count_shared_and_unique_fragments():
+    index = FragmentIndex(variants(), TOLERANCE)
+    target, deletion = index.variants
+    shared = target.peptide.y_ions(1)[2].mz
+    target_only = target.peptide.b_ions(1)[2].mz
+    mz = np.array([shared, target_only])
+    intensity = np.array([10.0, 5.0])
+
+    fragment_hits, intensity_sums = index.votes(mz, intensity)
+
+    np.testing.assert_array_equal(fragment_hits, [2, 1])
+    np.testing.assert_allclose(intensity_sums, [15.0, 10.0])
+
+def test_votes_match_brute_force():
+    index = FragmentIndex(variants(), TOLERANCE)
+    rng = np.random.default_rng(0)
+    fragment_mz = np.concatenate(fragment_mzs(index.variants))
+    # fragments shifted by up to the tolerance, plus peaks far from any fragment
+    mz = np.sort(np.concatenate([fragment_mz * (1 + rng.uniform(-TOLERANCE, TOLERANCE, len(fragment_mz)) / 1e6), [55.5, 1500.0]]))
+    intensity = rng.uniform(1, 100, len(mz))
+
+    fragment_hits, intensity_sums = index.votes(mz, intensity)
+    expected_hits, expected_sums = brute_force_votes(index, mz, intensity)
+
+    np.testing.assert_array_equal(fragment_hits, expected_hits)
+    np.testing.assert_allclose(intensity_sums, expected_sums)
+    assert (fragment_hits >= index.fragment_counts * 0.9).all()
+
+def test_votes_without_hits():
+    index = FragmentIndex(variants(), TOLERANCE)
+    fragment_hits, intensity_sums = index.votes(np.array([1500.0, 1600.0]), np.array([1.0, 2.0]))
+    np.testing.assert_array_equal(fragment_hits, [0, 0])
+    np.testing.assert_array_equal(intensity_sums, [0.0, 0.0])
+
+def test_candidates_rank_by_votes():
+    index = FragmentIndex(variants(), TOLERANCE, top_n=1)
+    deletion = index.variants[1].peptide
+    mz = np.sort([ion.mz for ion in deletion.b_ions(1)])
+    assert index.candidates(mz, np.ones(len(mz)), index.variants[1].delta, deletion.mass(0)).tolist() == [1]
+
+def test_signature_changes_with_the_fragment_charge():
+    assert FragmentIndex(variants(), TOLERANCE).signature() != FragmentIndex(variants(), TOLERANCE, max_charge=1).signature()
@@ -0,0 +1,53 @@
+import sys
+import numpy as np
+import pytest
+from GenerateMS2Table import GenerateMS2Table, join_on_keys, read_annotation_list
+
+def write_list(path, rows):
+    path.write_text("scan number,confidence,modification,usi,comments\n" + "".join(",".join(row) + "\n" for row in rows))
+    return str(path)
+
+# a GenerateMS2Table over scans 1-4 with two previous lists: the second one annotates scan 1 again and repeats scan 2
+@pytest.fixture
+def table(tmp_path, monkeypatch):
+    def make(precedence):
+        first = write_list(tmp_path / "first.csv", [["1", "high", "Cation:Na", "", "from first"],
+                                                    ["3", "low", "", "", ""]])
+        second = write_list(tmp_path / "second.csv", [["1", "", "Cation:K", "mzspec:1", ""],
+                                                      ["2", "", "", "", "old"],
+                                                      ["2", "", "", "", "new"],
+                                                      ["x", "", "", "", "not a scan"]])
+        mzml_file = tmp_path / "run.mzML"
+        mzml_file.write_text("")
+        monkeypatch.setattr(sys, "argv", ["GenerateMS2Table.py", "--mzml_file", str(mzml_file), "--precursor_mz", "500",
+                                          "--previous_list", first, second, "--precedence", precedence])
+        generate_table = GenerateMS2Table()
+        generate_table.spectra = {"scan number": np.array([1, 2, 3, 4], dtype=np.int64)}
+        generate_table.read_annotation()
+        return generate_table.spectra
+    return make
+
+def test_later_lists_take_precedence_by_default(table):
+    spectra = table("last")
+    assert spectra["modification"].tolist() == ["Cation:K", "", "", ""]
+    # fields the later list leaves empty come from the earlier one
+    assert spectra["confidence"].tolist() == ["high", "", "low", ""]
+    assert spectra["usi"].tolist() == ["mzspec:1", "", "", ""]
+    assert spectra["comments"].tolist() == ["from first", "new", "", ""]
+
+def test_first_precedence(table):
+    spectra = table("first")
+    assert spectra["modification"].tolist() == ["Cation:Na", "", "", ""]
+    assert spectra["usi"].tolist() == ["mzspec:1", "", "", ""]
+
+def test_read_annotation_list_keeps_the_last_row_of_a_scan(tmp_path):
+    keys, annotations = read_annotation_list(write_list(tmp_path / "list.csv", [["5", "", "", "", "a"], ["2", "", "", "", "b"], ["5", "", "", "", "c"]]))
+    assert keys.tolist() == [2, 5]
+    assert annotations["comments"].tolist() == ["b", "c"]
+
+def test_join_on_keys():
+    found, positions = join_on_keys(np.array([1, 2, 5, 9]), np.array([2, 5, 7]))
+    assert found.tolist() == [False, True, True, False]
+    assert positions[found].tolist() == [0, 1]
+    found, _ = join_on_keys(np.array([1, 2]), np.array([], dtype=np.int64))
+    assert not found.any()
@@ -0,0 +1,57 @@
+import numpy as np
+from constants import ppm
+from intensity import find_max_ms1
+from conftest import ms1_scan
+
+TARGET_MZ = 652.31
+TOLERANCE = 10
+
+# find_max_ms1 as a loop over the MS1 scans, one m/z window search per scan
+def reference_find_max_ms1(run, mz, tolerance):
+    intensities, mzs = [], []
+    for scan in run.ms1_spectra:
+        order = np.argsort(scan.mz_array)
+        sorted_mz, sorted_intensity = scan.mz_array[order], scan.intensity_array[order]
+        in_window = (sorted_mz >= mz - ppm(mz, tolerance)) & (sorted_mz <= mz + ppm(mz, tolerance))
+        if not in_window.any():
+            intensities.append(0.0)
+            mzs.append(0.0)
+            continue
+        best = np.argmax(np.where(in_window, sorted_intensity, -np.inf))
+        intensities.append(sorted_intensity[best])
+        mzs.append(sorted_mz[best])
+    best = int(np.argmax(intensities))
+    start, end = max(0, best - 10), min(len(intensities), best + 11)
+    return run.ms1_spectra[best], intensities[best], mzs[best], mzs[start:end], intensities[start:end]
+
+# MS1 scans with unsorted random peaks and a few peaks near the target m/z; scan 5 has none in the window
+def ms1_scans(n_scans=30, seed=0):
+    rng = np.random.default_rng(seed)
+    scans = []
+    for scan_number in range(1, n_scans + 1):
+        mz = rng.uniform(300, 1500, 200)
+        intensity = rng.uniform(1, 1000, 200)
+        if scan_number != 5:
+            mz = np.append(mz, TARGET_MZ * (1 + rng.uniform(-8, 8, 3) / 1e6))
+            intensity = np.append(intensity, rng.uniform(1, 5000, 3))
+        scans.append(ms1_scan(scan_number, mz, intensity))
+    return scans
+
+def test_find_max_ms1_matches_a_per_scan_search(make_run):
+    run = make_run(ms1_scans=ms1_scans())
+    spectrum, intensity, mz, mz_row, intensity_row, sn_ratio = find_max_ms1(run, TARGET_MZ, TOLERANCE)
+    expected_spectrum, expected_intensity, expected_mz, expected_mz_row, expected_intensity_row = reference_find_max_ms1(run, TARGET_MZ, TOLERANCE)
+    assert spectrum is expected_spectrum
+    assert intensity == expected_intensity and mz == expected_mz
+    np.testing.assert_array_equal(mz_row, expected_mz_row)
+    np.testing.assert_array_equal(intensity_row, expected_intensity_row)
+    # the S/N of the most intense spectrum, from the run's noise model
+    assert sn_ratio == run.ms1_peaks.sn_ratio[run.ms1_peaks.ordinal(spectrum.scan_number)]
+
+def test_find_max_ms1_ties_keep_the_lowest_mz(make_run):
+    run = make_run(ms1_scans=[ms1_scan(1, [TARGET_MZ + 0.002, TARGET_MZ - 0.002, 700.0], [50.0, 50.0, 10.0]),
+                              ms1_scan(2, [TARGET_MZ], [20.0])])
+    spectrum, intensity, mz, mz_row, intensity_row, _ = find_max_ms1(run, TARGET_MZ, TOLERANCE)
+    assert spectrum.scan_number == 1 and intensity == 50.0
+    assert mz == TARGET_MZ - 0.002
+    np.testing.assert_array_equal(intensity_row, [50.0, 20.0])
@@ -0,0 +1,27 @@
+import numpy as np
+from models import Peptide
+from ms2_table import route_scans, generate_multi_target_table
+from conftest import ms1_scan, ms2_scan
+import constants
+
+# MS2 scan of a precursor with the given neutral mass at charge 2
+def precursor_scan(scan_number, mass):
+    return ms2_scan(scan_number, [100.0], [1.0], (mass + 2 * constants.PROTON_MASS) / 2, 2)
+
+def test_route_scans_binary_searches_each_target_window(make_run):
+    first, second = Peptide("AQDSQVLEEER", []), Peptide("PEPTIDEK", [])
+    # the default window runs from 200 Da below to 400 Da above each target, so scan 6 goes to both targets
+    run = make_run([precursor_scan(2, first.mass(0) + 300.0), precursor_scan(3, second.mass(0) - 100.0),
+                    precursor_scan(4, second.mass(0) - 250.0), precursor_scan(5, second.mass(0)), precursor_scan(6, first.mass(0) + 24.0)])
+    routes = route_scans(run, [first, second])
+    assert [run.ms2_spectra[i].scan_number for i in routes[0]] == [2, 6]
+    assert [run.ms2_spectra[i].scan_number for i in routes[1]] == [3, 5, 6]
+    assert [run.ms2_spectra[i].scan_number for i in route_scans(run, [second], delta_window=(-300.0, 0.0))[0]] == [3, 4, 5]
+
+def test_multi_target_rows_carry_their_target(make_run, offline_unimod):
+    first, second = Peptide("AQDSQVLEEER", []), Peptide("PEPTIDEK", [])
+    run = make_run([precursor_scan(2, first.mass(0) + 300.0), precursor_scan(3, second.mass(0) - 100.0)],
+                   [ms1_scan(1, [first.mz(2), second.mz(2)], [1000.0, 500.0])])
+    rows = [row for row, _ in generate_multi_target_table(run, [(first, 2), (second, 2)], 10, "DDA")]
+    # each target starts with its most intense MS1 scan, then its routed MS2 scans
+    assert [(row["target"], row["scan number"]) for row in rows] == [("AQDSQVLEEER", 1), ("AQDSQVLEEER", 2), ("PEPTIDEK", 1), ("PEPTIDEK", 3)]
@@ -0,0 +1,43 @@
+import numpy as np
+from models import Peptide
+from offset_histogram import precursor_offsets, offset_histogram, detect_peaks, annotation_masses, annotate, offset_report
+from constants import PROTON_MASS, AA_MASSES
+
+SEQUENCE = Peptide("AQDSQVLEEER", [])
+AL_DELTA = 23.958063
+
+def test_precursor_offsets_are_neutral_mass_differences():
+    mass = SEQUENCE.mass(0)
+    assert np.allclose(precursor_offsets([(mass + 2 * PROTON_MASS) / 2, (mass + 10 + 3 * PROTON_MASS) / 3], [2, 3], mass), [0.0, 10.0])
+
+def test_offset_histogram_bins_offsets_inside_the_window():
+    counts, edges = offset_histogram(np.array([-1.0, 0.0, 0.0004, 0.0015, 0.9999, 1.0]), window=(0.0, 1.0))
+    assert len(counts) == 1000 and np.isclose(edges[1], 0.001)
+    assert counts[[0, 1, 999]].tolist() == [2, 1, 1]
+    assert counts.sum() == 4
+
+def test_annotate_lists_known_offsets_closest_first(offline_unimod):
+    names, masses = annotation_masses(SEQUENCE)
+    assert (np.diff(masses) >= 0).all()
+    labels, closest = annotate(np.array([AL_DELTA + 0.001, -AA_MASSES["E"], 300.0]), names, masses, 0.01)
+    assert labels[0] == "Cation:Al[III]" and closest[0] == AL_DELTA
+    assert labels[1].startswith("missing E") and np.isclose(closest[1], -AA_MASSES["E"])
+    assert labels[2] == "" and np.isnan(closest[2])
+
+# 10 offsets around Al[III], 5 around the loss of E and 3 scattered ones
+def clustered_offsets():
+    rng = np.random.default_rng(0)
+    return np.concatenate([AL_DELTA + rng.uniform(-0.002, 0.002, 10), -AA_MASSES["E"] + rng.uniform(-0.001, 0.001, 5), [50.0, 75.0, 1000.0]])
+
+def test_detect_peaks_counts_every_offset_of_a_cluster():
+    peak_offsets, peak_counts = detect_peaks(clustered_offsets())
+    assert peak_counts.tolist() == [5, 10]
+    assert np.allclose(peak_offsets, [-AA_MASSES["E"], AL_DELTA], atol=0.002)
+
+def test_offset_report_ranks_the_most_populated_peak_first(offline_unimod):
+    report = offset_report(clustered_offsets(), SEQUENCE, "MS2")
+    assert report["count"].tolist() == [10, 5]
+    assert report["rank"].tolist() == [1, 2]
+    assert report["annotation"][0] == "Cation:Al[III]"
+    assert report["annotation"][1].startswith("missing E")
+    assert np.allclose(report["fraction"], [10 / 17, 5 / 17])
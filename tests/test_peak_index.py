@@ -0,0 +1,47 @@
+import numpy as np
+from peak_index import MzIndex
+
+# random scans with peaks around 500 m/z, as parallel lists of scan numbers and m/z and intensity arrays
+def random_scans(n_scans=6, seed=0):
+    rng = np.random.default_rng(seed)
+    mz_arrays = [np.sort(rng.uniform(499.99, 500.01, rng.integers(0, 8))) for _ in range(n_scans)]
+    intensity_arrays = [rng.integers(1, 5, len(mz_array)).astype(np.float32) for mz_array in mz_arrays]
+    return list(range(1, 2 * n_scans, 2)), mz_arrays, intensity_arrays
+
+def test_xic_sums_every_peak_within_tolerance_of_each_scan():
+    scan_numbers, mz_arrays, intensity_arrays = random_scans()
+    index = MzIndex.from_arrays(scan_numbers, mz_arrays, intensity_arrays)
+    tolerance_da = 500.0 * 10 / 1e6
+    expected = [intensity[np.abs(mz - 500.0) <= tolerance_da].sum() for mz, intensity in zip(mz_arrays, intensity_arrays)]
+    assert np.allclose(index.xic(500.0, 10), expected)
+
+def test_window_max_matches_a_per_scan_search():
+    scan_numbers, mz_arrays, intensity_arrays = random_scans(seed=1)
+    index = MzIndex.from_arrays(scan_numbers, mz_arrays, intensity_arrays)
+    max_intensity, max_mz, found = index.window_max(500.0, 10)
+    tolerance_da = 500.0 * 10 / 1e6
+    for ordinal, (mz, intensity) in enumerate(zip(mz_arrays, intensity_arrays)):
+        in_window = np.abs(mz - 500.0) <= tolerance_da
+        assert found[ordinal] == in_window.any()
+        if in_window.any():
+            # the intensities are small integers, so ties happen; argmax keeps the lowest m/z
+            best = np.argmax(np.where(in_window, intensity, -1))
+            assert max_intensity[ordinal] == intensity[best]
+            assert max_mz[ordinal] == mz[best]
+        else:
+            assert max_intensity[ordinal] == 0
+
+def test_weighted_mz_is_the_intensity_weighted_mean():
+    index = MzIndex.from_arrays([1, 2], [np.array([499.999, 500.001, 600.0]), np.array([300.0])],
+                                [np.array([1.0, 3.0, 9.0], dtype=np.float32), np.array([5.0], dtype=np.float32)])
+    total_intensity, observed_mz = index.weighted_mz(500.0, 10)
+    assert np.allclose(total_intensity, [4.0, 0.0])
+    assert np.isclose(observed_mz[0], (499.999 + 3 * 500.001) / 4)
+    assert observed_mz[1] == 0
+
+def test_scan_mask_selects_scan_and_rt_ranges_and_sim_windows():
+    index = MzIndex.from_arrays([1, 2, 3, 4], [np.zeros(0)] * 4, [np.zeros(0, dtype=np.float32)] * 4,
+                                rt=[0.5, 1.0, 1.5, 2.0], sim_windows=[(np.nan, np.nan), (490, 510), (490, 510), (600, 620)])
+    assert index.scan_mask(scan_range=(2, 3)).tolist() == [False, True, True, False]
+    assert index.scan_mask(rt_range=(1.0, 2.0)).tolist() == [False, True, True, True]
+    assert index.scan_mask(scan_range=(1, 3), sim_mz=500.0).tolist() == [False, True, True, False]
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from peak_store import PeakStore
+
+def store():
+    return PeakStore([10, 11, 12, 13],
+                     [np.array([500.0, 100.0, 300.0, 400.0, 200.0]), np.array([4.0, 1.0, 2.0, 3.0]), np.array([7.0]), np.zeros(0)],
+                     [np.array([100.0, 1.0, 3.0, 4.0, 2.0], dtype=np.float32), np.array([10.0, 1.0, 2.0, 3.0], dtype=np.float32),
+                      np.array([5.0], dtype=np.float32), np.zeros(0, dtype=np.float32)])
+
+def test_peaks_are_sorted_by_mz_within_each_scan():
+    peaks = store()
+    mz, intensity = peaks.get_peaks(peaks.ordinal(10))
+    np.testing.assert_array_equal(mz, [100.0, 200.0, 300.0, 400.0, 500.0])
+    np.testing.assert_array_equal(intensity, [1.0, 2.0, 3.0, 4.0, 100.0])
+    assert len(peaks.get_peaks(peaks.ordinal(13))[0]) == 0
+    with pytest.raises(KeyError):
+        peaks.ordinal(14)
+
+def test_noise_model():
+    peaks = store()
+    # median intensity; even counts take the mean of the two middle peaks
+    np.testing.assert_allclose(peaks.noise, [3.0, 2.5, 5.0, 0.0])
+    # deviations from the median of scan 10 are 2, 1, 0, 1 and 97
+    np.testing.assert_allclose(peaks.noise_mad, [1.4826, 1.4826 * 1.0, 0.0, 0.0])
+    # mean of the 2nd and 3rd most intense peaks, or the only peak of a one-peak scan
+    np.testing.assert_allclose(peaks.signal, [3.5, 2.5, 5.0, 0.0])
+    np.testing.assert_allclose(peaks.sn_ratio, [3.5 / 3.0, 1.0, 1.0, 0.0])
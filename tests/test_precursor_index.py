@@ -0,0 +1,27 @@
+import numpy as np
+from precursor_index import PrecursorIndex
+from constants import PROTON_MASS
+
+# precursors of neutral masses 1000, 1500, 1000.005 and 2000 at charges 2, 3, 1 and 2
+def precursor_index():
+    masses = np.array([1000.0, 1500.0, 1000.005, 2000.0])
+    charges = np.array([2, 3, 1, 2])
+    return PrecursorIndex((masses + PROTON_MASS * charges) / charges, charges, [11, 12, 13, 14])
+
+def test_neutral_masses_are_sorted_with_their_scans():
+    index = precursor_index()
+    assert np.allclose(index.mass, [1000.0, 1000.005, 1500.0, 2000.0])
+    assert index.scan_numbers.tolist() == [11, 13, 12, 14]
+
+def test_range_and_ppm_queries_return_ordinals_in_scan_order():
+    index = precursor_index()
+    assert index.range(999.0, 1500.0).tolist() == [0, 1, 2]
+    assert index.query(1000.0, 10).tolist() == [0, 2]
+    assert index.query(1000.0, 1).tolist() == [0]
+    assert index.query(3000.0, 10).tolist() == []
+
+def test_batch_queries_match_single_queries():
+    index = precursor_index()
+    masses = [1000.0, 1500.0, 1750.0]
+    assert [ordinals.tolist() for ordinals in index.batch(masses, tolerance=10)] == [index.query(mass, 10).tolist() for mass in masses]
+    assert [ordinals.tolist() for ordinals in index.batch([1000.0, 1500.0], delta_window=(-1.0, 600.0))] == [[0, 1, 2], [1, 3]]
@@ -0,0 +1,37 @@
+import numpy as np
+from constants import ISOTOPE_SPACING, PROTON_MASS
+from preprocessing import top_n_per_window, deisotope, reduce_charges
+
+def test_top_n_ranks_each_window_of_each_scan():
+    mz = np.array([10.0, 20.0, 30.0, 150.0, 160.0, 10.0, 20.0])
+    intensity = np.array([1.0, 5.0, 3.0, 2.0, 2.0, 7.0, 6.0])
+    ordinals = np.array([0, 0, 0, 0, 0, 1, 1])
+    keep = top_n_per_window(mz, intensity, ordinals, 1, window=100)
+    # ties keep the peak that comes first
+    np.testing.assert_array_equal(keep, [False, True, False, True, False, True, False])
+    keep = top_n_per_window(mz, intensity, ordinals, 2, window=100)
+    np.testing.assert_array_equal(keep, [False, True, True, True, True, True, True])
+
+def test_top_n_of_no_peaks():
+    empty = np.zeros(0)
+    assert len(top_n_per_window(empty, empty, np.zeros(0, dtype=np.int64), 3)) == 0
+
+def test_deisotope_follows_chains_to_the_monoisotopic_peak():
+    mz = np.array([500.0, 500.0 + ISOTOPE_SPACING, 500.0 + 2 * ISOTOPE_SPACING,
+                   600.0, 600.0 + ISOTOPE_SPACING / 2,
+                   700.0, 700.0 + ISOTOPE_SPACING,
+                   500.0 + ISOTOPE_SPACING])
+    intensity = np.array([100.0, 80.0, 40.0, 60.0, 50.0, 10.0, 100.0, 30.0])
+    # the last peak is in another scan, so it is not an isotope of the first
+    ordinals = np.array([0, 0, 0, 0, 0, 0, 0, 1])
+
+    monoisotopic, summed_intensity, charges = deisotope(mz, intensity, ordinals, tolerance=10)
+
+    # 701 is too intense to be an isotope of 700, so both stay
+    np.testing.assert_array_equal(monoisotopic, [True, False, False, True, False, True, True, True])
+    np.testing.assert_allclose(summed_intensity[monoisotopic], [220.0, 110.0, 10.0, 100.0, 30.0])
+    np.testing.assert_array_equal(charges[monoisotopic], [1, 2, 0, 0, 0])
+
+def test_reduce_charges():
+    mz = np.array([500.0, 600.0, 700.0])
+    np.testing.assert_allclose(reduce_charges(mz, np.array([0, 1, 2])), [500.0, 600.0, (700.0 - PROTON_MASS) * 2 + PROTON_MASS])
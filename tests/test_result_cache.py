@@ -0,0 +1,58 @@
+import numpy as np
+from models import Peptide, Modification, MSRun
+from preprocessing import Preprocessing
+from result_cache import ResultCache
+from ms2_table import generate_ms2_table
+from conftest import ms1_scan, ms2_scan
+
+SEQUENCE = Peptide("AQDSQVLEEER", [])
+
+# run with the peptide in the MS1 scan and MS2 scans of the peptide with and without Al[III]
+def scored_run(make_run):
+    ms2_scans = []
+    for scan_number, modifications in ((2, []), (3, [Modification(2, 23.958063, "Cation:Al[III]", False)])):
+        peptide = Peptide("AQDSQVLEEER", modifications)
+        mz = np.array([ion.mz for ion_list in peptide.fragments().values() for ion in ion_list])
+        ms2_scans.append(ms2_scan(scan_number, mz, np.full(len(mz), 100.0), peptide.mz(2), 2))
+    return make_run(ms2_scans, [ms1_scan(1, [SEQUENCE.mz(2)], [1000.0])])
+
+def test_keys_change_with_every_input(tmp_path):
+    with ResultCache(str(tmp_path / "cache.sqlite")) as cache:
+        scan = ms2_scan(2, [100.0, 200.0], [1.0, 2.0])
+        key = cache.key(scan, SEQUENCE, 2, 10)
+        assert key == cache.key(ms2_scan(2, [100.0, 200.0], [1.0, 2.0]), SEQUENCE, 2, 10)
+        assert key != cache.key(ms2_scan(2, [100.0, 200.0], [1.0, 3.0]), SEQUENCE, 2, 10)
+        assert key != cache.key(scan, Peptide("AQDSQVLEEEK", []), 2, 10)
+        assert key != cache.key(scan, SEQUENCE, 3, 10)
+        assert key != cache.key(scan, SEQUENCE, 2, 20)
+        assert key != cache.key(scan, SEQUENCE, 2, 10, preprocessing=Preprocessing(charge_reduction=True).parameters())
+        assert key != cache.key(scan, SEQUENCE, 2, 10, "fragment index:::5:2")
+
+def test_results_persist_across_connections(tmp_path):
+    with ResultCache(str(tmp_path / "cache.sqlite")) as cache:
+        assert cache.get("key") is None
+        cache.put("key", ("AQDSQVLEEER", "1.00", "No mod", np.float64(0.0), ""))
+    with ResultCache(str(tmp_path / "cache.sqlite")) as cache:
+        assert cache.get("key") == ("AQDSQVLEEER", "1.00", "No mod", 0.0, "")
+        assert (cache.hits, cache.misses) == (1, 0)
+
+def test_a_second_pass_reads_every_prediction_from_the_cache(tmp_path, make_run, offline_unimod):
+    run = scored_run(make_run)
+    with ResultCache(str(tmp_path / "cache.sqlite")) as cache:
+        first = [row for row, _ in generate_ms2_table(run, SEQUENCE, 2, 10, "DDA", cache=cache)]
+        assert (cache.hits, cache.misses) == (0, 2)
+    with ResultCache(str(tmp_path / "cache.sqlite")) as cache:
+        second = [row for row, _ in generate_ms2_table(run, SEQUENCE, 2, 10, "DDA", cache=cache)]
+        assert (cache.hits, cache.misses) == (2, 0)
+    assert second == first
+    assert [row["modification"] for row in first[1:]] == ["No mod", "Cation:Al[III]"]
+
+def test_preprocessing_changes_the_keys_of_a_run(tmp_path, make_run, offline_unimod):
+    run = scored_run(make_run)
+    with ResultCache(str(tmp_path / "cache.sqlite")) as cache:
+        list(generate_ms2_table(run, SEQUENCE, 2, 10, "DDA", cache=cache))
+    # charge reduced peaks are scored against singly charged fragments only, so the cached results do not apply
+    reduced = MSRun(run.ms1_spectra + run.ms2_spectra, "DDA", preprocessing=Preprocessing(charge_reduction=True))
+    with ResultCache(str(tmp_path / "cache.sqlite")) as cache:
+        list(generate_ms2_table(reduced, SEQUENCE, 2, 10, "DDA", cache=cache))
+        assert (cache.hits, cache.misses) == (0, 2)
@@ -0,0 +1,43 @@
+import numpy as np
+from pyteomics.auxiliary import unitfloat
+from RunQC import compute_scan_qc, summarize_windows, summarize_scan_types
+from scan_headers import to_seconds
+
+# full MS1 scans at 0, 4 and 9 s, MS2 scans of two precursors and SIM scans of one window in between
+def scan_headers():
+    nan = np.nan
+    return {"scan number": np.arange(1, 9),
+            "ms level": np.array([1, 2, 2, 1, 1, 2, 1, 1]),
+            "retention time": np.array([0.0, 1.0, 2.0, 3.0, 4.0, 5.5, 6.0, 9.0]),
+            "ion injection time": np.array([10.0, 50.0, 40.0, 20.0, 12.0, 30.0, nan, 14.0]),
+            "tic": np.arange(1.0, 9.0),
+            "sim": np.array([False, False, False, True, False, False, True, False]),
+            "window low": np.array([nan, 499.0, 599.0, 490.0, nan, 499.0, 490.0, nan]),
+            "window high": np.array([nan, 501.0, 601.0, 510.0, nan, 501.0, 510.0, nan]),
+            "precursor mz": np.array([nan, 500.0, 600.0, nan, nan, 500.0, nan, nan])}
+
+def test_compute_scan_qc_labels_windows_and_measures_cycle_times():
+    scan_qc = compute_scan_qc(scan_headers())
+    assert scan_qc["scan type"].tolist() == ["MS1", "MS2", "MS2", "SIM", "MS1", "MS2", "SIM", "MS1"]
+    assert scan_qc["window"].tolist() == ["", "500.00", "600.00", "490.0000-510.0000", "", "500.00", "490.0000-510.0000", ""]
+    assert np.allclose(scan_qc["full cycle time (s)"], [4.0, np.nan, np.nan, np.nan, 5.0, np.nan, np.nan, np.nan], equal_nan=True)
+    assert np.allclose(scan_qc["window cycle time (s)"], [np.nan, 4.5, np.nan, 3.0, np.nan, np.nan, np.nan, np.nan], equal_nan=True)
+
+def test_summarize_windows_counts_scans_per_window():
+    summary = summarize_windows(compute_scan_qc(scan_headers()))
+    assert summary["scan type"] == ["MS2", "MS2", "SIM"]
+    assert summary["window"] == ["500.00", "600.00", "490.0000-510.0000"]
+    assert summary["scans"].tolist() == [2, 1, 2]
+    assert np.allclose(summary["mean cycle time (s)"], [4.5, np.nan, 3.0], equal_nan=True)
+
+def test_summarize_scan_types_skips_missing_injection_times():
+    summary = summarize_scan_types(compute_scan_qc(scan_headers()))
+    assert summary["scan type"] == ["MS1", "MS2", "SIM"]
+    assert summary["scans"] == [3, 3, 2]
+    assert np.allclose(summary["scans per second"], [3 / 9, 3 / 9, 2 / 9])
+    assert summary["mean injection time (ms)"] == [12.0, 40.0, 20.0]
+    assert np.allclose(summary["median cycle time (s)"], [4.5, 4.5, 3.0])
+
+def test_to_seconds_uses_the_unit_of_the_file():
+    assert to_seconds(unitfloat(1.5, "minute")) == 90.0
+    assert to_seconds(unitfloat(1.5, "second")) == 1.5
@@ -0,0 +1,36 @@
+from pyteomics.auxiliary import unitfloat
+from spectrum_reader import scan_number_from_id, spectrum_positions
+
+# stands in for an indexed mzML reader: spectrum ids from the offset index and decoded spectra by position
+class FakeReader:
+    def __init__(self, scan_numbers, rts, unit="minute"):
+        self.index = {"spectrum": {f"controllerType=0 controllerNumber=1 scan={scan_number}": position
+                                   for position, scan_number in enumerate(scan_numbers)}}
+        self.rts = [unitfloat(rt, unit) for rt in rts]
+        self.decoded = []
+
+    def get_by_index(self, position):
+        self.decoded.append(position)
+        return {"scanList": {"scan": [{"scan start time": self.rts[position]}]}}
+
+def test_scan_number_from_id_falls_back_to_the_position():
+    assert scan_number_from_id("controllerType=0 controllerNumber=1 scan=1484", 3) == 1484
+    assert scan_number_from_id("index=3", 3) == 4
+
+def test_spectrum_positions_selects_inclusive_scan_ranges():
+    reader = FakeReader([1, 2, 4, 5, 7], [0.1, 0.2, 0.3, 0.4, 0.5])
+    assert list(spectrum_positions(reader)) == [0, 1, 2, 3, 4]
+    assert list(spectrum_positions(reader, scan_range=(2, 5))) == [1, 2, 3]
+    assert list(spectrum_positions(reader, scan_range=(3, 6))) == [2, 3]
+    assert list(spectrum_positions(reader, scan_range=(8, 9))) == []
+    assert reader.decoded == []
+
+def test_spectrum_positions_binary_searches_retention_times():
+    reader = FakeReader(list(range(1, 1001)), [i / 100 for i in range(1000)])
+    assert list(spectrum_positions(reader, rt_range=(1.0, 2.0))) == list(range(100, 201))
+    assert len(reader.decoded) < 50
+    assert list(spectrum_positions(reader, scan_range=(150, 300), rt_range=(1.0, 2.0))) == list(range(149, 201))
+
+def test_retention_time_ranges_are_in_minutes_whatever_the_unit_of_the_file():
+    reader = FakeReader(list(range(1, 101)), [i * 6.0 for i in range(100)], unit="second")
+    assert list(spectrum_positions(reader, rt_range=(1.0, 2.0))) == list(range(10, 21))
@@ -0,0 +1,43 @@
+import numpy as np
+from models import Peptide, Modification
+from stdev_plot import calculate_stdev, optimize_delta, initialize_peaks
+from conftest import ms2_scan
+
+MODIFICATION = Modification(2, 23.958, "Cation:Al[III]", False)
+TOLERANCE = 20
+
+# MS2 scan with a peak at every fragment of the peptide carrying the modification at true_delta, each shifted by noise
+def modified_scan(true_delta, noise=0.0, seed=0):
+    peptide = Peptide("AQDSQVLEEER", [Modification(2, true_delta, MODIFICATION.name, False)])
+    mz = np.array([ion.mz for ion_list in peptide.fragments().values() for ion in ion_list])
+    rng = np.random.default_rng(seed)
+    return ms2_scan(2, mz + rng.normal(0, noise, len(mz)), rng.uniform(10, 100, len(mz)))
+
+def test_optimize_delta_recovers_the_true_delta():
+    scan = modified_scan(MODIFICATION.delta + 0.0005)
+    best_delta, best_stdev, lower, upper, matched_ions = optimize_delta(scan, Peptide("AQDSQVLEEER", []), MODIFICATION, TOLERANCE)
+    assert abs(best_delta - (MODIFICATION.delta + 0.0005)) < 1e-9
+    assert best_stdev < 1e-9
+    assert lower <= best_delta <= upper
+    assert matched_ions > 0
+
+def test_calculate_stdev_matches_shifting_every_fragment():
+    scan = modified_scan(MODIFICATION.delta + 0.0003, noise=0.0002)
+    sequence = Peptide("AQDSQVLEEER", [])
+    results = calculate_stdev(scan, sequence, MODIFICATION, TOLERANCE, delta_range=0.001, step=0.0001)
+    _, _, found_peaks, expected_peaks, mod_coefficients, weights = initialize_peaks(scan, sequence, MODIFICATION, TOLERANCE)[:6]
+    assert len(results) == 20
+    for delta, stdev in results:
+        # residuals with the modification at delta instead of its Unimod mass
+        residuals = found_peaks - (expected_peaks + mod_coefficients * (delta - MODIFICATION.delta))
+        mean = np.dot(weights, residuals)
+        assert np.isclose(stdev, np.sqrt(np.dot(weights, np.square(residuals - mean))), rtol=1e-6, atol=1e-12)
+
+def test_optimize_delta_is_the_minimum_of_the_sweep():
+    scan = modified_scan(MODIFICATION.delta - 0.0004, noise=0.0002, seed=1)
+    sequence = Peptide("AQDSQVLEEER", [])
+    results = calculate_stdev(scan, sequence, MODIFICATION, TOLERANCE, delta_range=0.002, step=0.000001)
+    sweep_delta, sweep_stdev = min(results, key=lambda result: result[1])
+    best_delta, best_stdev, _, _, _ = optimize_delta(scan, sequence, MODIFICATION, TOLERANCE)
+    assert abs(best_delta - sweep_delta) <= 0.000001
+    assert best_stdev <= sweep_stdev
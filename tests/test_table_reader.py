@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from table_reader import read_table, parse_column
+from table_writer import write_table
+
+COLUMNS = {"scan number": np.array([1, 2, 3]),
+           "intensity": np.array([1.5, np.nan, 3.5]),
+           "usi": ["mzspec:a:1", "", "mzspec:a:3"],
+           "charge": np.array([2, 3, 2])}
+
+def test_parse_column_picks_the_narrowest_type():
+    assert parse_column(["1", "2"]).dtype == np.int64
+    parsed = parse_column(["1.5", " ", "3"])
+    assert parsed.dtype == np.float64 and np.isnan(parsed[1])
+    assert parse_column(["1", "b"]).tolist() == ["1", "b"]
+    assert parse_column(["", ""]).dtype == object
+
+@pytest.mark.parametrize("output_format", ["csv", "tsv", "xlsx", "parquet", "arrow"])
+def test_read_table_reads_the_requested_columns_of_every_format(tmp_path, output_format):
+    output_file = str(tmp_path / f"table.{output_format}")
+    write_table(output_file, COLUMNS)
+    table = read_table(output_file, columns=["scan number", "intensity", "usi", "missing"], text_columns=["usi"])
+    assert list(table.keys()) == ["scan number", "intensity", "usi"]
+    assert table["scan number"].tolist() == [1, 2, 3]
+    assert np.allclose(table["intensity"], [1.5, np.nan, 3.5], equal_nan=True)
+    assert table["usi"].tolist() == ["mzspec:a:1", "", "mzspec:a:3"]
+
+def test_text_columns_are_never_typed(tmp_path):
+    output_file = tmp_path / "table.csv"
+    output_file.write_text("scan number,target\n1,123\n2,0045\n")
+    table = read_table(str(output_file), text_columns=["target"])
+    assert table["scan number"].dtype == np.int64
+    assert table["target"].tolist() == ["123", "0045"]
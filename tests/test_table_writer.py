@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from table_writer import TableWriter, write_table, output_path, format_from_extension
+
+FIELDNAMES = ["scan number", "usi", "intensity"]
+
+# reads a table written by TableWriter back into a DataFrame
+def read_back(output_file, output_format):
+    if output_format in ("csv", "tsv"):
+        return pd.read_csv(output_file, sep="," if output_format == "csv" else "\t", keep_default_na=False)
+    if output_format == "xlsx":
+        return pd.read_excel(output_file)
+    if output_format == "parquet":
+        return pd.read_parquet(output_file)
+    return pd.read_feather(output_file)
+
+@pytest.mark.parametrize("output_format", ["csv", "tsv", "xlsx", "parquet", "arrow"])
+def test_rows_and_column_chunks_round_trip(tmp_path, output_format):
+    output_file = tmp_path / f"table.{output_format}"
+    with TableWriter(str(output_file), FIELDNAMES, row_group_size=2) as writer:
+        writer.writerow({"scan number": 1, "usi": "mzspec:a:1", "intensity": 1.5})
+        writer.writerows([{"scan number": 2, "usi": "mzspec:a:2", "intensity": 2.5, "ignored": 0}])
+        writer.write_columns({"scan number": np.array([3, 4, 5]), "usi": ["mzspec:a:3", "mzspec:a:4", "mzspec:a:5"],
+                              "intensity": np.array([3.5, 4.5, 5.5])})
+    assert writer.rows_written == 5
+    table = read_back(output_file, output_format)
+    assert list(table.columns) == FIELDNAMES
+    assert table["scan number"].tolist() == [1, 2, 3, 4, 5]
+    assert table["usi"].tolist() == [f"mzspec:a:{i}" for i in range(1, 6)]
+    assert table["intensity"].tolist() == [1.5, 2.5, 3.5, 4.5, 5.5]
+
+def test_parquet_flushes_one_row_group_per_row_group_size(tmp_path):
+    import pyarrow.parquet as pq
+    output_file = str(tmp_path / "table.parquet")
+    write_table(output_file, {"scan number": np.arange(10), "intensity": np.ones(10, dtype=np.float32)}, row_group_size=4)
+    parquet_file = pq.ParquetFile(output_file)
+    assert parquet_file.metadata.num_row_groups == 3
+    assert str(parquet_file.schema_arrow.field("intensity").type) == "float"
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet", "arrow"])
+def test_empty_tables_keep_their_header(tmp_path, output_format):
+    output_file = str(tmp_path / f"table.{output_format}")
+    TableWriter(output_file, FIELDNAMES).close()
+    assert list(read_back(output_file, output_format).columns) == FIELDNAMES
+
+def test_missing_columns_are_left_empty(tmp_path):
+    output_file = str(tmp_path / "table.csv")
+    write_table(output_file, {"scan number": [1, 2]}, fieldnames=FIELDNAMES)
+    assert open(output_file).read().splitlines() == ["scan number,usi,intensity", "1,,", "2,,"]
+
+def test_output_paths_and_formats():
+    assert format_from_extension("run.XLSX") == "xlsx"
+    assert format_from_extension("run.mzML") is None
+    assert output_path("results/run.csv", "parquet") == "results/run.parquet"
+    assert output_path("results/run", None, "_windows") == "results/run_windows.csv"
+    assert output_path("results/run.v2", "arrow") == "results/run.v2.arrow"
+    with pytest.raises(ValueError):
+        TableWriter("table.json", FIELDNAMES, "json")
+
+@pytest.mark.parametrize("output_format", ["csv", "tsv"])
+def test_nan_is_an_empty_text_cell(tmp_path, output_format):
+    output_file = str(tmp_path / f"table.{output_format}")
+    write_table(output_file, {"scan number": [1, 2], "intensity": np.array([np.nan, 2.5])})
+    separator = "," if output_format == "csv" else "\t"
+    assert open(output_file).read().splitlines()[1:] == [f"1{separator}", f"2{separator}2.5"]
@@ -0,0 +1,24 @@
+import numpy as np
+from tic_reader import spectrum_tic
+
+# stands in for a peak array read with decode_binary=False
+class EncodedArray:
+    def __init__(self, values):
+        self.values = values
+        self.decoded = False
+
+    def decode(self):
+        self.decoded = True
+        return np.asarray(self.values, dtype=np.float32)
+
+def test_spectrum_tic_prefers_the_stored_value():
+    intensity_array = EncodedArray([1.0, 2.0])
+    assert spectrum_tic({"total ion current": 10.0, "intensity array": intensity_array}) == 10.0
+    assert not intensity_array.decoded
+
+def test_spectrum_tic_sums_the_intensity_array_without_a_stored_value():
+    assert spectrum_tic({"intensity array": np.array([1.5, 2.5], dtype=np.float32)}) == 4.0
+    intensity_array = EncodedArray([1.0, 2.0, 3.0])
+    assert spectrum_tic({"intensity array": intensity_array}) == 6.0
+    assert intensity_array.decoded
+    assert spectrum_tic({}) == 0.0
@@ -0,0 +1,34 @@
+from models import Peptide
+from triage import Triage
+from ms2_table import generate_ms2_table
+from conftest import ms1_scan, ms2_scan
+from constants import PROTON_MASS
+
+SEQUENCE = Peptide("AQDSQVLEEER", [])
+
+# MS2 scan with n_peaks peaks whose neutral precursor mass is mass_delta above the peptide
+def scan(scan_number, mass_delta=0.0, charge=2, n_peaks=5, tic=None):
+    mz = [100.0 + i for i in range(n_peaks)]
+    return ms2_scan(scan_number, mz, [10.0] * n_peaks, (SEQUENCE.mass(0) + mass_delta) / charge + PROTON_MASS, charge, tic)
+
+def test_reason_codes_list_every_failed_filter(make_run):
+    scans = [scan(2), scan(3, charge=4), scan(4, n_peaks=2), scan(5, tic=10.0), scan(6, mass_delta=500.0),
+             scan(7, mass_delta=-300.0, charge=4, n_peaks=1)]
+    run = make_run(scans)
+    triage = Triage(delta_window=(-200.0, 400.0), min_peaks=3, min_tic=20.0, charges=[2, 3])
+    reasons = triage.apply(run, SEQUENCE, run.ms2_spectra)
+    assert reasons.tolist() == ["", "charge", "peak count", "tic", "delta window", "charge, peak count, tic, delta window"]
+    assert triage.counts == {"charge": 2, "peak count": 2, "tic": 2, "delta window": 2}
+    assert (triage.passed, triage.rejected) == (1, 5)
+
+def test_filters_are_off_by_default(make_run):
+    run = make_run([scan(2, mass_delta=1000.0, charge=5, n_peaks=1)])
+    triage = Triage()
+    assert not triage.enabled
+    assert triage.apply(run, SEQUENCE, run.ms2_spectra).tolist() == [""]
+
+def test_rejected_scans_are_written_unscored(make_run, offline_unimod):
+    run = make_run([scan(2), scan(3, mass_delta=500.0)], [ms1_scan(1, [SEQUENCE.mz(2)], [1000.0])])
+    rows = [row for row, _ in generate_ms2_table(run, SEQUENCE, 2, 10, "DDA", triage=Triage(delta_window=(-200.0, 400.0)))]
+    assert [(row["scan number"], row["triage"]) for row in rows[1:]] == [(2, ""), (3, "delta window")]
+    assert rows[2]["usi"] == "" and rows[2]["modification"] == ""
@@ -0,0 +1,32 @@
+import numpy as np
+from models import Peptide, Modification
+from usi import generate_usi
+from conftest import ms2_scan
+
+SEQUENCE = Peptide("AQDSQVLEEER", [])
+AL_DELTA = 23.958063
+
+# MS2 scan with a peak at every fragment of the peptide, precursor at its m/z
+def fragment_scan(peptide, charge=2):
+    mz = np.array([ion.mz for ion_list in peptide.fragments().values() for ion in ion_list])
+    return ms2_scan(2, mz, np.full(len(mz), 100.0), peptide.mz(charge), charge)
+
+def test_unmodified_precursors_score_without_a_modification(offline_unimod):
+    sequence, _, name, delta, mod_type = generate_usi(fragment_scan(SEQUENCE), SEQUENCE, 0.0, 10)
+    assert (sequence, name, delta, mod_type) == ("AQDSQVLEEER", "No mod", 0.0, "")
+
+def test_modifications_are_reported_by_name_with_their_unimod_delta(offline_unimod):
+    modified = Peptide("AQDSQVLEEER", [Modification(2, AL_DELTA, "Cation:Al[III]", False)])
+    sequence, _, name, delta, mod_type = generate_usi(fragment_scan(modified), SEQUENCE, AL_DELTA + 0.0001, 10)
+    assert sequence == "AQD[Cation:Al[III]]SQVLEEER"
+    assert name == "Cation:Al[III]"
+    assert delta == AL_DELTA
+    assert mod_type == "cation"
+
+def test_precursors_one_residue_short_are_localized_as_synthesis_errors(offline_unimod):
+    short = Peptide("AQDSQVLEER", [])
+    mass_delta = short.mass(0) - SEQUENCE.mass(0)
+    sequence, _, name, _, mod_type = generate_usi(fragment_scan(short), SEQUENCE, mass_delta, 10)
+    assert sequence == "AQDSQVLEER"
+    assert name == "missing E"
+    assert mod_type == "synthesis error"
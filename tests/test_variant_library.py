@@ -0,0 +1,40 @@
+import numpy as np
+from variant_library import VariantLibrary
+from fragment_index import FragmentIndex
+from conftest import ms2_scan
+from test_fragment_index import variants, TOLERANCE
+
+# scans built from the b and y ions of each variant
+def variant_scans():
+    scans = []
+    for scan_number, variant in enumerate(variants(), start=2):
+        peptide = variant.peptide
+        mz = [ion.mz for ion in peptide.b_ions(1) + peptide.y_ions(1)]
+        scans.append(ms2_scan(scan_number, mz, np.linspace(10, 100, len(mz)), precursor_mz=peptide.mz(2)))
+    return scans
+
+def test_library_votes_match_fragment_index(make_run):
+    run = make_run(variant_scans())
+    library = VariantLibrary(variants(), TOLERANCE)
+    index = FragmentIndex(variants(), TOLERANCE)
+
+    presence_matrix, intensity_matrix, total_intensity, ordinals = library.bin_spectra(run, run.ms2_spectra)
+    fragment_hits = (presence_matrix @ library._matrix_t).toarray()
+    intensity_sums = (intensity_matrix @ library._matrix_t).toarray()
+
+    for i, ordinal in enumerate(ordinals):
+        mz, intensity = run.ms2_peaks.get_peaks(ordinal)
+        expected_hits, expected_sums = index.votes(mz, intensity.astype(np.float64))
+        np.testing.assert_array_equal(fragment_hits[i], expected_hits)
+        np.testing.assert_allclose(intensity_sums[i], expected_sums, rtol=1e-6)
+        assert total_intensity[i] == np.sum(intensity, dtype=np.float64)
+
+def test_search_run_picks_the_variant_of_each_scan(make_run):
+    run = make_run(variant_scans())
+    target, deletion = variants()
+    results = VariantLibrary(variants(), TOLERANCE).search_run(run, target.peptide, run.ms2_spectra)
+    assert results[2][0] == str(target.peptide) and results[2][2] == "No mod"
+    assert results[3][0] == str(deletion.peptide) and results[3][2] == "missing P"
+
+def test_signature_changes_with_the_fragment_charge():
+    assert VariantLibrary(variants(), TOLERANCE).signature() != VariantLibrary(variants(), TOLERANCE, max_charge=1).signature()
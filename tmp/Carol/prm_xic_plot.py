@@ -1,11 +1,13 @@
-import re
 import matplotlib.pyplot as plt
-from pyteomics import mzml
 import os
+import sys
 import argparse
 import os.path
 from matplotlib.backends.backend_pdf import PdfPages
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "MS2VariantFinder", "mzml_tools"))
+from peak_index import read_ms1_index
+
 class PRMPlotXIC:
     def __init__(self):
         parser = argparse.ArgumentParser(
@@ -33,37 +35,14 @@ class PRMPlotXIC:
             self.output = args.output + ".pdf"
 
     def plot_prm_xic(self):
-        with mzml.read(self.mzml_file) as reader:
-            retention_times = []
-            intensities = []
-            injection_times = []
-
-            for spectrum in reader:
-                filter_string = spectrum['scanList']['scan'][0]['filter string']
-                match = re.search(r'NSI (\S+) (\S+).* \[([\d\.]+)\-([\d\.]+)\]', filter_string)
-                if match:
-                    scan_type = match.group(1)
-                    ms_level = match.group(2)
-                    start = float(match.group(3))
-                    end = float(match.group(4))
-
-                    if scan_type == "SIM" and ms_level == "ms" and start <= self.precursor_mz <= end:
-                        ms1_mz_array = spectrum['m/z array']
-                        ms1_intensity_array = spectrum['intensity array']
-                        intensity_sum = 0.0
-                        for i in range(len(ms1_mz_array)):
-                            mz = ms1_mz_array[i]
-                            if abs(mz - self.precursor_mz)/self.precursor_mz * 1000000 <= self.ppm_tolerance:
-                                intensity_sum += ms1_intensity_array[i]
-                        injection_time = spectrum['scanList']['scan'][0]['ion injection time']
-                        injection_times.append(injection_time)
-                        # normalized_intensity = intensity_sum
-                        normalized_intensity = intensity_sum / injection_time * 100
-                        intensities.append(normalized_intensity)
-                        retention_times.append(spectrum['scanList']['scan'][0]['scan start time'])
-                else:
-                    print(f"ERROR: unable to interpret {filter_string}")
-                    break
+        # SIM scans whose isolation window contains the precursor, summed within tolerance via the m/z-sorted peak index
+        peak_index = read_ms1_index(self.mzml_file)
+        sim_scans = peak_index.scan_mask(sim_mz=self.precursor_mz)
+        intensity_sums = peak_index.xic(self.precursor_mz, self.ppm_tolerance)[sim_scans]
+        injection_times = peak_index.iit[sim_scans]
+        # normalized_intensity = intensity_sum
+        intensities = intensity_sums / injection_times * 100
+        retention_times = peak_index.rt[sim_scans]
 
         with PdfPages(self.output) as pdf:
             plt.plot(retention_times, intensities)
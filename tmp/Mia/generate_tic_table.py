@@ -3,15 +3,20 @@
 
 
 import os
+import sys
 import argparse
 import timeit
-import csv
-from pyteomics import mzml
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts", "MS2VariantFinder", "mzml_tools"))
+from tic_reader import read_spectrum_tics
+from table_writer import TableWriter, FORMATS, format_from_extension
 
 def main():
     parser = argparse.ArgumentParser(description='Generate a TIC table from an mzML file')
     parser.add_argument('--mzml_file', required=True, help='Name of the mzML file to read')
     parser.add_argument('--output', default=None, help='Output CSV/TSV/XLSX file (default: same root as mzML)')
+    parser.add_argument('--format', default=None, choices=FORMATS, help='Output table format (default: from the --output extension, else csv)')
+    parser.add_argument('--row_group_size', type=int, default=10000, help='Rows written to the output file at a time')
     args = parser.parse_args()
 
     # Check file exists
@@ -21,34 +26,25 @@ def main():
 
     # Determine file root and output file
     file_root = os.path.splitext(os.path.basename(args.mzml_file))[0]
-    output_file = args.output if args.output else f"{file_root}_TIC.csv"
+    output_format = args.format or (format_from_extension(args.output) if args.output else None) or 'csv'
+    output_file = args.output if args.output else f"{file_root}_TIC.{output_format}"
 
-    # Read MS1 spectra and collect TIC info
+    # Read MS1 TIC info from the spectrum headers; peak arrays are only decoded for spectra without a stored TIC
     t0 = timeit.default_timer()
-    tic_data = []
-
-    with mzml.read(args.mzml_file) as reader:
-        for spectrum in reader:
-            if spectrum['ms level'] == 1:
-                scan_number = int(spectrum['id'].split('=')[-1]) if 'id' in spectrum else None
-                scan_time = spectrum['scanList']['scan'][0]['scan start time'] if 'scanList' in spectrum else None
-                tic = sum(spectrum['intensity array']) if 'intensity array' in spectrum else 0
-                tic_data.append({
-                    'FileRoot': file_root,
-                    'ScanNumber': scan_number,
-                    'ScanTime': scan_time,
-                    'TIC': tic
-                })
-
-    # Write out CSV
-    with open(output_file, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=['FileRoot', 'ScanNumber', 'ScanTime', 'TIC'])
-        writer.writeheader()
-        for row in tic_data:
-            writer.writerow(row)
+    columns = read_spectrum_tics(args.mzml_file, ms_level=1)
+    tic_data = {
+        'FileRoot': [file_root] * len(columns['scan number']),
+        'ScanNumber': columns['scan number'],
+        'ScanTime': columns['scan time'],
+        'TIC': columns['tic']
+    }
+
+    # Write out table
+    with TableWriter(output_file, list(tic_data.keys()), output_format, args.row_group_size) as writer:
+        writer.write_columns(tic_data)
 
     t1 = timeit.default_timer()
-    print(f"INFO: Wrote {len(tic_data)} MS1 spectra to {output_file}")
+    print(f"INFO: Wrote {writer.rows_written} MS1 spectra to {output_file}")
     print(f"INFO: Elapsed time: {t1 - t0:.2f} seconds")
 
 if __name__ == "__main__":